@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+fake_ftp.py
+- py_code/publish.py 用の CoreServer 代替 FTP サーバー（pyftpdlib）。
+  --root 以下をそのままリモートのルート（/weather, /train ...）として見せる。
+- 受けたコマンドの数は終了時（Ctrl-C）に表示する（ログイン回数・STOR/DELE の数の確認用）。
+
+使い方:
+  python fake_ftp.py --root /tmp/coreserver --port 2121
+  FTP_HOST=127.0.0.1 FTP_PORT=2121 FTP_USER=takao FTP_PASS=takao FTP_TLS=0 \\
+  PUBLISH_MANIFEST=/tmp/manifest.json \\
+      python -m py_code.publish --remote-dir /weather py_data/weather/takao_current.json
+"""
+import argparse
+import os
+from collections import Counter
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+except ImportError:  # pragma: no cover
+    raise SystemExit("pyftpdlib が必要です: pip install pyftpdlib")
+
+COUNTS: Counter = Counter()
+
+
+class CountingHandler(FTPHandler):
+    def pre_process_command(self, line, cmd, arg):
+        COUNTS[cmd] += 1
+        return super().pre_process_command(line, cmd, arg)
+
+
+def make_server(root: str, host: str = "127.0.0.1", port: int = 2121,
+                user: str = "takao", password: str = "takao") -> FTPServer:
+    os.makedirs(root, exist_ok=True)
+    auth = DummyAuthorizer()
+    auth.add_user(user, password, root, perm="elradfmwMT")
+    CountingHandler.authorizer = auth
+    return FTPServer((host, port), CountingHandler)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="local FTP stand-in for py_code/publish.py")
+    ap.add_argument("--root", required=True)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2121)
+    ap.add_argument("--user", default="takao")
+    ap.add_argument("--password", default="takao")
+    args = ap.parse_args()
+
+    server = make_server(args.root, args.host, args.port, args.user, args.password)
+    print(f"fake ftp on {args.host}:{args.port} root={args.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close_all()
+        print("commands:", dict(COUNTS))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 import os
 from datetime import datetime, timezone, timedelta
-import firebase_admin
-from firebase_admin import credentials, firestore
+
+# firebase_admin は import だけで数百 ms かかるので、実際に投稿するときに読む
 
 JST = timezone(timedelta(hours=9))
 JSON_KEY = os.path.join("/home/masuday/projects/takao35","keys","takao35-app-firebase-adminsdk-fbsvc-7a6844dfe5.json")
 
 def db():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
     if not firebase_admin._apps:
         cred = credentials.Certificate(JSON_KEY)
         firebase_admin.initialize_app(cred)
     return firestore.client()
 
 def post_news(doc_id: str, *, title: str, type_: str, url: str, pin: int = 2):
+    from firebase_admin import firestore
     ref = db().collection("news").document(doc_id)
     now = datetime.now(JST)
     data = {
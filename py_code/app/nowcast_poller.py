@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+高尾山付近の降水ナウキャスト（YOLP 10 分値）を見張り、状態が変わったときだけ Firestore に告知する。
+
+  dry       降っていない・1 時間以内も降らない
+  onset     降っていないが 1 時間以内に降り出す予測
+  raining   降っている（1 時間以内に止む予測なし）
+  stopping  降っているが 1 時間以内に止む予測
+
+- 直近の系列は常駐プロセスのメモリに持ち、同じ観測時刻なら判定もしない。
+- 判定はヒステリシス付き：乾いている側からは ON_MMPH を超えたら「降り」、降っている側からは
+  OFF_MMPH 以下で「止み」とみなす（弱い雨の出入りで告知がばたつかないように）。
+- 告知は news/weather:nowcast の 1 件を上書き。最後に告知した状態は STATE_PATH に残し、
+  再起動直後に同じ内容を出し直さない。
+
+  python nowcast_poller.py            # 常駐（POLL_SEC ごと）
+  python nowcast_poller.py --once     # 1 回だけ（cron 用）
+  python nowcast_poller.py --dry-run  # 投稿せず表示だけ
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+from py_code.config import RUNTIME_DIR
+from py_code.output import write_json
+from py_code.runtime_guard import job_lock, JobLocked
+from py_code.weather.points import default_point
+from py_code.weather.weather import fetch_nowcast, rain_outlook
+
+POLL_SEC = int(os.environ.get("NOWCAST_POLL_SEC", "300"))  # YOLP は 10 分値なので 5 分おきで十分
+ON_MMPH = float(os.environ.get("NOWCAST_ON_MMPH", "1.0"))
+OFF_MMPH = float(os.environ.get("NOWCAST_OFF_MMPH", "0.3"))
+STATE_PATH = Path(os.environ.get("NOWCAST_STATE", RUNTIME_DIR / "nowcast_poller.json"))
+NEWS_ID = "weather:nowcast"
+NEWS_URL = "https://www.takaosan-go.jp/index.php/information/"
+
+WET = ("raining", "stopping")
+
+
+def phase_of(outlook: Dict) -> str:
+    if outlook["raining_now"]:
+        return "stopping" if outlook["stop"] else "raining"
+    return "onset" if outlook["onset"] else "dry"
+
+
+def headline(phase: str, outlook: Dict) -> str:
+    mx = outlook.get("max_mmph")
+    if phase == "onset":
+        return f"高尾山付近 {outlook['onset']}ごろから雨の予報（最大 {mx}mm/h）"
+    if phase == "raining":
+        return f"高尾山付近で雨が降っています（{outlook['observed_mmph']}mm/h）"
+    if phase == "stopping":
+        return f"高尾山付近の雨は {outlook['stop']}ごろ止む見込み"
+    return "高尾山付近 1時間以内の雨の予報はありません"
+
+
+class NowcastPoller:
+    def __init__(self, *, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.point = default_point()
+        self.series: List[Dict] = []
+        state = self._load_state()
+        self.as_of: Optional[str] = state.get("as_of")
+        self.phase: Optional[str] = state.get("phase")
+        self.posts = 0
+
+    def _load_state(self) -> Dict:
+        try:
+            return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, outlook: Dict, as_of: Optional[str]) -> None:
+        write_json(STATE_PATH, {"phase": self.phase, "as_of": as_of, "outlook": outlook})
+
+    def poll(self) -> Optional[str]:
+        """1 回分。告知した見出しを返す（変化なし・同じ観測時刻なら None）。"""
+        series = fetch_nowcast([self.point])[self.point["key"]]["series"]
+        obs = [w["time"] for w in series if w["type"] == "observation"]
+        as_of = obs[-1] if obs else None
+        if as_of is not None and as_of == self.as_of:
+            return None  # YOLP 側がまだ更新されていない
+        self.series = series
+        # self.as_of は投稿と状態の保存が済んでから進める（失敗したら次の poll で同じ観測をもう一度見る）
+
+        threshold = OFF_MMPH if self.phase in WET else ON_MMPH
+        outlook = rain_outlook(series, threshold)
+        if outlook["raining_now"] and threshold != OFF_MMPH:
+            outlook = rain_outlook(series, OFF_MMPH)  # 降り出した後の「止み」は OFF 側で見る
+        phase = phase_of(outlook)
+        if phase == self.phase or (self.phase is None and phase == "dry"):
+            self.phase = phase
+            self._save_state(outlook, as_of)
+            self.as_of = as_of
+            return None
+
+        title = headline(phase, outlook)
+        if self.dry_run:
+            print(f"[dry-run] {self.phase} -> {phase}: {title}")
+        else:
+            from fs_client import post_news  # firebase_admin の読み込みは投稿するときだけ
+            post_news(NEWS_ID, title=title, type_="weather", url=NEWS_URL, pin=2 if phase in ("onset", "raining") else 1)
+            print(f"nowcast: {self.phase} -> {phase}: {title}")
+        self.posts += 1
+        self.phase = phase
+        self._save_state(outlook, as_of)
+        self.as_of = as_of
+        return title
+
+    def run(self, interval: int = POLL_SEC) -> None:
+        polls = 0
+        while True:
+            t0 = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:  # 1 回の失敗で常駐を止めない
+                print("nowcast: ERROR", e)
+                traceback.print_exc()
+            polls += 1
+            if polls % 12 == 0:
+                print(f"nowcast: {polls} polls, {self.posts} posts, phase={self.phase}, as_of={self.as_of}")
+            time.sleep(max(1.0, interval - (time.monotonic() - t0)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="rain nowcast poller")
+    ap.add_argument("--once", action="store_true", help="poll once and exit")
+    ap.add_argument("--dry-run", action="store_true", help="print instead of posting to Firestore")
+    ap.add_argument("--interval", type=int, default=POLL_SEC)
+    args = ap.parse_args(argv)
+
+    poller = NowcastPoller(dry_run=args.dry_run)
+    if args.once:
+        poller.poll()
+        print(f"nowcast: phase={poller.phase} as_of={poller.as_of}")
+        return 0
+    poller.run(args.interval)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        with job_lock("nowcast_poller"):
+            sys.exit(main())
+    except JobLocked as e:
+        print("nowcast: SKIP", e)
@@ -4,18 +4,28 @@ from pathlib import Path
 from fs_client import post_news
 
 CUR_JSON = Path("/home/masuday/projects/takao35/py_data/weather/takao_current.json")
+# 最後に投稿した見出し。同じなら投稿しない（雨の出入りは nowcast_poller.py が即時に出す）
+LAST_POSTED = CUR_JSON.with_name("publish_weather_last.txt")
 
 def main():
     j = json.loads(CUR_JSON.read_text(encoding="utf-8"))
     word = j.get("current", {}).get("weather_text") or "—"
+    title = f"現在の高尾山の天気：{word}"
+    try:
+        if LAST_POSTED.read_text(encoding="utf-8") == title:
+            print("publish weather: SKIP (unchanged)")
+            return
+    except OSError:
+        pass
     post_news(
         "weather:now",
-        title=f"現在の高尾山の天気：{word}",
+        title=title,
         type_="weather",
         url="https://www.takaosan-go.jp/index.php/information/",   # ←あなたの天気ページ
         pin=1
     )
+    LAST_POSTED.write_text(title, encoding="utf-8")
     print("publish weather: OK")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,426 @@
+# py_code/bench/hotpaths.py
+"""
+解析・変換まわりのホットパスを、チェックイン済みの fixtures/ だけで計測する（ネットワーク不要）。
+
+  python -m py_code.bench.hotpaths run                    # 計測して表示
+  python -m py_code.bench.hotpaths run --save-baseline    # py_code/bench/baseline.json を更新
+  python -m py_code.bench.hotpaths compare                # baseline と比べ、threshold% 以上遅ければ exit 1
+  python -m py_code.bench.hotpaths compare --current logs/bench/x.json --threshold 20
+  python -m py_code.bench.hotpaths imports                # -X importtime で起動時 import の予算超過を検査
+
+fixtures/
+  train/      20250909 の収集 CSV（make_timetable / render の入力）
+  train/20250905/
+              20250905 の収集 CSV（dep_min 列の無い旧形式。休日の 23 時台に日付をまたぐ北野乗換がある）。
+              validate_dataset のケースはこれが検査を通ることも確かめる（通らなければ準備で止まる）
+  navitime/   timetable・stops の API 応答（fake_navitime.CsvFixtures で同日の CSV から起こしたもの）
+  html/       JR 東日本（路線・関東まとめ）・京王の運行情報ページ
+  weather/    Open-Meteo /v1/jma 応答、AMeDAS point JSON（八王子 3 時間ブロック）、府県天気予報 VPFD50 XML
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+FIXTURES = HERE / "fixtures"
+BASELINE = HERE / "baseline.json"
+ROOT = HERE.parents[1]
+
+sys.path.append(str(ROOT))                        # py_code パッケージ用
+sys.path.append(str(ROOT / "py_code" / "train"))  # keio_base などの平置きモジュール用
+
+JST = timezone(timedelta(hours=9))
+
+
+def _read(rel: str, mode: str = "r"):
+    with open(FIXTURES / rel, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+
+# ---------------- ケース定義 ----------------
+# 各ケースは「準備をして、計測対象の 0 引数関数を返す」関数。準備の時間は計測に含めない。
+def _case_extract_candidates(route: str, fixture: str) -> Callable[[], Callable]:
+    def setup():
+        import keio_base
+        payload = json.loads(_read(fixture))
+        kw = tuple(keio_base.ROUTES[route]["type_keywords"])
+        return lambda: keio_base.extract_candidates(payload, type_keywords=kw)
+    return setup
+
+
+def _setup_pick_stop_stations():
+    import keio_base
+    docs = json.loads(_read("navitime/stops_8408_4_weekday.json"))
+    targets = ["高尾", "高尾山口", "京王八王子", "北野", "新宿"]
+    return lambda: [keio_base.pick_stop_stations(d["stops"], targets) for d in docs]
+
+
+def _setup_make_timetable(func_name: str):
+    def setup():
+        import make_timetable
+        tmp = tempfile.mkdtemp(prefix="bench_mt_")
+        make_timetable.data_dir = str(FIXTURES / "train")
+        make_timetable.output_dir = tmp
+        func = getattr(make_timetable, func_name)
+        return lambda: func("20250909")
+    return setup
+
+
+def _setup_render():
+    import make_timetable
+    import render_timetable_html
+    tmp = tempfile.mkdtemp(prefix="bench_render_")
+    make_timetable.data_dir = str(FIXTURES / "train")
+    make_timetable.output_dir = tmp
+    with contextlib.redirect_stdout(io.StringIO()):
+        make_timetable.shinjuku_to_takao3("20250909")
+        make_timetable.takao3_to_shinjuku("20250909")
+    render_timetable_html.PUB_DIR = render_timetable_html.OUT_DIR = tmp
+    return lambda: render_timetable_html.render("20250909")
+
+
+def _setup_routes_json():
+    """7 日分（複数日の時刻表を出すときの規模）の経路オブジェクトを JSON に。"""
+    import make_timetable
+    from common import RouteInfo, StationInfo, routes_json
+    tmp = tempfile.mkdtemp(prefix="bench_routes_")
+    make_timetable.data_dir = str(FIXTURES / "train")
+    make_timetable.output_dir = tmp
+    with contextlib.redirect_stdout(io.StringIO()):
+        make_timetable.shinjuku_to_takao3("20250909")
+    with open(os.path.join(tmp, "20250909_shinjuku_to_takao3.json"), encoding="utf-8") as f:
+        docs = json.load(f) * 7
+    routes = [RouteInfo(d["train_type"], d["day_type"], StationInfo(**d["origin_station_info"]),
+                        StationInfo(**d["terminal_station_info"]),
+                        None if d["transits"] is None else [StationInfo(**t) for t in d["transits"]])
+              for d in docs]
+    return lambda: routes_json(routes)
+
+
+def _setup_validate_dataset():
+    """20250905 の CSV から乗換 JSON を作り、検査を 1 日分。正しいデータなので FAIL が出たら止める。"""
+    import make_timetable
+    import validate_dataset
+    data = str(FIXTURES / "train" / "20250905")
+    tmp = tempfile.mkdtemp(prefix="bench_validate_")
+    make_timetable.data_dir = data
+    make_timetable.output_dir = tmp
+    make_timetable.shinjuku_to_takao3("20250905")
+    make_timetable.takao3_to_shinjuku("20250905")
+    rep = validate_dataset.validate("20250905", data, tmp)
+    if rep.failed:
+        raise RuntimeError("validate_dataset flags the 20250905 fixture: "
+                           + ", ".join(f"{n}={rep.checks[n]['count']} {rep.checks[n]['examples']}" for n in rep.failed))
+    return lambda: validate_dataset.validate("20250905", data, tmp)
+
+
+def _fixture_times() -> List[str]:
+    """fixtures/train の CSV にある時刻文字列すべて（出発 time_iso と停車駅の time）。"""
+    import csv
+    times = []
+    for path in sorted((FIXTURES / "train").glob("*.csv")):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                times.append(row["time_iso"])
+                times.extend(s["time"] for s in json.loads(row["stop_stations"]))
+    return times
+
+
+def _setup_time_parse_datetime():
+    """旧: 各段が datetime.fromisoformat で行ごとに解釈していた（to_dt / iso_to_datetime / is_holiday）。"""
+    times = _fixture_times()
+    return lambda: [datetime.fromisoformat(t.replace("Z", "+00:00")) for t in times]
+
+
+def _setup_time_parse_service_time():
+    """新: service_time.from_iso で営業日の分に（収集時に 1 回だけ。固定形式は表を引くだけ）。"""
+    from service_time import from_iso
+    times = _fixture_times()
+    return lambda: [from_iso(t) for t in times]
+
+
+def _setup_jr_parse():
+    from py_code.train import rail_status
+    line = _read("html/jr_chuoline_rapidservice.html")
+    area = _read("html/jr_kanto.html")
+    return lambda: rail_status.jr_parse(rail_status.JR_RAPID, fallback_area_html=area, html=line)
+
+
+def _setup_keio_parse():
+    from py_code.train import rail_status
+    html = _read("html/keio_unkou_pc.html")
+    return lambda: rail_status.keio_parse(html=html)
+
+
+def _setup_open_meteo():
+    from py_code.weather import open_meteo
+    data = json.loads(_read("weather/open_meteo_jma.json"))
+    now = datetime(2025, 9, 9, 9, 5, tzinfo=JST)
+    return lambda: open_meteo.build_outputs(data, now=now)
+
+
+def _setup_open_meteo_points():
+    from py_code.weather import open_meteo
+    from py_code.weather.points import POINTS
+    datas = json.loads(_read("weather/open_meteo_jma_points.json"))
+    now = datetime(2025, 9, 9, 9, 5, tzinfo=JST)
+    return lambda: open_meteo.build_point_outputs(datas, POINTS, now=now)
+
+
+def _setup_amedas():
+    from py_code.weather import jma
+    series = json.loads(_read("weather/amedas_point_44112_20250909_06.json"))
+    return lambda: jma.summarize_point(series, "2025-09-09T08:50:00+09:00")
+
+
+def _setup_amedas_buffer():
+    from py_code.weather import jma
+    from py_code.weather.amedas_buffer import ObservationBuffer
+    series = json.loads(_read("weather/amedas_point_44112_20250909_06.json"))
+
+    def merge_and_window():
+        buf = ObservationBuffer(os.devnull, jma.ELEMENTS)
+        buf.merge(series)
+        return jma.build_trend(buf, "2025-09-09T08:50:00+09:00")
+    return merge_and_window
+
+
+def _setup_parse_forecast():
+    from py_code.weather import jma
+    xml = _read("weather/vpfd50_tokyo.xml", "rb")
+    return lambda: jma.parse_forecast(xml)
+
+
+def _setup_feed_entries():
+    from py_code.weather import jma
+    feed = _read("weather/regular.xml", "rb")
+    return lambda: jma.feed_entries(feed)
+
+
+def _setup_forecast_score():
+    """1 年分（毎時発表 × 72 時間先）の予報と実測を乱数で作り、採点だけを測る。"""
+    import numpy as np
+    from py_code.weather import forecast_archive as fa
+    rng = np.random.default_rng(40)
+    n = 365 * 24
+    hours = np.arange(n + fa.LEADS) + 480000
+    truth = 15 + 10 * np.sin(np.arange(len(hours)) / 24 * 2 * np.pi) + rng.normal(0, 1, len(hours))
+    rain = np.where(rng.random(len(hours)) < 0.1, rng.gamma(1, 2, len(hours)), 0)
+    obs = np.zeros(len(hours), dtype=fa.OBS_DTYPE)
+    obs["hour"], obs["temp"], obs["precip1h"] = hours, truth, rain
+    fc = np.zeros(n, dtype=fa.FC_DTYPE)
+    idx = np.arange(n)[:, None] + np.arange(fa.LEADS)
+    fc["issue"] = hours[:n]
+    fc["temp"] = truth[idx] + rng.normal(0, 1, idx.shape)
+    fc["precip"] = np.where(rng.random(idx.shape) < 0.7, rain[idx], 0)
+    return lambda: fa.score(fc, obs)
+
+
+CASES: Dict[str, Callable[[], Callable]] = {
+    "keio.extract_candidates[shinjuku]": _case_extract_candidates("shinjuku_to_takao_direct",
+                                                                  "navitime/timetable_4254_1_1_weekday.json"),
+    "keio.extract_candidates[kitano]": _case_extract_candidates("kitano_to_takao",
+                                                                "navitime/timetable_8408_4_1_weekday.json"),
+    "keio.pick_stop_stations": _setup_pick_stop_stations,
+    "make_timetable.shinjuku_to_takao3": _setup_make_timetable("shinjuku_to_takao3"),
+    "make_timetable.takao3_to_shinjuku": _setup_make_timetable("takao3_to_shinjuku"),
+    "render_timetable_html.render": _setup_render,
+    "common.routes_json[7d]": _setup_routes_json,
+    "validate_dataset[20250905]": _setup_validate_dataset,
+    "time_parse[fromisoformat]": _setup_time_parse_datetime,
+    "time_parse[service_time]": _setup_time_parse_service_time,
+    "rail_status.jr_parse": _setup_jr_parse,
+    "rail_status.keio_parse": _setup_keio_parse,
+    "open_meteo.build_outputs": _setup_open_meteo,
+    "open_meteo.build_point_outputs": _setup_open_meteo_points,
+    "jma.summarize_point": _setup_amedas,
+    "jma.amedas_buffer": _setup_amedas_buffer,
+    "jma.parse_forecast": _setup_parse_forecast,
+    "jma.feed_entries": _setup_feed_entries,
+    "forecast_archive.score[1y]": _setup_forecast_score,
+}
+
+
+# ---------------- 計測 ----------------
+def _measure(fn: Callable, *, repeat: int, min_time: float) -> Dict:
+    """1 回の計測が min_time 秒以上になるよう回数を決め、repeat 回の 1 呼び出しあたり時間を返す。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # 初回（import・キャッシュ）を除外
+        number = 1
+        while True:
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            dt = time.perf_counter() - t0
+            if dt >= min_time or number >= 1_000_000:
+                break
+            number *= 2 if dt == 0 else max(2, min(10, int(min_time / dt) + 1))
+        samples = [dt / number]
+        for _ in range(repeat - 1):
+            t0 = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - t0) / number)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "min_ms": round(min(samples) * 1000, 4),
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def run(*, only: Optional[List[str]] = None, repeat: int = 5, min_time: float = 0.2) -> Dict:
+    results = {}
+    for name, setup in CASES.items():
+        if only and not any(o in name for o in only):
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn = setup()
+        results[name] = _measure(fn, repeat=repeat, min_time=min_time)
+        print(f"{name:<38} {results[name]['median_ms']:>10.3f} ms  (min {results[name]['min_ms']:.3f}, x{results[name]['loops']})")
+    return {
+        "created_at": datetime.now(JST).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} {platform.node()}",
+        "results": results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, *, threshold_pct: float = 25.0) -> List[Tuple[str, float]]:
+    """median_ms を比べ、threshold% を超えて遅くなったケースを (名前, 変化率%) で返す。"""
+    regressions = []
+    print(f"{'case':<38} {'base ms':>10} {'now ms':>10} {'delta':>8}")
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<38} {'—':>10} {cur['median_ms']:>10.3f}      new")
+            continue
+        delta = (cur["median_ms"] / base["median_ms"] - 1.0) * 100.0 if base["median_ms"] else 0.0
+        mark = ""
+        if delta > threshold_pct:
+            mark = "  << SLOWER"
+            regressions.append((name, delta))
+        print(f"{name:<38} {base['median_ms']:>10.3f} {cur['median_ms']:>10.3f} {delta:>+7.0f}%{mark}")
+    return regressions
+
+
+# ---------------- import 時間 ----------------
+# (表示名, cwd, import するモジュール, 予算 ms)。cron で毎回払う起動コストの上限。
+# 予算は requests 込みで実測の 2 倍程度（requests だけで ~100ms かかる）。
+IMPORT_BUDGETS: List[Tuple[str, str, str, float]] = [
+    ("make_timetable", "py_code/train", "make_timetable", 80),
+    ("postprocess_to_json", "py_code/train", "postprocess_to_json", 120),
+    ("render_timetable_html", "py_code/train", "render_timetable_html", 60),
+    ("keio_base", "py_code/train", "keio_base", 350),
+    ("rail_status", "py_code/train", "rail_status", 300),
+    ("open_meteo", ".", "py_code.weather.open_meteo", 350),  # 地点×時刻の配列処理で numpy を読む
+    ("jma", ".", "py_code.weather.jma", 250),
+    ("weather_aggregate", ".", "py_code.weather.aggregate", 400),
+    ("fs_client", "py_code/app", "fs_client", 30),
+]
+_RX_IMPORTTIME = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)\s*$")
+
+
+def import_time_ms(cwd: str, module: str, *, repeat: int = 3) -> Optional[float]:
+    """python -X importtime -c "import module" の累積時間（ms）の最小値。import 失敗なら None。"""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=str(ROOT / cwd), env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None
+        for line in proc.stderr.splitlines():
+            m = _RX_IMPORTTIME.match(line)
+            if m and m.group(2) == module:
+                us = int(m.group(1))
+                best = us if best is None else min(best, us)
+    return None if best is None else best / 1000.0
+
+
+def check_imports(*, scale: float = 1.0, repeat: int = 3) -> List[str]:
+    """予算（× scale）を超えたものの名前を返す。"""
+    over = []
+    print(f"{'module':<24} {'import ms':>10} {'budget':>8}")
+    for name, cwd, module, budget in IMPORT_BUDGETS:
+        ms = import_time_ms(cwd, module, repeat=repeat)
+        limit = budget * scale
+        if ms is None:
+            print(f"{name:<24} {'error':>10} {limit:>8.0f}  (import failed)")
+            continue
+        mark = ""
+        if ms > limit:
+            mark = "  << OVER"
+            over.append(name)
+        print(f"{name:<24} {ms:>10.1f} {limit:>8.0f}{mark}")
+    return over
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="hot-path benchmarks on recorded fixtures")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="run the benchmarks")
+    r.add_argument("--only", action="append", help="substring of case names (repeatable)")
+    r.add_argument("--repeat", type=int, default=5)
+    r.add_argument("--min-time", type=float, default=0.2, help="seconds per sample")
+    r.add_argument("--out", default=None, help="write results JSON here")
+    r.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE.name}")
+
+    c = sub.add_parser("compare", help="compare against the baseline (runs the suite unless --current is given)")
+    c.add_argument("--baseline", default=str(BASELINE))
+    c.add_argument("--current", default=None, help="results JSON from a previous `run --out`")
+    c.add_argument("--threshold", type=float, default=25.0, help="percent slower than the baseline to flag")
+    c.add_argument("--only", action="append")
+    c.add_argument("--repeat", type=int, default=5)
+    c.add_argument("--min-time", type=float, default=0.2)
+
+    i = sub.add_parser("imports", help="check -X importtime of the entry points against their budgets")
+    i.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    i.add_argument("--repeat", type=int, default=3)
+
+    args = ap.parse_args(argv)
+    if args.cmd == "imports":
+        over = check_imports(scale=args.scale, repeat=args.repeat)
+        if over:
+            print("over budget:", ", ".join(over))
+            return 1
+        return 0
+    if args.cmd == "run":
+        res = run(only=args.only, repeat=args.repeat, min_time=args.min_time)
+        for path in filter(None, [args.out, str(BASELINE) if args.save_baseline else None]):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(res, f, ensure_ascii=False, indent=2)
+            print("results ->", path)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run(only=args.only, repeat=args.repeat, min_time=args.min_time)
+        print()
+    regressions = compare(baseline, current, threshold_pct=args.threshold)
+    if regressions:
+        print("regressions:", ", ".join(f"{n} ({d:+.0f}%)" for n, d in regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
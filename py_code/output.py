@@ -0,0 +1,123 @@
+# py_code/output.py
+"""
+生成物の書き出し。すべての生成スクリプト（rail_status / open_meteo / jma / aggregate / daemon /
+make_timetable / render_timetable_html / postprocess_to_json）と、実行をまたぐ状態ファイル
+（AMeDAS バッファ・jma の状態 JSON・aggregate のキャッシュ・nowcast_poller・収集メトリクス）はここを通して書く。
+
+- 本文はメモリで作ってから渡す。既存ファイルと内容ハッシュ（sha256）が同じなら書かない
+  （mtime が変わらないので、アップロード側も「変わったものだけ」で済む）。
+- 書くときは同じディレクトリの一時ファイル → os.replace。読み手・アップローダーが書きかけを見ない。
+- 戻り値は「書いたか（中身が変わったか）」。後段はこれを見て投稿・再描画などを飛ばす。
+- 公開する JSON は既定で詰めて書く（write_json に indent を渡したときだけ整形）。
+- 生成ページは <style> を持たず、共通の static/takao35.css を各出力ディレクトリに置いて参照する。
+- precompress() は .gz（gzip -9、mtime=0 で中身が同じなら同じバイト列）を横に作る。publish.py --compress 用。
+
+  from py_code.output import write_text, write_json, write_all
+  if write_text(path, html): ...
+"""
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple, Union
+
+PathLike = Union[str, os.PathLike]
+
+STYLESHEET_NAME = "takao35.css"
+STYLESHEET = Path(__file__).resolve().parent / "static" / STYLESHEET_NAME
+STYLESHEET_LINK = f'<link rel="stylesheet" href="{STYLESHEET_NAME}">'
+COMPRESSIBLE = (".json", ".html", ".css", ".txt")
+
+# パス → (サイズ, mtime_ns, ハッシュ)。常駐プロセスでは 2 回目以降、既存ファイルを読み直さない
+_digests: Dict[str, Tuple[int, int, bytes]] = {}
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+def _current_digest(path: str) -> Tuple[int, bytes]:
+    """既存ファイルの (サイズ, ハッシュ)。無ければ (-1, b"")。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return -1, b""
+    cached = _digests.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return st.st_size, cached[2]
+    with open(path, "rb") as f:
+        d = _digest(f.read())
+    _digests[path] = (st.st_size, st.st_mtime_ns, d)
+    return st.st_size, d
+
+
+def write_bytes(path: PathLike, data: bytes) -> bool:
+    """内容が変わったときだけ一時ファイル → rename で書く。書いたら True。"""
+    path = os.fspath(path)
+    new = _digest(data)
+    size, old = _current_digest(path)
+    if size == len(data) and old == new:
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    st = os.stat(path)
+    _digests[path] = (st.st_size, st.st_mtime_ns, new)
+    return True
+
+
+def write_text(path: PathLike, text: str, encoding: str = "utf-8") -> bool:
+    return write_bytes(path, text.encode(encoding))
+
+
+def dumps(obj: Any, **dump_kw) -> str:
+    """公開用の JSON 文字列。indent を渡さなければ区切りの空白も入れない。"""
+    dump_kw.setdefault("ensure_ascii", False)
+    if dump_kw.get("indent") is None:
+        dump_kw.setdefault("separators", (",", ":"))
+    return json.dumps(obj, **dump_kw)
+
+
+def write_json(path: PathLike, obj: Any, **dump_kw) -> bool:
+    """dumps(obj, **dump_kw) を write_text する。"""
+    return write_text(path, dumps(obj, **dump_kw))
+
+
+def stylesheet() -> str:
+    return STYLESHEET.read_text(encoding="utf-8")
+
+
+def write_stylesheet(out_dir: PathLike) -> bool:
+    """out_dir に共通 CSS を置く（ページは相対パス takao35.css で参照する）。"""
+    return write_text(Path(out_dir) / STYLESHEET_NAME, stylesheet())
+
+
+def precompress(path: PathLike) -> Dict[Path, int]:
+    """path の横に .gz を作る（変わったときだけ書く）。{パス: バイト数}（元ファイルを含む）。"""
+    path = Path(path)
+    data = path.read_bytes()
+    gz = path.with_name(path.name + ".gz")
+    packed = gzip.compress(data, compresslevel=9, mtime=0)
+    write_bytes(gz, packed)
+    return {path: len(data), gz: len(packed)}
+
+
+def write_all(outputs: Union[Dict[PathLike, str], Iterable[Tuple[PathLike, str]]]) -> Dict[Path, bool]:
+    """{パス: 本文} をまとめて write_text。{パス: 書いたか} を返す。"""
+    items = outputs.items() if isinstance(outputs, dict) else outputs
+    return {Path(p): write_text(p, text) for p, text in items}
+
+
+def changed(flags: Dict[Path, bool]) -> int:
+    """write_all の戻り値のうち、実際に書いた数。"""
+    return sum(flags.values())
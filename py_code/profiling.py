@@ -0,0 +1,167 @@
+# py_code/profiling.py
+"""
+各エントリポイント共通のプロファイル用フック。
+
+  python keio_base.py --profile ...        # もしくは TAKAO35_PROFILE=1
+  python -m py_code.profiling diff logs/profile/A.pstats logs/profile/B.pstats
+
+--profile（または env TAKAO35_PROFILE=1）のとき、logs/profile/<名前>_<日時>.* に
+  .pstats        cProfile の生ダンプ（snakeviz / pstats で開ける）
+  .alloc.txt     tracemalloc の確保量 上位 N 行
+  .spans.json    span() で囲んだ区間の壁時計ツリー
+を書く。無効時は span() も含めてほぼ素通り。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from py_code.config import LOG_DIR
+
+PROFILE_DIR = Path(os.getenv("TAKAO35_PROFILE_DIR", LOG_DIR / "profile"))
+TOP_ALLOC = 30
+
+_active = False
+_stack: List[Dict] = []
+
+
+def enabled(argv: Optional[List[str]] = None) -> bool:
+    """--profile を argv から取り除いて（後段の argparse に渡さない）有効/無効を返す。"""
+    argv = sys.argv if argv is None else argv
+    flag = "--profile" in argv
+    while "--profile" in argv:
+        argv.remove("--profile")
+    return flag or os.getenv("TAKAO35_PROFILE", "") not in ("", "0")
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """壁時計の区間。profiled() の内側でだけ記録され、入れ子はツリーになる。"""
+    if not _active:
+        yield
+        return
+    node = {"name": name, "children": []}
+    _stack[-1]["children"].append(node)
+    _stack.append(node)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        node["wall_s"] = round(time.perf_counter() - t0, 4)
+        _stack.pop()
+
+
+def _format_tree(node: Dict, depth: int = 0) -> List[str]:
+    lines = [f"{'  ' * depth}{node['name']:<{40 - 2 * depth}} {node.get('wall_s', 0):9.3f}s"]
+    for ch in node["children"]:
+        lines += _format_tree(ch, depth + 1)
+    return lines
+
+
+@contextmanager
+def profiled(name: str, *, enable: Optional[bool] = None, top: int = TOP_ALLOC) -> Iterator[None]:
+    """
+    エントリポイントの本体を囲む。enable 省略時は enabled() で判定。
+      if __name__ == "__main__":
+          with profiled("make_timetable"):
+              main()
+    """
+    global _active
+    if enable is None:
+        enable = enabled()
+    if not enable or _active:
+        yield
+        return
+    import cProfile  # 無効時の import コストを払わないよう、ここで読む
+    import tracemalloc
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = PROFILE_DIR / f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    root = {"name": name, "children": []}
+    _stack[:] = [root]
+    _active = True
+    tracemalloc.start(10)
+    prof = cProfile.Profile()
+    t0 = time.perf_counter()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        root["wall_s"] = round(time.perf_counter() - t0, 4)
+        snap = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _active = False
+        _stack.clear()
+
+        prof.dump_stats(str(stem) + ".pstats")
+        snap = snap.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>")])
+        with open(str(stem) + ".alloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"peak {peak / 1024:.1f} KiB\n")
+            for st in snap.statistics("lineno")[:top]:
+                f.write(f"{st.size / 1024:10.1f} KiB {st.count:8d} blocks  {st.traceback}\n")
+        with open(str(stem) + ".spans.json", "w", encoding="utf-8") as f:
+            json.dump(root, f, ensure_ascii=False, indent=2)
+
+        print("\n".join(["[profile] spans:"] + _format_tree(root)))
+        print(f"[profile] peak {peak / 1024 / 1024:.1f} MiB -> {stem}.{{pstats,alloc.txt,spans.json}}")
+
+
+# ---------------- diff ----------------
+def _load(path: str) -> Dict[str, tuple]:
+    """{ "file:line(func)": (ncalls, tottime, cumtime) }"""
+    import pstats
+    st = pstats.Stats(path)
+    out = {}
+    for (fn, line, func), (cc, nc, tt, ct, _callers) in st.stats.items():
+        out[f"{os.path.basename(fn)}:{line}({func})"] = (nc, tt, ct)
+    return out
+
+
+def diff(a_path: str, b_path: str, *, key: str = "tottime", top: int = 25) -> List[tuple]:
+    """2 つの .pstats を関数単位で比べ、差の大きい順に (関数, A, B, 差) を返す。"""
+    idx = {"ncalls": 0, "tottime": 1, "cumtime": 2}[key]
+    a, b = _load(a_path), _load(b_path)
+    rows = []
+    for fn in set(a) | set(b):
+        va = a.get(fn, (0, 0.0, 0.0))[idx]
+        vb = b.get(fn, (0, 0.0, 0.0))[idx]
+        rows.append((fn, va, vb, vb - va))
+    rows.sort(key=lambda r: abs(r[3]), reverse=True)
+    return rows[:top]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="profile helpers")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("diff", help="compare two .pstats dumps (B - A)")
+    d.add_argument("a")
+    d.add_argument("b")
+    d.add_argument("--key", choices=["tottime", "cumtime", "ncalls"], default="tottime")
+    d.add_argument("--top", type=int, default=25)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "diff":
+        import pstats
+        total_a = pstats.Stats(args.a).total_tt
+        total_b = pstats.Stats(args.b).total_tt
+        print(f"total {total_a:.3f}s -> {total_b:.3f}s ({total_b - total_a:+.3f}s)")
+        print(f"{'A':>10} {'B':>10} {'B-A':>10}  function ({args.key})")
+        for fn, va, vb, dv in diff(args.a, args.b, key=args.key, top=args.top):
+            if args.key == "ncalls":
+                print(f"{va:>10d} {vb:>10d} {dv:>+10d}  {fn}")
+            else:
+                print(f"{va:>10.4f} {vb:>10.4f} {dv:>+10.4f}  {fn}")
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
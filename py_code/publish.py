@@ -0,0 +1,302 @@
+# py_code/publish.py
+"""
+CoreServer への FTPS アップロード（lftp スクリプトの置き換え）。
+
+- 1 回の実行で接続は 1 本。アップロードも古いファイルの削除も同じセッションで行う。
+  変わったファイルが無ければログインもしない。
+- 送ったファイルの内容ハッシュ（sha256）をローカルのマニフェスト（MANIFEST_PATH）に覚えておき、
+  同じ中身は送らない。リモート側を手で消したときなどは --force で全部送り直す。
+- 送るときは <名前>.part に STOR → RNFR/RNTO で置き換え（閲覧側が書きかけを見ない）。
+- 日付入りファイル（YYYYMMDD_*）の保持期間切れは NLST 1 回で拾って、その場でまとめて DELE。
+- --compress で JSON / HTML / CSS の横に .gz（gzip -9）を作って一緒に送り、素のサイズと .gz のサイズを表にする。
+
+  python -m py_code.publish --remote-dir /weather --compress takao_current.html takao_current.json \\
+      --mirror py_data/weather/points=points
+  python -m py_code.publish --remote-dir /train 20250909_x.json 20250909_x.json=latest_x.json \\
+      --prune '*_x.json' --keep-days 100
+
+接続先は env FTP_HOST / FTP_USER / FTP_PASS（~/.secrets_coreserver）。FTP_PORT（既定 21）、
+FTP_TLS=0 で平文（ローカルの app/fake_ftp.py 相手に試すとき）。
+"""
+import argparse
+import fnmatch
+import ftplib
+import hashlib
+import json
+import os
+import posixpath
+import ssl
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from py_code.config import RUNTIME_DIR
+from py_code.output import COMPRESSIBLE, precompress, write_json
+from py_code.runtime_guard import job_lock
+
+MANIFEST_PATH = Path(os.getenv("PUBLISH_MANIFEST", RUNTIME_DIR / "publish_manifest.json"))
+TIMEOUT = 30
+RETRY_ERRORS = (OSError, EOFError, ftplib.error_temp)  # 接続が切れた類。1 回だけ繋ぎ直す
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Publisher:
+    """
+    with Publisher() as pub:
+        pub.put("/local/a.json", "/train/a.json")
+        pub.prune("/train", ["*_x.json"], keep_days=100)
+    """
+
+    def __init__(self, host: Optional[str] = None, user: Optional[str] = None, password: Optional[str] = None,
+                 *, port: Optional[int] = None, tls: Optional[bool] = None, force: bool = False, dry_run: bool = False,
+                 compress: bool = False):
+        self.host = host or os.environ["FTP_HOST"]
+        self.user = user or os.environ["FTP_USER"]
+        self.password = password if password is not None else os.environ["FTP_PASS"]
+        self.port = port or int(os.getenv("FTP_PORT", "21"))
+        self.tls = (os.getenv("FTP_TLS", "1") != "0") if tls is None else tls
+        self.force = force
+        self.dry_run = dry_run
+        self.compress = compress
+        self.sizes: List[Tuple[str, int, int]] = []  # --compress の表（リモートパス, 素, .gz）
+        self.ftp: Optional[ftplib.FTP] = None
+        self.manifest: Dict[str, Dict] = self._load_manifest()
+        self.updates: Dict[str, Dict] = {}
+        self.removed: Set[str] = set()
+        self._dirs: Set[str] = set()  # このセッションで存在を確かめたリモートディレクトリ
+        self.stats = {"uploaded": 0, "unchanged": 0, "deleted": 0, "bytes": 0}
+
+    # ---------------- 接続 ----------------
+    def _connect(self) -> ftplib.FTP:
+        if self.ftp is not None:
+            return self.ftp
+        if self.tls:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE  # lftp の ssl:verify-certificate no と同じ
+            ftp = ftplib.FTP_TLS(context=ctx, timeout=TIMEOUT)
+        else:
+            ftp = ftplib.FTP(timeout=TIMEOUT)
+        ftp.connect(self.host, self.port)
+        ftp.login(self.user, self.password)
+        if self.tls:
+            ftp.prot_p()  # データ接続も暗号化（ftp:ssl-protect-data true）
+        self.ftp = ftp
+        self._dirs.clear()
+        return ftp
+
+    def _drop(self) -> None:
+        if self.ftp is not None:
+            try:
+                self.ftp.close()
+            finally:
+                self.ftp = None
+
+    def _retry(self, fn, *args):
+        try:
+            return fn(self._connect(), *args)
+        except RETRY_ERRORS as e:
+            print(f"[warn] publish: {type(e).__name__}: {e} (reconnecting)")
+            self._drop()
+            return fn(self._connect(), *args)
+
+    def close(self) -> None:
+        if self.ftp is not None:
+            try:
+                self.ftp.quit()
+            except (*RETRY_ERRORS, ftplib.error_perm):
+                pass
+            self._drop()
+        self._save_manifest()
+
+    def __enter__(self) -> "Publisher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------------- マニフェスト ----------------
+    def _key(self, remote: str) -> str:
+        return f"{self.user}@{self.host}:{self.port}{remote}"
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        try:
+            return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self) -> None:
+        """別ジョブ（weather / rail / timetable）と同じファイルなので、ロックして読み直してから足す。"""
+        if self.dry_run or not (self.updates or self.removed):
+            return
+        with job_lock("publish_manifest", wait=True):
+            doc = self._load_manifest()
+            doc.update(self.updates)
+            for k in self.removed:
+                doc.pop(k, None)
+            write_json(MANIFEST_PATH, doc, indent=1, sort_keys=True)
+        self.updates.clear()
+        self.removed.clear()
+
+    # ---------------- 操作 ----------------
+    def _ensure_dir(self, ftp: ftplib.FTP, remote_dir: str) -> None:
+        if remote_dir in self._dirs or remote_dir in ("", "/"):
+            return
+        parent = posixpath.dirname(remote_dir.rstrip("/"))
+        self._ensure_dir(ftp, parent)
+        try:
+            ftp.mkd(remote_dir)
+        except ftplib.error_perm:
+            pass  # 既にある
+        self._dirs.add(remote_dir)
+
+    def _store(self, ftp: ftplib.FTP, local: str, remote: str) -> None:
+        self._ensure_dir(ftp, posixpath.dirname(remote))
+        part = remote + ".part"
+        with open(local, "rb") as f:
+            ftp.storbinary(f"STOR {part}", f)
+        ftp.rename(part, remote)
+
+    def put(self, local: str, remote: str) -> bool:
+        """local を remote（絶対パス）へ。前回送った中身と同じなら送らない。送ったら True。"""
+        if self.compress and local.endswith(COMPRESSIBLE):
+            (_, raw), (gz, packed) = precompress(local).items()
+            self.sizes.append((remote, raw, packed))
+            sent = self._put(local, remote)
+            return self._put(str(gz), remote + ".gz") or sent
+        return self._put(local, remote)
+
+    def _put(self, local: str, remote: str) -> bool:
+        digest = file_digest(local)
+        key = self._key(remote)
+        known = self.updates.get(key) or self.manifest.get(key)
+        if not self.force and known and known.get("sha256") == digest:
+            self.stats["unchanged"] += 1
+            return False
+        size = os.path.getsize(local)
+        if self.dry_run:
+            print(f"[dry-run] put {local} -> {remote} ({size} B)")
+        else:
+            self._retry(self._store, local, remote)
+            print(f"put {remote} ({size} B)")
+        self.updates[key] = {"sha256": digest, "size": size,
+                             "uploaded_at": datetime.now().isoformat(timespec="seconds")}
+        self.stats["uploaded"] += 1
+        self.stats["bytes"] += size
+        return True
+
+    def mirror(self, local_dir: str, remote_dir: str) -> int:
+        """local_dir 以下を remote_dir へ（lftp mirror -R 相当、削除はしない）。送った数を返す。"""
+        n = 0
+        for root, dirs, files in os.walk(local_dir):
+            dirs.sort()
+            rel = os.path.relpath(root, local_dir)
+            for name in sorted(files):
+                if name.endswith(".part") or ".tmp" in name:
+                    continue  # 書きかけ（py_code.output の一時ファイルなど）
+                if self.compress and name.endswith(".gz"):
+                    continue  # put() が元ファイルと一緒に送る
+                sub = name if rel == "." else posixpath.join(rel.replace(os.sep, "/"), name)
+                n += self.put(os.path.join(root, name), posixpath.join(remote_dir, sub))
+        return n
+
+    def _list(self, ftp: ftplib.FTP, remote_dir: str) -> List[str]:
+        try:
+            return [posixpath.basename(p) for p in ftp.nlst(remote_dir)]
+        except ftplib.error_perm:
+            return []  # 空ディレクトリで 550 を返すサーバーがある
+
+    def _delete(self, ftp: ftplib.FTP, remote: str) -> None:
+        ftp.delete(remote)
+
+    def prune(self, remote_dir: str, patterns: Iterable[str], keep_days: int, today: Optional[datetime] = None) -> int:
+        """remote_dir のうち patterns に合い、先頭の YYYYMMDD が keep_days より古いものを消す（.gz の横も）。"""
+        cutoff = ((today or datetime.now()) - timedelta(days=keep_days)).strftime("%Y%m%d")
+        patterns = list(patterns)
+        names = self._retry(self._list, remote_dir)
+        old = sorted(n for n in names
+                     if any(fnmatch.fnmatch(n[:-3] if n.endswith(".gz") else n, p) for p in patterns)
+                     and n[:8].isdigit() and n[8:9] == "_" and n[:8] < cutoff)
+        for name in old:
+            remote = posixpath.join(remote_dir, name)
+            if self.dry_run:
+                print(f"[dry-run] delete {remote}")
+                continue
+            try:
+                self._retry(self._delete, remote)
+            except ftplib.error_perm as e:
+                print(f"[warn] failed to delete {remote}: {e}")
+                continue
+            print(f"Remote delete: {name}")
+            self.removed.add(self._key(remote))
+            self.updates.pop(self._key(remote), None)
+            self.stats["deleted"] += 1
+        return len(old)
+
+
+def print_size_report(sizes: List[Tuple[str, int, int]]) -> None:
+    if not sizes:
+        return
+    w = max(len(r) for r, _, _ in sizes)
+    print(f"{'file':<{w}} {'raw':>9} {'gzip':>9} {'ratio':>6}")
+    for remote, raw, packed in sizes:
+        print(f"{remote:<{w}} {raw:>9} {packed:>9} {packed / raw if raw else 1:>6.1%}")
+    raw, packed = sum(s[1] for s in sizes), sum(s[2] for s in sizes)
+    print(f"{'total':<{w}} {raw:>9} {packed:>9} {packed / raw if raw else 1:>6.1%}")
+
+
+def _split_target(arg: str) -> Tuple[str, Optional[str]]:
+    """"local=remote_name" → (local, remote_name)。"=" が無ければ (local, None)。"""
+    local, sep, name = arg.partition("=")
+    return local, (name if sep else None)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="upload changed files to CoreServer over FTPS")
+    ap.add_argument("files", nargs="*", help="LOCAL or LOCAL=REMOTE_NAME (relative to --remote-dir)")
+    ap.add_argument("--remote-dir", required=True)
+    ap.add_argument("--mirror", action="append", default=[], metavar="LOCAL_DIR[=REMOTE_SUBDIR]")
+    ap.add_argument("--prune", action="append", default=[], metavar="PATTERN",
+                    help="delete dated remote files (YYYYMMDD_*) matching PATTERN older than --keep-days")
+    ap.add_argument("--keep-days", type=int, default=100)
+    ap.add_argument("--force", action="store_true", help="ignore the manifest and upload everything")
+    ap.add_argument("--compress", action="store_true", help="also upload .gz siblings of JSON/HTML/CSS and print sizes")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    remote_dir = "/" + args.remote_dir.strip("/")
+    failed = 0
+    with Publisher(force=args.force, dry_run=args.dry_run, compress=args.compress) as pub:
+        for arg in args.files:
+            local, name = _split_target(arg)
+            if not os.path.isfile(local):
+                print(f"[warn] missing: {local}")
+                continue
+            try:
+                pub.put(local, posixpath.join(remote_dir, name or os.path.basename(local)))
+            except (*RETRY_ERRORS, ftplib.Error) as e:
+                failed += 1
+                print(f"[error] {local}: {type(e).__name__}: {e}")
+        for arg in args.mirror:
+            local, sub = _split_target(arg)
+            if os.path.isdir(local):
+                pub.mirror(local, posixpath.join(remote_dir, sub or os.path.basename(local.rstrip("/"))))
+        if args.prune:
+            pub.prune(remote_dir, args.prune, args.keep_days)
+        s = pub.stats
+    print_size_report(pub.sizes)
+    print(f"publish {remote_dir}: {s['uploaded']} uploaded ({s['bytes']} B), {s['unchanged']} unchanged, "
+          f"{s['deleted']} deleted" + (f", {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
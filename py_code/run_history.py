@@ -0,0 +1,211 @@
+# py_code/run_history.py
+"""
+パイプライン各段（collect / postprocess / make_timetable / render / upload）の
+所要時間・行数・リクエスト数を SQLite（logs/run_history.sqlite3）に追記し、推移を見る。
+
+  python -m py_code.run_history record --stage upload --started-epoch 1730923200.1
+  python -m py_code.run_history report --threshold 30
+  python -m py_code.run_history backfill            # logs/keio_*.log を取り込む
+
+report は各段の最新値を直近 14 日の中央値と比べ、threshold% 以上遅ければ SLOWER を付ける。
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from py_code.config import LOG_DIR
+
+DB_PATH = Path(os.getenv("TAKAO35_RUN_HISTORY", LOG_DIR / "run_history.sqlite3"))
+JOB = "keio_daily"
+STAGES = ["collect", "postprocess", "make_timetable", "render", "upload", "pipeline"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_runs (
+    id          INTEGER PRIMARY KEY,
+    job         TEXT NOT NULL,
+    run_date    TEXT NOT NULL,          -- YYYY-MM-DD（対象日）
+    stage       TEXT NOT NULL,
+    started_at  TEXT NOT NULL,          -- ISO8601
+    duration_s  REAL NOT NULL,
+    rows        INTEGER,
+    requests    INTEGER,
+    status      TEXT NOT NULL DEFAULT 'ok',
+    source      TEXT NOT NULL DEFAULT 'live',
+    UNIQUE (job, stage, started_at)
+);
+CREATE INDEX IF NOT EXISTS idx_stage_runs_stage_date ON stage_runs (job, stage, run_date);
+"""
+
+
+def connect(path: Path = DB_PATH) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def record_stage(stage: str, duration_s: float, *, rows: Optional[int] = None, requests: Optional[int] = None,
+                 run_date: Optional[str] = None, started_at: Optional[datetime] = None,
+                 status: str = "ok", source: str = "live", job: str = JOB) -> bool:
+    """1 段分を追記。同じ (job, stage, started_at) が既にあれば何もせず False。"""
+    started_at = started_at or (datetime.now() - timedelta(seconds=duration_s))
+    run_date = run_date or started_at.date().isoformat()
+    with connect() as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO stage_runs (job, run_date, stage, started_at, duration_s, rows, requests, status, source)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job, run_date, stage, started_at.isoformat(timespec="seconds"), round(duration_s, 3),
+             rows, requests, status, source),
+        )
+        return cur.rowcount > 0
+
+
+@contextmanager
+def stage_timer(stage: str, *, run_date: Optional[str] = None, enabled: bool = True) -> Iterator[Dict]:
+    """
+    with stage_timer("render") as st: ...; st["rows"] = n
+    例外時も status='error' で記録してから再送出する。記録に失敗しても本処理は止めない。
+    """
+    info: Dict = {}
+    started = datetime.now()
+    t0 = time.monotonic()
+    status = "ok"
+    try:
+        yield info
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if enabled:
+            try:
+                record_stage(stage, time.monotonic() - t0, rows=info.get("rows"), requests=info.get("requests"),
+                             run_date=run_date, started_at=started, status=status)
+            except sqlite3.Error as e:
+                print(f"[warn] run_history: {e}")
+
+
+# ---------------- report ----------------
+def report(*, days: int = 30, baseline_days: int = 14, threshold_pct: float = 30.0, job: str = JOB) -> List[str]:
+    """推移を表示し、回帰した段の名前を返す。"""
+    since = (date.today() - timedelta(days=days)).isoformat()
+    flagged: List[str] = []
+    with connect() as conn:
+        for stage in STAGES:
+            rows = conn.execute(
+                "SELECT run_date, duration_s, rows, requests FROM stage_runs"
+                " WHERE job = ? AND stage = ? AND status = 'ok' AND run_date >= ? ORDER BY started_at",
+                (job, stage, since),
+            ).fetchall()
+            if not rows:
+                continue
+            last_date, last_dur, last_rows, last_reqs = rows[-1]
+            cutoff = (date.fromisoformat(last_date) - timedelta(days=baseline_days)).isoformat()
+            base = [r[1] for r in rows[:-1] if r[0] >= cutoff]
+            median = statistics.median(base) if base else None
+            delta = ((last_dur / median - 1.0) * 100.0) if median else None
+            mark = ""
+            if delta is not None and delta > threshold_pct:
+                mark = "  << SLOWER"
+                flagged.append(stage)
+            trend = " ".join(f"{r[1]:.0f}" for r in rows[-7:])
+            print(f"{stage:<15} last {last_date} {last_dur:9.1f}s"
+                  f"  median{baseline_days}d {('%.1fs' % median) if median else '—':>9}"
+                  f"  {('%+.0f%%' % delta) if delta is not None else '':>6}"
+                  f"  rows={last_rows if last_rows is not None else '—'} reqs={last_reqs if last_reqs is not None else '—'}"
+                  f"  [{trend}]{mark}")
+    return flagged
+
+
+# ---------------- backfill ----------------
+_RX_MARK = re.compile(r"^=== (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) (start|done) ===")
+_RX_ROWS = re.compile(r"\] 本数:\s*(\d+)")
+_RX_CANDS = re.compile(r"^minutesからの候補本数:\s*(\d+)")
+
+
+def backfill(log_dir: Path = LOG_DIR) -> int:
+    """logs/keio_YYYY-MM-DD.log の start/done 行から pipeline 段の記録を起こす（何度流しても重複しない）。"""
+    n = 0
+    for path in sorted(glob.glob(str(log_dir / "keio_*.log"))):
+        started: Optional[datetime] = None
+        rows = reqs = 0
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                m = _RX_MARK.match(line)
+                if m:
+                    ts = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
+                    if m.group(2) == "start":
+                        started, rows, reqs = ts, 0, 0
+                    elif started is not None:
+                        n += record_stage("pipeline", (ts - started).total_seconds(), rows=rows, requests=reqs,
+                                          started_at=started, source="backfill")
+                        started = None
+                    continue
+                if started is None:
+                    continue
+                if line.startswith("[timetable] HTTP"):
+                    reqs += 1
+                elif _RX_CANDS.match(line):
+                    reqs += int(_RX_CANDS.match(line).group(1))  # 候補 1 本 = stops 1 リクエスト
+                else:
+                    m = _RX_ROWS.search(line)
+                    if m:
+                        rows += int(m.group(1))
+    return n
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Keio pipeline run history")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="append one stage result")
+    rec.add_argument("--stage", required=True, choices=STAGES)
+    g = rec.add_mutually_exclusive_group(required=True)
+    g.add_argument("--duration", type=float, help="seconds")
+    g.add_argument("--started-epoch", type=float, help="start time (date +%%s.%%N); duration = now - start")
+    rec.add_argument("--rows", type=int)
+    rec.add_argument("--requests", type=int)
+    rec.add_argument("--status", default="ok")
+    rec.add_argument("--run-date", default=None, help="YYYY-MM-DD")
+
+    rep = sub.add_parser("report", help="show trends and flag regressions")
+    rep.add_argument("--days", type=int, default=30)
+    rep.add_argument("--baseline-days", type=int, default=14)
+    rep.add_argument("--threshold", type=float, default=30.0, help="percent slower than the median to flag")
+    rep.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a stage is flagged")
+
+    bf = sub.add_parser("backfill", help="import logs/keio_*.log")
+    bf.add_argument("--log-dir", default=str(LOG_DIR))
+
+    args = ap.parse_args(argv)
+    if args.cmd == "record":
+        if args.duration is not None:
+            duration = args.duration
+            started = None
+        else:
+            duration = time.time() - args.started_epoch
+            started = datetime.fromtimestamp(args.started_epoch)
+        record_stage(args.stage, duration, rows=args.rows, requests=args.requests,
+                     run_date=args.run_date, started_at=started, status=args.status)
+        return 0
+    if args.cmd == "report":
+        flagged = report(days=args.days, baseline_days=args.baseline_days, threshold_pct=args.threshold)
+        if flagged:
+            print("regressions:", ", ".join(flagged))
+        return 1 if (flagged and args.fail_on_regression) else 0
+    if args.cmd == "backfill":
+        print("imported:", backfill(Path(args.log_dir)))
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# py_code/runtime_guard.py
+"""
+RUNTIME_DIR（env REPP_RATE_STATE_DIR, 既定 var/rate）に状態を置く、プロセス横断の制御。
+
+- job_lock(name): ジョブ単位の多重起動防止（fcntl.flock）。
+  ロックファイルは RUNTIME_DIR/<name>.lock。シェル側の `flock` と同じファイルを共有できる。
+- HostRateLimiter(host): リモートホスト単位のトークンバケット。
+  状態は RUNTIME_DIR/host_<host>.bucket に保存し、cron で重なった別プロセスとも共有する。
+"""
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+from py_code.config import RUNTIME_DIR
+
+# ホストごとの既定レート（req/s, バースト）。未登録ホストは DEFAULT_HOST_RATE。
+HOST_RATES: Dict[str, tuple] = {
+    "transfer-train.navitime.biz": (3.0, 3),
+    "traininfo.jreast.co.jp": (1.0, 3),
+    "www.keio.co.jp": (1.0, 2),
+    "www.jma.go.jp": (2.0, 4),
+    "xml.kishou.go.jp": (1.0, 2),
+    "api.open-meteo.com": (1.0, 2),
+    "map.yahooapis.jp": (1.0, 2),
+    # ローカルの代替サーバー（train/fake_navitime.py）は実質無制限
+    "127.0.0.1": (1000.0, 1000),
+    "localhost": (1000.0, 1000),
+}
+DEFAULT_HOST_RATE = (1.0, 2)
+
+
+class JobLocked(RuntimeError):
+    """同名ジョブが別プロセスで実行中。"""
+
+
+def _runtime_path(name: str) -> str:
+    os.makedirs(RUNTIME_DIR, exist_ok=True)
+    safe = "".join(c if (c.isalnum() or c in "-_.") else "_" for c in name)
+    return os.path.join(RUNTIME_DIR, safe)
+
+
+@contextmanager
+def job_lock(name: str, *, wait: bool = False) -> Iterator[None]:
+    """
+    単一インスタンス保証。wait=False なら実行中のとき JobLocked を投げる。
+    プロセスが落ちればカーネルがロックを解放するので、stale lock の掃除は不要。
+    """
+    path = _runtime_path(f"{name}.lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            raise JobLocked(f"{name} is already running (lock: {path})") from None
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        yield
+    finally:
+        os.close(fd)
+
+
+class HostRateLimiter:
+    """ファイルに状態を持つトークンバケット。acquire() は必要なだけ待ってから 1 トークン消費する。"""
+
+    def __init__(self, host: str, rate: Optional[float] = None, burst: Optional[int] = None):
+        d_rate, d_burst = HOST_RATES.get(host, DEFAULT_HOST_RATE)
+        self.host = host
+        self.rate = rate or d_rate
+        self.burst = burst or d_burst
+        self.path = _runtime_path(f"host_{host}.bucket")
+
+    def _take(self) -> float:
+        """トークンを 1 つ取れれば 0、取れなければ待つべき秒数を返す。"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.read(fd, 4096)
+            now = time.time()
+            try:
+                st = json.loads(raw) if raw else {}
+            except ValueError:
+                st = {}
+            tokens = float(st.get("tokens", self.burst))
+            last = float(st.get("ts", now))
+            tokens = min(float(self.burst), tokens + max(0.0, now - last) * self.rate)
+
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / self.rate
+
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps({"tokens": tokens, "ts": now}).encode())
+            return wait
+        finally:
+            os.close(fd)  # close で flock も外れる
+
+    def acquire(self) -> float:
+        """1 リクエスト分の許可を得る。待った秒数を返す。"""
+        waited = 0.0
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+_limiters: Dict[str, HostRateLimiter] = {}
+
+
+def throttle(url: str) -> float:
+    """URL のホストに対応するバケットから 1 トークン取る（呼び出し側はこれだけでよい）。"""
+    host = urlsplit(url).hostname or ""
+    lim = _limiters.get(host)
+    if lim is None:
+        lim = _limiters[host] = HostRateLimiter(host)
+    return lim.acquire()
+
+
+__all__ = ["job_lock", "JobLocked", "HostRateLimiter", "throttle", "HOST_RATES"]
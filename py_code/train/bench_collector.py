@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+bench_collector.py
+- fake_navitime.py を裏で立て、keio_base.py を実プロセスとして流して
+  エンドツーエンドの所要時間とリクエスト数を測る。
+- シナリオ（遅延・エラー率・429率）× レート設定（初期/上限 req/s）の組み合わせを順に実行。
+
+例:
+  python bench_collector.py --from-csv 20250909 --routes kitano_to_takao --rates 0.8:3,5:20
+"""
+
+import asyncio
+import csv
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from fake_navitime import FakeNavitime, load_fixtures, DATA_DIR
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    "clean": dict(latency=0.02, jitter=0.01),
+    "slow": dict(latency=0.3, jitter=0.2),
+    "flaky": dict(latency=0.05, jitter=0.02, error_rate=0.02, rate_429=0.02),
+}
+
+
+class _ServerThread:
+    """別スレッドのイベントループで FakeNavitime を動かす。"""
+
+    def __init__(self, app: FakeNavitime):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+        self.port = 0
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            server = self.loop.run_until_complete(app.serve("127.0.0.1", 0))
+            self.port = server.sockets[0].getsockname()[1]
+            self._server = server
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self._server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+def _count_rows(out_dir: str) -> int:
+    n = 0
+    for p in glob.glob(os.path.join(out_dir, "*.csv")):
+        with open(p, newline="", encoding="utf-8") as f:
+            n += sum(1 for _ in csv.DictReader(f))
+    return n
+
+
+def run_case(fixtures, ymd: str, routes: str, scenario: str, initial_rate: float, max_rate: float) -> Dict:
+    app = FakeNavitime(fixtures, seed=1, **SCENARIOS[scenario])
+    srv = _ServerThread(app)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       REPP_RATE_STATE_DIR=os.path.join(tmp, "rate"),
+                       KEIO_RATE_INITIAL=str(initial_rate),
+                       KEIO_RATE_MAX=str(max_rate))
+            cmd = [sys.executable, os.path.join(HERE, "keio_base.py"),
+                   "--base-url", f"http://127.0.0.1:{srv.port}",
+                   "--date", f"{ymd[:4]}-{ymd[4:6]}-{ymd[6:]}T09:00",
+                   "--routes", routes, "--out-dir", tmp, "--metrics-dir", os.path.join(tmp, "metrics"),
+                   "--no-archive"]
+            t0 = time.perf_counter()
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            wall = time.perf_counter() - t0
+            rows = _count_rows(tmp)
+    finally:
+        srv.stop()
+    stats = dict(app.stats)
+    return {
+        "scenario": scenario,
+        "initial_rate": initial_rate,
+        "max_rate": max_rate,
+        "wall_s": round(wall, 2),
+        "requests": sum(v for k, v in stats.items() if not k.endswith(":bytes")),
+        "rows": rows,
+        "exit": proc.returncode,
+        "stats": stats,
+    }
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="End-to-end benchmark of keio_base.py against fake_navitime.py")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--archive", help="YYYYMMDD: recorded payload archive")
+    src.add_argument("--from-csv", help="YYYYMMDD: synthesize from collected CSVs")
+    ap.add_argument("--data-dir", default=DATA_DIR)
+    ap.add_argument("--routes", default="kitano_to_takao")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ",".join(SCENARIOS))
+    ap.add_argument("--rates", default="0.8:3", help="comma-separated INITIAL:MAX req/s pairs")
+    ap.add_argument("--json", default=None, help="write results to this JSON file")
+    args = ap.parse_args()
+
+    ymd = (args.archive or args.from_csv).replace("-", "")
+    fixtures = load_fixtures(archive=args.archive, from_csv=args.from_csv, data_dir=args.data_dir)
+
+    results: List[Dict] = []
+    print(f"{'scenario':<8} {'rate':>9} {'wall[s]':>8} {'reqs':>6} {'rows':>5}  status")
+    for scenario in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        for pair in args.rates.split(","):
+            initial, _, mx = pair.partition(":")
+            res = run_case(fixtures, ymd, args.routes, scenario, float(initial), float(mx or initial))
+            results.append(res)
+            st = " ".join(f"{k}={v}" for k, v in sorted(res["stats"].items()) if not k.endswith(":bytes"))
+            print(f"{scenario:<8} {pair:>9} {res['wall_s']:>8.2f} {res['requests']:>6} {res['rows']:>5}  {st}"
+                  + ("" if res["exit"] == 0 else f"  (exit {res['exit']})"))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print("results ->", args.json)
+
+
+if __name__ == "__main__":
+    main()
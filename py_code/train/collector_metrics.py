@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+collector_metrics.py
+- keio_base.py の 1 回の実行について、エンドポイント別に
+  レイテンシ分布・ステータス・再試行回数・受信バイト数、
+  待ち時間（AIMD の間隔 / ホストバケット / ブレーカー）と通信時間を集計する。
+- 実行の最後に JSON と Prometheus textfile（node_exporter 用）を書き出す。
+"""
+
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.output import write_json, write_text
+
+# レイテンシのヒストグラム境界（秒）
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.n = 0
+
+    def observe(self, v: float) -> None:
+        for i, b in enumerate(BUCKETS):
+            if v <= b:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += v
+        self.n += 1
+
+    def cumulative(self) -> List[int]:
+        out, acc = [], 0
+        for c in self.counts:
+            acc += c
+            out.append(acc)
+        return out
+
+
+class CollectorMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self.latency: Dict[str, _Histogram] = defaultdict(_Histogram)
+        self.status: Counter = Counter()       # (endpoint, status)
+        self.retries: Counter = Counter()      # endpoint
+        self.bytes: Counter = Counter()        # endpoint
+        self.sleep: Counter = Counter()        # kind → 秒
+        self.wire_seconds = 0.0
+
+    # ---- 記録 ----
+    def observe_attempt(self, endpoint: str, *, latency: float, status: str, nbytes: int = 0) -> None:
+        """1 回の HTTP 試行（失敗も含む）。status は "200" / "429" / "timeout" など。"""
+        self.latency[endpoint].observe(latency)
+        self.status[(endpoint, status)] += 1
+        self.bytes[endpoint] += nbytes
+        self.wire_seconds += latency
+
+    def observe_retry(self, endpoint: str) -> None:
+        self.retries[endpoint] += 1
+
+    def observe_sleep(self, kind: str, seconds: float) -> None:
+        if seconds > 0:
+            self.sleep[kind] += seconds
+
+    @property
+    def requests(self) -> int:
+        return sum(h.n for h in self.latency.values())
+
+    # ---- 出力 ----
+    def to_dict(self) -> Dict:
+        elapsed = time.monotonic() - self._t0
+        endpoints = {}
+        for ep, h in sorted(self.latency.items()):
+            endpoints[ep] = {
+                "requests": h.n,
+                "latency_sum_s": round(h.sum, 3),
+                "latency_avg_s": round(h.sum / h.n, 3) if h.n else None,
+                "latency_buckets": {("+Inf" if i == len(BUCKETS) else str(BUCKETS[i])): c
+                                    for i, c in enumerate(h.cumulative())},
+                "status": {st: n for (e, st), n in sorted(self.status.items()) if e == ep},
+                "retries": self.retries[ep],
+                "bytes": self.bytes[ep],
+            }
+        sleep_total = sum(self.sleep.values())
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "elapsed_s": round(elapsed, 3),
+            "wire_s": round(self.wire_seconds, 3),
+            "sleep_s": {k: round(v, 3) for k, v in sorted(self.sleep.items())},
+            "sleep_total_s": round(sleep_total, 3),
+            "other_s": round(max(0.0, elapsed - self.wire_seconds - sleep_total), 3),
+            "endpoints": endpoints,
+        }
+
+    def to_prometheus(self, prefix: str = "keio_collector") -> str:
+        d = self.to_dict()
+        lines = [
+            f"# HELP {prefix}_request_duration_seconds HTTP attempt latency by endpoint",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+        for ep, h in sorted(self.latency.items()):
+            for i, c in enumerate(h.cumulative()):
+                le = "+Inf" if i == len(BUCKETS) else str(BUCKETS[i])
+                lines.append(f'{prefix}_request_duration_seconds_bucket{{endpoint="{ep}",le="{le}"}} {c}')
+            lines.append(f'{prefix}_request_duration_seconds_sum{{endpoint="{ep}"}} {h.sum:.6f}')
+            lines.append(f'{prefix}_request_duration_seconds_count{{endpoint="{ep}"}} {h.n}')
+        lines += [f"# HELP {prefix}_requests_total HTTP attempts by endpoint and status",
+                  f"# TYPE {prefix}_requests_total counter"]
+        for (ep, st), n in sorted(self.status.items()):
+            lines.append(f'{prefix}_requests_total{{endpoint="{ep}",status="{st}"}} {n}')
+        lines += [f"# TYPE {prefix}_retries_total counter"]
+        lines += [f'{prefix}_retries_total{{endpoint="{ep}"}} {n}' for ep, n in sorted(self.retries.items())]
+        lines += [f"# TYPE {prefix}_response_bytes_total counter"]
+        lines += [f'{prefix}_response_bytes_total{{endpoint="{ep}"}} {n}' for ep, n in sorted(self.bytes.items())]
+        lines += [f"# HELP {prefix}_sleep_seconds Time spent waiting before requests, by reason",
+                  f"# TYPE {prefix}_sleep_seconds gauge"]
+        lines += [f'{prefix}_sleep_seconds{{kind="{k}"}} {v}' for k, v in d["sleep_s"].items()]
+        lines += [f"# TYPE {prefix}_wire_seconds gauge", f"{prefix}_wire_seconds {d['wire_s']}",
+                  f"# TYPE {prefix}_run_duration_seconds gauge", f"{prefix}_run_duration_seconds {d['elapsed_s']}",
+                  f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+                  f"{prefix}_last_run_timestamp_seconds {int(self.started)}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: str, prom_path: str) -> None:
+        """JSON と .prom を書く（py_code.output 経由なので node_exporter が書きかけの .prom を読まない）。"""
+        write_json(json_path, self.to_dict(), indent=2)
+        write_text(prom_path, self.to_prometheus())
+
+    def summary(self) -> str:
+        d = self.to_dict()
+        reqs = sum(e["requests"] for e in d["endpoints"].values())
+        return (f"[metrics] {reqs} requests, wire {d['wire_s']:.1f}s, "
+                f"sleep {d['sleep_total_s']:.1f}s {d['sleep_s']}, total {d['elapsed_s']:.1f}s")
@@ -1,20 +1,110 @@
-from dataclasses import dataclass
-from typing import Optional, List, Dict
+# -*- coding: utf-8 -*-
+"""
+経路（新宿⇄高尾山口、直通 / 北野乗換）のモデルと JSON 書き出し。make_timetable.py が使う。
+
+- StationInfo / RouteInfo は __slots__ の素のクラス（1 経路 = 1 オブジェクトで、__dict__ を持たない）。
+- 書き出しは dataclasses.asdict で dict に写さず、iter_routes_json が文字列の断片を直接出す。
+  キーの順と綴り（アプリが読んでいる departuret_time / deptarture_platform のタイポを含む）、
+  区切り（py_code.output.dumps と同じ詰めた形）は従来の asdict + dumps とバイト単位で同じ。
+"""
+from json.encoder import encode_basestring
+from typing import Any, Iterable, Iterator, List, Optional
+
+STATION_KEYS = ("name", "use_type", "departuret_time", "deptarture_platform", "arrival_time", "arrival_platform")
+ROUTE_KEYS = ("train_type", "day_type", "origin_station_info", "terminal_station_info", "transits")
 
 
-@dataclass
 class StationInfo:
-    name: str
-    use_type: str   # deperture, transit, destination
-    departuret_time: Optional[str] = None
-    deptarture_platform: Optional[int] = None
-    arrival_time: Optional[str] = None
-    arrival_platform: Optional[int] = None
-
-@dataclass
+    __slots__ = STATION_KEYS
+
+    def __init__(self, name: str, use_type: str,  # use_type: deperture, transit, destination
+                 departuret_time: Optional[str] = None, deptarture_platform: Optional[str] = None,
+                 arrival_time: Optional[str] = None, arrival_platform: Optional[str] = None):
+        self.name = name
+        self.use_type = use_type
+        self.departuret_time = departuret_time
+        self.deptarture_platform = deptarture_platform
+        self.arrival_time = arrival_time
+        self.arrival_platform = arrival_platform
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in STATION_KEYS}
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, StationInfo) and all(getattr(self, k) == getattr(other, k) for k in STATION_KEYS)
+
+    def __repr__(self) -> str:
+        return f"StationInfo({self.name!r}, {self.use_type!r}, dep={self.departuret_time!r}, arr={self.arrival_time!r})"
+
+
 class RouteInfo:
-    train_type: str  # Keio_Liner, Express, Local
-    day_type: str  # weekday, holiday
-    origin_station_info: StationInfo
-    terminal_station_info: StationInfo
-    transits: Optional[List[StationInfo]] = None
\ No newline at end of file
+    __slots__ = ROUTE_KEYS
+
+    def __init__(self, train_type: str, day_type: str,  # train_type: Keio_Liner, Express, Local / day_type: weekday, holiday
+                 origin_station_info: StationInfo, terminal_station_info: StationInfo,
+                 transits: Optional[List[StationInfo]] = None):
+        self.train_type = train_type
+        self.day_type = day_type
+        self.origin_station_info = origin_station_info
+        self.terminal_station_info = terminal_station_info
+        self.transits = transits
+
+    def to_dict(self) -> dict:
+        return {
+            "train_type": self.train_type,
+            "day_type": self.day_type,
+            "origin_station_info": self.origin_station_info.to_dict(),
+            "terminal_station_info": self.terminal_station_info.to_dict(),
+            "transits": None if self.transits is None else [t.to_dict() for t in self.transits],
+        }
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, RouteInfo) and all(getattr(self, k) == getattr(other, k) for k in ROUTE_KEYS)
+
+    def __repr__(self) -> str:
+        return f"RouteInfo({self.train_type!r}, {self.day_type!r}, {self.origin_station_info!r} -> {self.terminal_station_info!r})"
+
+
+# ---------------- JSON ----------------
+# キー部分（'"name":' など）は先に作っておく
+_STATION_HEADS = tuple(("{" if i == 0 else ",") + encode_basestring(k) + ":" for i, k in enumerate(STATION_KEYS))
+_ROUTE_HEADS = tuple(("{" if i == 0 else ",") + encode_basestring(k) + ":" for i, k in enumerate(ROUTE_KEYS))
+
+
+def _value(v: Any) -> str:
+    """文字列 / None（ほぼこれだけ）と、念のため数値・真偽値。"""
+    if v is None:
+        return "null"
+    if isinstance(v, str):
+        return encode_basestring(v)
+    if v is True:
+        return "true"
+    if v is False:
+        return "false"
+    if isinstance(v, int):
+        return int.__repr__(v)
+    return float.__repr__(v)
+
+
+def _station_json(s: StationInfo) -> str:
+    h = _STATION_HEADS
+    return "".join((h[0], _value(s.name), h[1], _value(s.use_type), h[2], _value(s.departuret_time),
+                    h[3], _value(s.deptarture_platform), h[4], _value(s.arrival_time),
+                    h[5], _value(s.arrival_platform), "}"))
+
+
+def iter_routes_json(routes: Iterable[RouteInfo]) -> Iterator[str]:
+    """経路のリストを JSON 配列として、1 経路ずつの断片で出す（asdict の写しを作らない）。"""
+    h = _ROUTE_HEADS
+    sep = "["
+    for r in routes:
+        transits = "null" if r.transits is None else "[" + ",".join(_station_json(t) for t in r.transits) + "]"
+        yield "".join((sep, h[0], _value(r.train_type), h[1], _value(r.day_type),
+                       h[2], _station_json(r.origin_station_info), h[3], _station_json(r.terminal_station_info),
+                       h[4], transits, "}"))
+        sep = ","
+    yield "]" if sep == "," else "[]"
+
+
+def routes_json(routes: Iterable[RouteInfo]) -> str:
+    return "".join(iter_routes_json(routes))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ダイヤ改正（時刻変更）の検知。
+
+収集した発車（route × day_type）を前回のデータと比べて、列車ごとに分類する。
+  unchanged   operation_id と発車分が同じ
+  retimed     operation_id が同じで発車分が違う
+  renumbered  発車分が同じで operation_id だけ違う（変更には数えない）
+  added / removed  それ以外
+
+発車は「営業日の分」（service_time。収集時に入れた dep_min 列）の整数配列にし、突き合わせは
+NumPy の集合演算（isin / intersect1d）で行う。行数に対して O(n log n) で、行ごとの dict 探索はしない。
+
+変更が大きい（changed >= max(DIA_CHANGE_MIN, DIA_CHANGE_RATIO × 前回本数)）ときは
+RUNTIME_DIR/keio_full_recrawl.flag を立てる。keio_base.py --incremental はこのフラグがあると
+前回の停車駅を使い回さず、全候補の stops を取り直す（全路線を取り直せたらフラグを下ろす）。
+タイムアウトなどで停車駅を取れなかった列車（CSV の隣の .rejected.json の failed）は、
+どちらの日のものも比較から外す（回線の悪い夜だけで全件取り直しにならないように）。
+
+  python dia_revision.py --date 2025-09-10            # 収集済み CSV を前回分と比べる
+  → logs/dia_revision/YYYYMMDD.json（変更報告）
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import service_time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.config import LOG_DIR, RUNTIME_DIR
+from py_code.output import write_json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = os.path.abspath(os.path.join(HERE, "..", "..", "py_data", "train"))
+REPORT_DIR = os.path.join(LOG_DIR, "dia_revision")
+FLAG_PATH = os.path.join(RUNTIME_DIR, "keio_full_recrawl.flag")
+
+DIA_CHANGE_MIN = int(os.getenv("KEIO_DIA_CHANGE_MIN", "3"))
+DIA_CHANGE_RATIO = float(os.getenv("KEIO_DIA_CHANGE_RATIO", "0.05"))
+
+ROUTE_KEYS = [  # CSV 名は {ymd}_{day_type}_{route}.csv
+    "shinjuku_to_takao_direct",
+    "shinjuku_to_keiohachioji",
+    "kitano_to_takao",
+    "takao_to_up",
+    "kitano_to_shinjuku",
+]
+
+
+# ---------------- 読み込み ----------------
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    """収集 CSV（keio_base.save_csv）の行。stop_stations は JSON を戻す。"""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                row["stop_stations"] = json.loads(row.get("stop_stations") or "[]")
+            except ValueError:
+                row["stop_stations"] = []
+            rows.append(row)
+    return rows
+
+
+def previous_csv(out_dir: str, ymd: str, day_type: str, outfile: str) -> Optional[str]:
+    """ymd より前で最も新しい同じ route/day_type の CSV。無ければ None。"""
+    pat = re.compile(r"^(\d{8})_" + re.escape(f"{day_type}_{outfile}") + "$")
+    best = None
+    for path in glob.glob(os.path.join(out_dir, f"*_{day_type}_{outfile}")):
+        m = pat.match(os.path.basename(path))
+        if m and m.group(1) < ymd and (best is None or m.group(1) > best[0]):
+            best = (m.group(1), path)
+    return best[1] if best else None
+
+
+def sidecar_path(csv_path: str) -> str:
+    """keio_base.py が CSV の隣に書く、行にならなかった候補の記録。"""
+    return csv_path[:-len(".csv")] + ".rejected.json"
+
+
+def load_sidecar(csv_path: str):
+    """
+    (rejected, failed)。rejected は見たうえで外した候補（reason: dest = 最終駅が違う /
+    day_type = 日種が合わない）、failed は一時的なエラーで停車駅を取れなかった候補。
+    古い形（rejected だけの list）も読む。無ければ両方空。
+    """
+    try:
+        with open(sidecar_path(csv_path), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return [], []
+    if isinstance(data, list):
+        return data, []
+    return data.get("rejected") or [], data.get("failed") or []
+
+
+def row_key(r: Dict[str, Any]) -> tuple:
+    return str(r["operation_id"]), int(r["hour"]), int(r["minute"])
+
+
+def without(rows: List[Dict[str, Any]], keys: set) -> List[Dict[str, Any]]:
+    return [r for r in rows if row_key(r) not in keys] if keys else rows
+
+
+# ---------------- 比較 ----------------
+def service_minutes(rows: List[Dict[str, Any]]) -> np.ndarray:
+    return np.array([service_time.dep_minute(r) for r in rows], dtype=np.int32)
+
+
+def _hhmm(m: int) -> str:
+    return f"{m // 60:02d}:{m % 60:02d}"  # 報告では 24:15 のように営業日の時刻のまま出す
+
+
+def compare(prev_rows: List[Dict[str, Any]], cur_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """前回 → 今回の分類。行は operation_id / hour / minute だけ見る。"""
+    p_ops = np.array([str(r["operation_id"]) for r in prev_rows], dtype=str)
+    c_ops = np.array([str(r["operation_id"]) for r in cur_rows], dtype=str)
+    p_min = service_minutes(prev_rows)
+    c_min = service_minutes(cur_rows)
+    # (operation_id, 分) の組を 1 つの文字列にして集合演算
+    p_key = np.char.add(np.char.add(p_ops, "@"), p_min.astype(str))
+    c_key = np.char.add(np.char.add(c_ops, "@"), c_min.astype(str))
+    c_same = np.isin(c_key, p_key)
+    p_same = np.isin(p_key, c_key)
+
+    c_ops_u, c_min_u = c_ops[~c_same], c_min[~c_same]
+    p_ops_u, p_min_u = p_ops[~p_same], p_min[~p_same]
+    retimed_ops = np.intersect1d(c_ops_u, p_ops_u)
+    retimed = []
+    for op in retimed_ops:  # 件数はダイヤ改正でも数十本程度
+        old = int(p_min_u[p_ops_u == op].min())
+        new = int(c_min_u[c_ops_u == op].min())
+        retimed.append({"operation_id": str(op), "from": _hhmm(old), "to": _hhmm(new), "shift_min": new - old})
+
+    c_rest = ~np.isin(c_ops_u, retimed_ops)
+    p_rest = ~np.isin(p_ops_u, retimed_ops)
+    c_ops_r, c_min_r = c_ops_u[c_rest], c_min_u[c_rest]
+    p_ops_r, p_min_r = p_ops_u[p_rest], p_min_u[p_rest]
+    c_renum = np.isin(c_min_r, p_min_r)
+    p_renum = np.isin(p_min_r, c_min_r)
+    added = [{"operation_id": str(o), "time": _hhmm(int(m))} for o, m in zip(c_ops_r[~c_renum], c_min_r[~c_renum])]
+    removed = [{"operation_id": str(o), "time": _hhmm(int(m))} for o, m in zip(p_ops_r[~p_renum], p_min_r[~p_renum])]
+
+    n_changed = len(added) + len(removed) + len(retimed)
+    return {
+        "prev": len(prev_rows),
+        "cur": len(cur_rows),
+        "unchanged": int(c_same.sum()),
+        "renumbered": int(c_renum.sum()),
+        "changed": n_changed,
+        "significant": is_significant(n_changed, len(prev_rows)),
+        "added": added,
+        "removed": removed,
+        "retimed": retimed,
+    }
+
+
+def is_significant(n_changed: int, n_prev: int) -> bool:
+    return n_prev > 0 and n_changed >= max(DIA_CHANGE_MIN, DIA_CHANGE_RATIO * n_prev)
+
+
+# ---------------- 全件取り直しフラグ ----------------
+def raise_flag(reason: str) -> None:
+    os.makedirs(os.path.dirname(FLAG_PATH), exist_ok=True)
+    with open(FLAG_PATH, "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().isoformat(timespec='seconds')} {reason}\n")
+    print(f"[dia] full re-crawl flag raised: {reason}")
+
+
+def flag_raised() -> bool:
+    return os.path.exists(FLAG_PATH)
+
+
+def clear_flag() -> None:
+    try:
+        os.unlink(FLAG_PATH)
+        print("[dia] full re-crawl flag cleared")
+    except FileNotFoundError:
+        pass
+
+
+# ---------------- 段として ----------------
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="compare collected departures with the previous dataset")
+    ap.add_argument("--date", default=None, help="YYYY-MM-DD（既定: 今日）")
+    ap.add_argument("--routes", default=",".join(ROUTE_KEYS))
+    ap.add_argument("--targets", default="weekday,holiday")
+    ap.add_argument("--out-dir", default=OUT_DIR, help="収集 CSV の場所")
+    ap.add_argument("--report-dir", default=REPORT_DIR)
+    args = ap.parse_args(argv)
+
+    ymd = (args.date or datetime.now().strftime("%Y-%m-%d")).replace("-", "")
+    report: Dict[str, Any] = {"date": ymd, "routes": {}}
+    significant = []
+    for route in [k.strip() for k in args.routes.split(",") if k.strip()]:
+        outfile = f"{route}.csv"
+        for day_type in [t.strip() for t in args.targets.split(",") if t.strip()]:
+            cur_path = os.path.join(args.out_dir, f"{ymd}_{day_type}_{outfile}")
+            prev_path = previous_csv(args.out_dir, ymd, day_type, outfile)
+            if not os.path.exists(cur_path) or prev_path is None:
+                continue
+            # 一時的なエラーで取れなかった列車（どちらかの日の failed）は変更に数えない
+            skip = {row_key(r) for r in load_sidecar(prev_path)[1] + load_sidecar(cur_path)[1]}
+            res = compare(without(load_rows(prev_path), skip), without(load_rows(cur_path), skip))
+            res["base"] = os.path.basename(prev_path)[:8]
+            report["routes"].setdefault(route, {})[day_type] = res
+            mark = " SIGNIFICANT" if res["significant"] else ""
+            print(f"{route} [{day_type}] vs {res['base']}: +{len(res['added'])} -{len(res['removed'])} "
+                  f"~{len(res['retimed'])} (={res['unchanged']}){mark}")
+            if res["significant"]:
+                significant.append(f"{route}[{day_type}]")
+
+    report["significant"] = significant
+    path = os.path.join(args.report_dir, f"{ymd}.json")
+    write_json(path, report, indent=1)
+    print("report ->", path)
+    if significant:
+        raise_flag(f"{ymd} " + ",".join(significant))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+fake_navitime.py
+- keio_base.py 用の Navitime 代替サーバー（asyncio, 標準ライブラリのみ）。
+  GET /api/keio/timetable/{station}/{line}/{direction}
+  GET /api/keio/stops/{station}/{line}?operation_id=...
+  GET /__stats   … エンドポイント別・ステータス別のリクエスト数
+- フィクスチャ:
+  --archive YYYYMMDD  payload_archive の記録をそのまま返す（本物のレスポンス）
+  --from-csv YYYYMMDD 収集済み CSV から timetable/stops の JSON を合成
+- 障害注入: --latency / --jitter（秒）, --error-rate（500）, --rate-429（429 + Retry-After）
+
+使い方:
+  python fake_navitime.py --from-csv 20250909 --port 8765 --latency 0.05 --rate-429 0.02
+  python keio_base.py --base-url http://127.0.0.1:8765 --out-dir /tmp/keio --no-archive
+"""
+
+import asyncio
+import csv
+import json
+import os
+import random
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from payload_archive import PayloadArchive, ArchiveMiss
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(HERE, "..", "..", "py_data", "train")
+
+
+def _day_type_from_referer(referer: str) -> Optional[str]:
+    q = dict(parse_qsl(urlsplit(referer or "").query))
+    return q.get("target")
+
+
+class CsvFixtures:
+    """収集済み CSV（YYYYMMDD_{day_type}_{route}.csv）から API 形の JSON を組み立てる。"""
+
+    def __init__(self, ymd: str, data_dir: str = DATA_DIR):
+        from keio_base import ROUTES  # ルート定義（駅/路線/方向）は本体と共有
+
+        self.timetables: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.stops: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for key, conf in ROUTES.items():
+            endpoint = f"timetable/{conf['station']}/{conf['line']}/{conf['direction']}"
+            for day_type in ("weekday", "holiday"):
+                path = os.path.join(data_dir, f"{ymd}_{day_type}_{conf['outfile']}")
+                if not os.path.exists(path):
+                    continue
+                by_hour: Dict[int, list] = defaultdict(list)
+                with open(path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        by_hour[int(row["hour"])].append({
+                            "time": row["time_iso"],
+                            "id": row["operation_id"],
+                            "type": row["train_type"],
+                            "destinations": [{"name": d} for d in row["destination"].split(" / ") if d],
+                            "platform": row["platform"],
+                        })
+                        stops = json.loads(row["stop_stations"] or "[]")
+                        self.stops[(f"stops/{conf['station']}/{conf['line']}", row["operation_id"], day_type)] = {
+                            "stops": [{"name": s.get("station"), "departure_time": s.get("time")}
+                                      for s in stops if isinstance(s, dict) and s.get("station")],
+                        }
+                tbl = self.timetables.setdefault((endpoint, day_type), {"timetables": [{"operations": []}]})
+                ops = tbl["timetables"][0]["operations"]
+                for hour in sorted(by_hour):
+                    ops.append({"hour": hour, "minutes": by_hour[hour]})
+
+    def lookup(self, endpoint: str, params: Dict[str, str], day_type: Optional[str]) -> bytes:
+        if endpoint.startswith("timetable/"):
+            doc = self.timetables.get((endpoint, day_type or "weekday"))
+        else:
+            doc = self.stops.get((endpoint, params.get("operation_id", ""), day_type or "weekday"))
+        if doc is None:
+            raise ArchiveMiss(endpoint)
+        return json.dumps(doc, ensure_ascii=False).encode("utf-8")
+
+
+class ArchiveFixtures:
+    def __init__(self, ymd: str):
+        self.archive = PayloadArchive(ymd)
+
+    def lookup(self, endpoint: str, params: Dict[str, str], day_type: Optional[str]) -> bytes:
+        return self.archive.load(endpoint, params, day_type=day_type)
+
+
+class FakeNavitime:
+    def __init__(self, fixtures, *, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, rate_429: float = 0.0, seed: Optional[int] = None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.rng = random.Random(seed)
+        self.stats: Counter = Counter()
+
+    async def _respond(self, writer, status: int, body: bytes, extra: str = "") -> None:
+        reason = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}.get(status, "")
+        head = (f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: keep-alive\r\n"
+                f"{extra}\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _handle_one(self, method: str, target: str, headers: Dict[str, str], writer) -> None:
+        parts = urlsplit(target)
+        params = dict(parse_qsl(parts.query))
+        if parts.path == "/__stats":
+            await self._respond(writer, 200, json.dumps(dict(self.stats)).encode())
+            return
+        if not parts.path.startswith("/api/keio/"):
+            await self._respond(writer, 404, b"{}")
+            return
+        endpoint = parts.path[len("/api/keio/"):]
+        kind = endpoint.split("/", 1)[0]
+
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            self.stats[f"{kind}:429"] += 1
+            await self._respond(writer, 429, b'{"error":"rate limited"}', "Retry-After: 1\r\n")
+            return
+        if roll < self.rate_429 + self.error_rate:
+            self.stats[f"{kind}:500"] += 1
+            await self._respond(writer, 500, b'{"error":"injected"}')
+            return
+        try:
+            body = self.fixtures.lookup(endpoint, params, _day_type_from_referer(headers.get("referer", "")))
+        except ArchiveMiss:
+            self.stats[f"{kind}:404"] += 1
+            await self._respond(writer, 404, b'{"error":"no fixture"}')
+            return
+        self.stats[f"{kind}:200"] += 1
+        self.stats[f"{kind}:bytes"] += len(body)
+        await self._respond(writer, 200, body)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                await self._handle_one(method, target, headers, writer)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def load_fixtures(*, archive: Optional[str] = None, from_csv: Optional[str] = None, data_dir: str = DATA_DIR):
+    if archive:
+        return ArchiveFixtures(archive.replace("-", ""))
+    if from_csv:
+        return CsvFixtures(from_csv.replace("-", ""), data_dir)
+    raise ValueError("either archive or from_csv is required")
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Offline Navitime stand-in for keio_base.py")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--archive", help="YYYYMMDD: replay recorded payloads")
+    src.add_argument("--from-csv", help="YYYYMMDD: synthesize payloads from collected CSVs")
+    ap.add_argument("--data-dir", default=DATA_DIR, help="CSV directory for --from-csv")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="mean response delay (s)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="+/- delay jitter (s)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of HTTP 500")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="fraction of HTTP 429")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+
+    app = FakeNavitime(load_fixtures(archive=args.archive, from_csv=args.from_csv, data_dir=args.data_dir),
+                       latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       rate_429=args.rate_429, seed=args.seed)
+
+    async def run():
+        server = await app.serve(args.host, args.port)
+        print(f"fake navitime listening on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("stats:", dict(app.stats))
+
+
+if __name__ == "__main__":
+    main()
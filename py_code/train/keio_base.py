@@ -6,21 +6,46 @@ keio_base.py
 - minutes[*] の "id" が operation_id、"time" は ISO 時刻、"type" は種別。
 - 候補（特急/Mt.TAKAO/快速特急）を stops API で確認し、最終が「高尾山口」だけ残す。
 - CSVに保存。
+- 計測（レイテンシ分布・ステータス・再試行・待ち時間）は collector_metrics で集計し、
+  終了時に logs/metrics/keio_YYYYMMDD.json と .prom を出す。
+- 生レスポンスは payload_archive に日別で保存。--replay YYYY-MM-DD でその日を
+  ネットワークなし・スリープなしで再生（パーサ修正後の再生成用）。
+- --incremental: 時刻表（1 リクエスト）は毎回取るが、前回の CSV に同じ (operation_id, 発車時刻) が
+  あればその停車駅を日付だけずらして使い、stops は新しい・変わった列車の分だけ取る。
+  行にならなかった候補は {ymd}_{day_type}_{route}.rejected.json に残す。rejected（最終駅・日種が
+  合わず外した）は次回も取らず、failed（タイムアウトなどで取れなかった）は次回取り直すが変更には数えない。
+  候補を前回と比べて変更が大きい（dia_revision.py）ときや、全件取り直しフラグがあるときは全件取る。
 """
 
 import csv
 import json
 import os
-import time, random
+import sys
+import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
-import jpholiday
+
+from rate_control import AimdRateController, CircuitBreaker, CircuitOpenError
+from payload_archive import PayloadArchive, ArchiveMiss
+from collector_metrics import CollectorMetrics
+import dia_revision
+import service_time
+from service_time import is_holiday  # 営業日（0〜2 時台は前日）で土日・祝日を判定
+from timetable_delta import shift_iso_date
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.runtime_guard import job_lock, JobLocked, throttle
+from py_code.config import LOG_DIR
+from py_code.run_history import record_stage
+from py_code.profiling import profiled, span
+from py_code.output import write_json
 
 # ===== 設定 =====
-BASE = "https://transfer-train.navitime.biz"
+# 接続先（fake_navitime.py で試すときは env か --base-url で差し替え）
+BASE = os.getenv("NAVITIME_BASE_URL", "https://transfer-train.navitime.biz").rstrip("/")
 LANG = "ja"
 # 既定日付（--date で上書き可能）
 TARGET_DT = datetime(2025, 8, 17, 9, 0)
@@ -64,13 +89,6 @@ ROUTES = {
     },
 }
 
-def is_holiday(dt_str: str) -> bool:
-    try:
-        dt = datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-        return dt.weekday() >= 5 or jpholiday.is_holiday(dt.date())
-    except Exception:
-        return False
-
 def referer_for(station: str, line: str, direction: str, day_type: str = "weekday") -> str:
     # target は UI ページの切替用だが、Cookie/キャッシュ分離のため Referer に反映
     return f"{BASE}/keio/directions/timetable?station={station}&line={line}&target={day_type}&direction={direction}"
@@ -89,80 +107,137 @@ sess.headers.update({
 # No initial get to REFERER URL here
 
 # --- robust retry & pool settings ---
+# 再試行はすべて下の _get（AIMD コントローラ）が持つ。urllib3 側で read / status を再試行すると
+# 1 リクエストが 3×3×45 秒止まり得るうえ、コントローラにも計測にも見えないので 0 にする。
+# 接続の確立失敗（接続前なので送信は起きていない）だけ urllib3 に 1 回やり直させる。
 retry_cfg = Retry(
-    total=5,
-    read=5,
-    connect=3,
-    backoff_factor=2,
-    status_forcelist=[429, 500, 502, 503, 504],
+    total=None,
+    connect=1,
+    read=0,
+    status=0,
+    redirect=5,
+    other=0,
+    backoff_factor=0,
     allowed_methods=["GET"],
+    raise_on_status=False,
+    respect_retry_after_header=False,  # 429 + Retry-After はコントローラ側で扱う（計測にも出す）
 )
 adapter = HTTPAdapter(max_retries=retry_cfg, pool_connections=10, pool_maxsize=10)
 sess.mount("https://", adapter)
 sess.mount("http://", adapter)
 
-def get_json(url: str, params: dict, *, timeout=(10, 45)) -> Dict[str, Any]:
+# 応答が速く正常なら加速、429/5xx/遅延で大きく減速（旧: 固定 1.0〜1.5 秒スリープ）
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+metrics = CollectorMetrics()
+controller = AimdRateController(
+    initial_rate=float(os.getenv("KEIO_RATE_INITIAL", "0.8")),
+    max_rate=float(os.getenv("KEIO_RATE_MAX", "3.0")),
+)
+
+# 生レスポンスの保存先 / リプレイ元（main で設定）
+archive: Optional[PayloadArchive] = None
+replay: Optional[PayloadArchive] = None
+
+def _archive_response(endpoint: str, params: dict, day_type: str, r: requests.Response) -> None:
+    if archive is not None:
+        archive.append(endpoint, params, r.content, day_type=day_type, status=r.status_code)
+
+def _retry_after(r: requests.Response) -> Optional[float]:
+    try:
+        return float(r.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+def _get(url: str, params: dict, *, timeout=(10, 45), attempts: int = 3) -> requests.Response:
+    """
+    コントローラのペースで GET。429/5xx/タイムアウトは減速して最大 attempts 回まで試す。
     """
-    GET JSON with retries/backoff via session adapter.
+    endpoint = url.rsplit("/api/keio/", 1)[-1].split("/", 1)[0]  # "timetable" / "stops"
+    last_exc: Optional[Exception] = None
+    for attempt in range(attempts):
+        if attempt:
+            metrics.observe_retry(endpoint)
+        metrics.observe_sleep("pacing", controller.wait())
+        metrics.observe_sleep("host_bucket", throttle(url))  # 重なった別プロセスとホスト単位で帯域を分け合う
+        t0 = time.monotonic()
+        try:
+            r = sess.get(url, params=params, timeout=timeout, allow_redirects=True)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            kind = "timeout" if isinstance(e, requests.exceptions.Timeout) else "conn_error"
+            metrics.observe_attempt(endpoint, latency=time.monotonic() - t0, status=kind)
+            controller.on_failure(type(e).__name__)
+            last_exc = e
+            continue
+        latency = time.monotonic() - t0
+        metrics.observe_attempt(endpoint, latency=latency, status=str(r.status_code), nbytes=len(r.content))
+        if r.status_code in RETRY_STATUSES:
+            controller.on_failure(f"HTTP {r.status_code}", retry_after=_retry_after(r))
+            last_exc = requests.exceptions.HTTPError(f"HTTP {r.status_code}: {url}", response=r)
+            continue
+        r.raise_for_status()
+        controller.on_success(latency)
+        return r
+    assert last_exc is not None
+    raise last_exc
+
+def get_json(url: str, params: dict, *, timeout=(10, 45), archive_as: Optional[tuple] = None) -> Dict[str, Any]:
+    """
+    GET JSON with adaptive pacing/retries (see rate_control.py).
     timeout: (connect_timeout, read_timeout)
+    archive_as: (endpoint, day_type) を渡すと生レスポンスをアーカイブに残す
     """
     try:
-        r = sess.get(url, params=params, timeout=timeout, allow_redirects=True)
-        r.raise_for_status()
+        r = _get(url, params, timeout=timeout)
+        if archive_as:
+            _archive_response(archive_as[0], params, archive_as[1], r)
         return r.json()
     except requests.exceptions.ReadTimeout as e:
         # bubble up with clearer message
         raise requests.exceptions.ReadTimeout(f"Read timeout: {url} params={params}") from e
-    except requests.exceptions.RequestException as e:
-        # include brief context
-        raise
 
 def fetch_timetable(dt: datetime, *, station: str, line: str, direction: str, day_type: str = "weekday") -> Dict[str, Any]:
-    url = f"{BASE}/api/keio/timetable/{station}/{line}/{direction}"
+    endpoint = f"timetable/{station}/{line}/{direction}"
+    url = f"{BASE}/api/keio/{endpoint}"
     params = {"datetime": dt.strftime("%Y-%m-%dT%H:%M:00+09:00"), "lang": LANG}
+    if replay is not None:
+        print("[timetable] REPLAY", replay.ymd)
+        return replay.load_json(endpoint, params, day_type=day_type)
     # 動的 Referer（Cookie 兼 相手側の緩い検査対策）
     sess.headers["Referer"] = referer_for(station, line, direction, day_type)
-    r = sess.get(url, params=params, timeout=(10, 45), allow_redirects=True)
+    r = _get(url, params, timeout=(10, 45))
     print("[timetable] HTTP", r.status_code, r.headers.get("Content-Type"))
-    r.raise_for_status()
+    _archive_response(endpoint, params, day_type, r)
     return r.json()
 
 def fetch_stops(operation_id: str, dt: datetime, *, station: str, line: str, direction: str, day_type: str = "weekday") -> List[Dict[str, Any]]:
-    url = f"{BASE}/api/keio/stops/{station}/{line}"
+    endpoint = f"stops/{station}/{line}"
+    url = f"{BASE}/api/keio/{endpoint}"
     params = {
         "operation_id": operation_id,
         "datetime": dt.strftime("%Y-%m-%dT%H:%M:00+09:00"),
         "lang": LANG,
         "direction": direction,
     }
-    # polite small delay to avoid hammering the API
-    time.sleep(1.0 + random.random() * 0.5)
-    sess.headers["Referer"] = referer_for(station, line, direction, day_type)
-    data = get_json(url, params, timeout=(10, 45))
+    if replay is not None:
+        data = replay.load_json(endpoint, params, day_type=day_type)
+    else:
+        # 間隔調整は _get 内のコントローラが行う
+        sess.headers["Referer"] = referer_for(station, line, direction, day_type)
+        data = get_json(url, params, timeout=(10, 45), archive_as=(endpoint, day_type))
     out: List[Dict[str, Any]] = []
     for s in data.get("stops", []):
         if isinstance(s, dict) and s:
             out.append(s)
     return out
 
-def parse_iso_hhmm(dt_str: str) -> Optional[tuple]:
-    # 例: "2025-08-18T20:41:00+09:00" → (20, 41)
-    try:
-        t = datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-        return t.hour, t.minute
-    except Exception:
-        try:
-            hhmm = dt_str.split("T")[1].split("+")[0]
-            hh, mm = hhmm.split(":")[:2]
-            return int(hh), int(mm)
-        except Exception:
-            return None
-
-def iso_to_datetime(dt_str: str) -> Optional[datetime]:
-    try:
-        return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-    except Exception:
-        return None
+def pick_stop_stations(stops: List[Dict[str, Any]], targets) -> List[Dict[str, Any]]:
+    """stops 応答から対象駅だけを {station, time} で抜き出す。"""
+    return [
+        {"station": s.get("name") or s.get("station"),
+         "time": s.get("departure_time") or s.get("arrive_time")}
+        for s in stops
+        if isinstance(s, dict) and (s.get("name") or s.get("station")) in targets
+    ]
 
 def is_target_type(tt: Optional[str], type_keywords: Optional[tuple]) -> bool:
     if not type_keywords:  # ← 追加
@@ -195,7 +270,6 @@ def extract_candidates(payload: dict, *, type_keywords: tuple) -> List[Dict[str,
             if not isinstance(op, dict): continue
             minutes = op.get("minutes")
             if not isinstance(minutes, list): continue
-            hour_hint = op.get("hour")
             for m in minutes:
                 if not isinstance(m, dict): continue
                 op_id = m.get("id")
@@ -208,16 +282,12 @@ def extract_candidates(payload: dict, *, type_keywords: tuple) -> List[Dict[str,
                 if not is_target_type(ttype, type_keywords):
                     continue  # 種別でいったん絞る
 
-                hhmm = parse_iso_hhmm(time_iso)
-                if hhmm:
-                    hour, minute = hhmm
-                else:
-                    # hour_hint がある時は minutes 側の分だけで復元
-                    hour = hour_hint
-                    minute = None
-                if hour is None or minute is None:
+                # 時刻の解釈はここで 1 回だけ（営業日の分。後段は dep_min / stop_mins の整数を使う）
+                dep_min = service_time.from_iso(time_iso)
+                if dep_min is None:
                     # 出発時刻が取れないと逆算で使いにくいのでスキップ
                     continue
+                hour, minute = service_time.clock(dep_min)
 
                 out.append({
                     "hour": hour,
@@ -228,6 +298,7 @@ def extract_candidates(payload: dict, *, type_keywords: tuple) -> List[Dict[str,
                     "destination": " / ".join([d for d in dests if d]) if dests else "",
                     "platform": str(plat or ""),
                     "time_iso": time_iso,  # 後で stops の dt に使う
+                    "dep_min": dep_min,
                 })
     # ユニーク化（同時刻同op_idの重複を排除）
     seen = set()
@@ -239,28 +310,61 @@ def extract_candidates(payload: dict, *, type_keywords: tuple) -> List[Dict[str,
         uniq.append(r)
     return uniq
 
-def save_csv(rows: List[Dict[str, Any]], filename: str):
+def save_csv(rows: List[Dict[str, Any]], filename: str, outdir: Optional[str] = None):
     if not rows:
         print("保存するデータがありません。"); return
-    here = os.path.dirname(os.path.abspath(__file__))
-    outdir = os.path.join(here, "..", "..", "py_data", "train")
+    if outdir is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        outdir = os.path.join(here, "..", "..", "py_data", "train")
     os.makedirs(outdir, exist_ok=True)
     path = os.path.join(outdir, filename)
     # ← 列を追加
     fields = [
         "hour","minute","operation_id","train_type","destination","platform",
-        "departure_dt","time_iso","stop_stations"
+        "departure_dt","time_iso","stop_stations","dep_min","stop_mins"
     ]
     with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fields)
         w.writeheader()
         for r in rows:
             rec = dict(r)
-            rec["stop_stations"] = json.dumps(rec.get("stop_stations", []), ensure_ascii=False)
+            stops = rec.get("stop_stations", [])
+            if "stop_mins" not in rec:
+                rec["stop_mins"] = [service_time.from_iso(s.get("time")) for s in stops]
+            rec["stop_stations"] = json.dumps(stops, ensure_ascii=False)
+            rec["stop_mins"] = json.dumps(rec["stop_mins"])
             w.writerow(rec)
     print("CSV saved ->", path)
 
-if __name__ == "__main__":
+def load_previous(out_dir: str, ymd: str, day_type: str, outfile: str):
+    """前回の (採用した行, 外した候補, 取れなかった候補)。前回が無ければ None。"""
+    prev_csv = dia_revision.previous_csv(out_dir, ymd, day_type, outfile)
+    if prev_csv is None:
+        return None
+    rejected, failed = dia_revision.load_sidecar(prev_csv)
+    return dia_revision.load_rows(prev_csv), rejected, failed
+
+def reuse_stops(prev_row: Dict[str, Any], r: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """前回の停車駅を今回の営業日にずらしたもの（営業日の分 stop_mins は日付によらないのでそのまま）。"""
+    days = 0
+    a, b = service_time.service_date(prev_row.get("time_iso")), service_time.service_date(r["time_iso"])
+    if a and b:
+        days = (b - a).days
+    r["stop_mins"] = service_time.row_minutes(prev_row)[1]
+    return [dict(s, time=shift_iso_date(s.get("time"), days)) for s in prev_row.get("stop_stations") or []]
+
+def day_type_matches(day_type: str, time_iso: Optional[str]) -> bool:
+    """day_type と実際の日付の休日判定が一致するか（time_iso が無ければとりあえず True）。"""
+    if not time_iso:
+        return True
+    return (day_type == "holiday") == is_holiday(time_iso)
+
+def _note(r: Dict[str, Any], **extra) -> Dict[str, Any]:
+    """.rejected.json に残す候補の形。"""
+    return {**{f: r[f] for f in ("operation_id", "hour", "minute", "time_iso")}, **extra}
+
+def main():
+    global archive, replay, BASE
     import argparse
     parser = argparse.ArgumentParser(description="Keio timetable collector (multi-route)")
     parser.add_argument("--routes", type=str, default="shinjuku_to_takao_direct,shinjuku_to_keiohachioji,kitano_to_takao,takao_to_up,kitano_to_shinjuku",
@@ -268,11 +372,25 @@ if __name__ == "__main__":
     parser.add_argument("--date", type=str, default=None, help="YYYY-MM-DDTHH:MM (local, +09:00 assumed)")
     parser.add_argument("--targets", type=str, default="weekday,holiday",
                         help="comma-separated day types: weekday,holiday")
+    parser.add_argument("--replay", type=str, default=None, metavar="YYYY-MM-DD",
+                        help="serve requests from that day's payload archive (no network, no sleeps)")
+    parser.add_argument("--no-archive", action="store_true", help="do not store raw responses")
+    parser.add_argument("--base-url", type=str, default=None,
+                        help=f"API base URL (default: {BASE}; env NAVITIME_BASE_URL)")
+    parser.add_argument("--out-dir", type=str, default=None, help="CSV output directory (default: py_data/train)")
+    parser.add_argument("--metrics-dir", type=str, default=None,
+                        help="where to write keio_YYYYMMDD.json / .prom (default: logs/metrics; "
+                             "with --out-dir only when given explicitly)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse the previous CSV's stops for unchanged trains (full crawl if the dia changed)")
     args = parser.parse_args()
     target_stations = ["高尾", "高尾山口", "京王八王子", "北野", "新宿"]
 
     # 日付``
     target_dt = TARGET_DT
+    if args.replay and not args.date:
+        # cron と同じ 09:00 基準で記録されているのでそれに合わせる
+        args.date = f"{args.replay}T09:00"
     if args.date:
         try:
             # 秒省略可
@@ -285,9 +403,25 @@ if __name__ == "__main__":
             print(f"[warn] invalid --date: {args.date}; using default {TARGET_DT.isoformat()}")
             target_dt = TARGET_DT
 
+    if args.base_url:
+        BASE = args.base_url.rstrip("/")
+        sess.headers["Origin"] = BASE
+    if args.replay:
+        replay = PayloadArchive(args.replay.replace("-", ""))
+        print(f"[replay] {replay.data_path} ({len(replay)} payloads)")
+    elif not args.no_archive:
+        archive = PayloadArchive(target_dt.strftime("%Y%m%d"))
+
     day_types = [t.strip() for t in args.targets.split(",") if t.strip()]
 
     selected = [k.strip() for k in args.routes.split(",") if k.strip()]
+    total_rows = 0
+    out_dir = args.out_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "py_data", "train")
+    ymd = target_dt.strftime("%Y%m%d")
+    full_recrawl = not args.incremental or dia_revision.flag_raised()
+    if args.incremental and full_recrawl:
+        print("[dia] full re-crawl flag is set; fetching stops for every candidate")
+    all_full = True  # 全 route/day_type を取り直せたらフラグを下ろす
     for key in selected:
         if key not in ROUTES:
             print(f"[skip] unknown route: {key}")
@@ -299,56 +433,140 @@ if __name__ == "__main__":
         outfile = conf["outfile"]
 
         for day_type in day_types:
-            print(f"\n=== Route: {key} ({station}/{line}/{direction}) [{day_type}] @ {target_dt.isoformat()} ===")
-            data = fetch_timetable(target_dt, station=station, line=line, direction=direction, day_type=day_type)
-
-            cands = extract_candidates(data, type_keywords=type_keywords)
-            print("minutesからの候補本数:", len(cands))
-            if not cands:
-                print("0本でした。種別や時間帯を見直してください。")
-                continue
-
-            rows: List[Dict[str, Any]] = []
-            for idx, r in enumerate(cands, 1):
-                dt_for_op = iso_to_datetime(r["time_iso"]) or datetime(
-                    target_dt.year, target_dt.month, target_dt.day, r["hour"], r["minute"]
-                )
+            with span(f"{key}[{day_type}]"):
+                print(f"\n=== Route: {key} ({station}/{line}/{direction}) [{day_type}] @ {target_dt.isoformat()} ===")
                 try:
-                    stops = fetch_stops(r["operation_id"], dt_for_op, station=station, line=line, direction=direction, day_type=day_type)
-                except requests.exceptions.ReadTimeout:
-                    print(f"[warn] stops timeout: op_id={r['operation_id']} at {r['time_iso']}")
-                    continue
-                except requests.exceptions.RequestException as e:
-                    print(f"[warn] stops error: op_id={r['operation_id']} {type(e).__name__}: {e}")
+                    with span("timetable"):
+                        data = fetch_timetable(target_dt, station=station, line=line, direction=direction, day_type=day_type)
+                except ArchiveMiss as e:
+                    print(f"[warn] not in archive: {e}")
                     continue
 
-                if not stops:
-                    continue
-                last = stops[-1] if isinstance(stops[-1], dict) else {}
-                last_name = (last.get("name") or last.get("station"))
-                if dest_final and last_name != dest_final:
+                cands = extract_candidates(data, type_keywords=type_keywords)
+                print("minutesからの候補本数:", len(cands))
+                if not cands:
+                    print("0本でした。種別や時間帯を見直してください。")
                     continue
 
-                r["stop_stations"] = [
-                    {"station": s.get("name") or s.get("station"),
-                    "time": s.get("departure_time") or s.get("arrive_time")}
-                    for s in stops 
-                    if isinstance(s, dict) and (s.get("name") or s.get("station")) in target_stations
-                ]
-                # day_typeと実際の日付の休日判定が一致する場合のみappend
-                dt_temp = r.get("time_iso")
-                if dt_temp:
-                    actual_is_holiday = is_holiday(dt_temp)
-                    if (day_type == "holiday" and actual_is_holiday) or \
-                       (day_type == "weekday" and not actual_is_holiday):
+                # 前回の結果を使い回せるか（時刻表の候補どうしで比べる）
+                known: Dict[tuple, Dict[str, Any]] = {}     # (op_id, hour, minute) → 前回の行
+                known_rej: Dict[tuple, Dict[str, Any]] = {}  # (op_id, hour, minute) → 前回外した候補
+                prev = None if full_recrawl else load_previous(out_dir, ymd, day_type, outfile)
+                if prev is not None:
+                    prev_rows, prev_rejected, prev_failed = prev
+                    # 前回取れなかった候補は、今回の候補にあっても変更（added）に数えない
+                    skip = {dia_revision.row_key(p) for p in prev_failed}
+                    res = dia_revision.compare(prev_rows + prev_rejected, dia_revision.without(cands, skip))
+                    print(f"[dia] vs previous: +{len(res['added'])} -{len(res['removed'])} ~{len(res['retimed'])} "
+                          f"(={res['unchanged']})")
+                    if res["significant"]:
+                        dia_revision.raise_flag(f"{ymd} {key}[{day_type}] candidates changed")
+                        full_recrawl = True
+                    else:
+                        known = {dia_revision.row_key(p): p for p in prev_rows}
+                        known_rej = {dia_revision.row_key(p): p for p in prev_rejected}
+                if known or known_rej:
+                    all_full = False
+
+                rows: List[Dict[str, Any]] = []
+                rejected: List[Dict[str, Any]] = []  # 見たうえで外した（reason: dest / day_type）
+                failed: List[Dict[str, Any]] = []    # 一時的なエラーで取れなかった（次回取り直す）
+                reused = 0
+                aborted = False
+                breaker = CircuitBreaker(f"{key}[{day_type}]")
+                for idx, r in enumerate(cands, 1):
+                    k = (r["operation_id"], r["hour"], r["minute"])
+                    if k in known_rej:
+                        reason = known_rej[k].get("reason", "dest")  # reason の無い古い記録は最終駅で外したもの
+                        if reason == "dest" or not day_type_matches(day_type, r["time_iso"]):
+                            rejected.append(_note(r, reason=reason))
+                            continue
+                        # 日付がずれて日種が合うようになった → 停車駅を取る
+                    elif k in known:
+                        r["stop_stations"] = reuse_stops(known[k], r)
+                        reused += 1
+                        if day_type_matches(day_type, r["time_iso"]):
+                            rows.append(r)
+                        else:
+                            rejected.append(_note(r, reason="day_type"))
+                        continue
+                    if aborted:  # ブレーカーで打ち切った後も、使い回せる候補（上の 2 つ）はそのまま行にする
+                        failed.append(_note(r))
+                        continue
+                    dt_for_op = service_time.local_datetime(r["time_iso"]) or datetime(
+                        target_dt.year, target_dt.month, target_dt.day, r["hour"], r["minute"]
+                    )
+                    # 連続失敗中は候補ごとにタイムアウトを重ねず、ルートごと一時停止
+                    metrics.observe_sleep("breaker", breaker.wait_until_closable())
+                    try:
+                        breaker.before_call()
+                        stops = fetch_stops(r["operation_id"], dt_for_op, station=station, line=line, direction=direction, day_type=day_type)
+                        breaker.record_success()
+                    except CircuitOpenError as e:
+                        print(f"[warn] route aborted: {e}")
+                        aborted = True
+                        failed.append(_note(r))  # 以降、取りに行く必要のある候補は取れなかった扱い
+                        continue
+                    except ArchiveMiss as e:
+                        print(f"[warn] not in archive: {e}")
+                        failed.append(_note(r))
+                        continue
+                    except requests.exceptions.ReadTimeout:
+                        breaker.record_failure()
+                        print(f"[warn] stops timeout: op_id={r['operation_id']} at {r['time_iso']}")
+                        failed.append(_note(r))
+                        continue
+                    except requests.exceptions.RequestException as e:
+                        breaker.record_failure()
+                        print(f"[warn] stops error: op_id={r['operation_id']} {type(e).__name__}: {e}")
+                        failed.append(_note(r))
+                        continue
+
+                    if not stops:
+                        failed.append(_note(r))
+                        continue
+                    last = stops[-1] if isinstance(stops[-1], dict) else {}
+                    last_name = (last.get("name") or last.get("station"))
+                    if dest_final and last_name != dest_final:
+                        rejected.append(_note(r, reason="dest"))
+                        continue
+
+                    r["stop_stations"] = pick_stop_stations(stops, target_stations)
+                    # day_typeと実際の日付の休日判定が一致する場合のみappend
+                    if day_type_matches(day_type, r.get("time_iso")):
                         rows.append(r)
-                else:
-                    # time_isoがない場合はとりあえずappend
-                    rows.append(r)
+                    else:
+                        rejected.append(_note(r, reason="day_type"))
 
-                if idx % 25 == 0:
-                    print(f" progress: {idx}/{len(cands)} candidates, kept {len(rows)}")
+                    if idx % 25 == 0:
+                        print(f" progress: {idx}/{len(cands)} candidates, kept {len(rows)}")
 
-            print(f"{key} [{day_type}] 本数:", len(rows))
-            OUTNAME = f"{target_dt.strftime('%Y%m%d')}_{day_type}_{outfile}"
-            save_csv(rows, OUTNAME)
\ No newline at end of file
+                print(f"{key} [{day_type}] 本数:", len(rows), *([f"(stops reused {reused})"] if known else []),
+                      *([f"(failed {len(failed)})"] if failed else []))
+                OUTNAME = f"{ymd}_{day_type}_{outfile}"
+                save_csv(rows, OUTNAME, args.out_dir)
+                write_json(dia_revision.sidecar_path(os.path.join(out_dir, OUTNAME)),
+                           {"rejected": rejected, "failed": failed})
+                all_full = all_full and not aborted
+                total_rows += len(rows)
+
+    if args.incremental and all_full and dia_revision.flag_raised():
+        dia_revision.clear_flag()
+
+    print(metrics.summary())
+    # ベンチ・試験の実行（--out-dir）は、明示されない限り本番の logs/metrics を上書きしない
+    metrics_dir = args.metrics_dir or (str(LOG_DIR / "metrics") if args.out_dir is None else None)
+    if replay is None and metrics_dir:
+        stem = os.path.join(metrics_dir, f"keio_{target_dt.strftime('%Y%m%d')}")
+        metrics.write(stem + ".json", stem + ".prom")
+        print("metrics ->", stem + ".json")
+    if replay is None and args.out_dir is None:  # 再生・ベンチ実行は履歴に混ぜない
+        record_stage("collect", metrics.to_dict()["elapsed_s"], rows=total_rows, requests=metrics.requests,
+                     run_date=target_dt.date().isoformat())
+
+if __name__ == "__main__":
+    try:
+        with job_lock("keio_base"), profiled("keio_base"):
+            main()
+    except JobLocked as e:
+        print(f"[skip] {e}")
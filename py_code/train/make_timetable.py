@@ -1,39 +1,16 @@
 import os
+import sys
 import json
 import csv
-import pandas as pd
 from datetime import datetime, timezone
-from typing import Optional, List, Dict
-from dataclasses import dataclass, asdict
+from typing import Optional, List, Dict, Tuple
 
+import service_time
+from common import StationInfo, RouteInfo, routes_json
 
-@dataclass
-class StationInfo:
-    name: str
-    use_type: str  # deperture, transit, destination
-    departuret_time: Optional[str] = None
-    deptarture_platform: Optional[int] = None
-    arrival_time: Optional[str] = None
-    arrival_platform: Optional[int] = None
-
-
-@dataclass
-class RouteInfo:
-    train_type: str  # Keio_Liner, Express, Local
-    day_type: str  # weekday, holiday
-    origin_station_info: StationInfo
-    terminal_station_info: StationInfo
-    transits: Optional[List[StationInfo]] = None
-
-
-def to_dt(s: Optional[str]) -> Optional[datetime]:
-    """ISO8601文字列→datetime（失敗/NoneならNone）。Zにも対応。"""
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00"))
-    except Exception:
-        return None
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.profiling import profiled, span
+from py_code.output import write_text
 
 
 def ensure_list_of_dicts(x):
@@ -91,43 +68,65 @@ data_dir = os.path.join(os.path.dirname(__file__), "..", "..", "py_data", "train
 output_dir = os.path.join(os.path.dirname(__file__), "..", "..", "py_data", "train", "publish")
 os.makedirs(output_dir, exist_ok=True)
 
+# (path, mtime) -> 行リスト。乗換検索で同じ CSV を行ごとに読み直さないためのキャッシュ
+_rows_cache: Dict[str, Tuple[float, List[Dict]]] = {}
 
-def get_next_train_kitano_to_takao3(target_time: str, d_type) -> Optional[Dict]:
-    fk_name = f"{today_str}_{d_type}_kitano_to_takao.csv"
-    fk_path = os.path.join(data_dir, fk_name)
-    if not os.path.exists(fk_path):
-        return None
 
-    df_k = pd.read_csv(fk_path)
-    if df_k.empty:
+def load_rows(path: str) -> List[Dict]:
+    """
+    収集 CSV を dict の行リストで返す（pandas 不使用）。
+    空欄は None、stop_stations は list[dict] に正規化。ファイルが無ければ []。
+    dep_min / stop_mins（営業日の分）は int / list[int] に（列の無い古い CSV はここで作る）。
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return []
+    hit = _rows_cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            row = {k: (v if v != "" else None) for k, v in row.items()}
+            row["stop_stations"] = ensure_list_of_dicts(row.get("stop_stations"))
+            row["dep_min"], row["stop_mins"] = service_time.row_minutes(row)
+            rows.append(row)
+    _rows_cache[path] = (mtime, rows)
+    return rows
+
+
+def get_next_train_kitano_to_takao3(target_time: str, d_type, ymd: Optional[str] = None) -> Optional[Dict]:
+    ymd = ymd or today_str
+    fk_name = f"{ymd}_{d_type}_kitano_to_takao.csv"
+    fk_path = os.path.join(data_dir, fk_name)
+    rows = load_rows(fk_path)
+    if not rows:
         return None
 
-    df_k["stop_stations"] = df_k["stop_stations"].apply(ensure_list_of_dicts)
-
     result = None
-    best_arr_dt = None
-    target_dt = to_dt(target_time)
+    best_arr = None
+    target = service_time.from_iso(target_time)  # 比較はすべて営業日の分（int）
 
-    for _, row in df_k.iterrows():
-        dep_dt = to_dt(row.get("time_iso"))
-        if not dep_dt:
+    for row in rows:
+        dep = row["dep_min"]
+        if dep is None:
             continue
-        if target_dt and dep_dt < target_dt:
+        if target is not None and dep < target:
             continue
 
         # 高尾山口の到着時刻を拾う
-        takao_arr = None
-        for st in row["stop_stations"]:
+        takao_arr = arr = None
+        for st, m in zip(row["stop_stations"], row["stop_mins"]):
             if st.get("station") == "高尾山口":
-                takao_arr = st.get("time")
+                takao_arr, arr = st.get("time"), m
                 break
 
-        arr_dt = to_dt(takao_arr)
-        if not arr_dt:
+        if arr is None:
             continue
 
-        if best_arr_dt is None or arr_dt < best_arr_dt:
-            best_arr_dt = arr_dt
+        if best_arr is None or arr < best_arr:
+            best_arr = arr
             result = {
                 "departure_time": row.get("time_iso"),
                 "arrival_time": takao_arr,
@@ -138,41 +137,36 @@ def get_next_train_kitano_to_takao3(target_time: str, d_type) -> Optional[Dict]:
     return result
 
 
-def get_next_train_kitano_to_shinjuku(target_time: str, d_type) -> Optional[Dict]:
-    fk_name = f"{today_str}_{d_type}_kitano_to_shinjuku.csv"
+def get_next_train_kitano_to_shinjuku(target_time: str, d_type, ymd: Optional[str] = None) -> Optional[Dict]:
+    ymd = ymd or today_str
+    fk_name = f"{ymd}_{d_type}_kitano_to_shinjuku.csv"
     fk_path = os.path.join(data_dir, fk_name)
-    if not os.path.exists(fk_path):
-        return None
-
-    df_k = pd.read_csv(fk_path)
-    if df_k.empty:
+    rows = load_rows(fk_path)
+    if not rows:
         return None
 
-    df_k["stop_stations"] = df_k["stop_stations"].apply(ensure_list_of_dicts)
-
     result = None
-    best_arr_dt = None
-    target_dt = to_dt(target_time)
+    best_arr = None
+    target = service_time.from_iso(target_time)
 
-    for _, row in df_k.iterrows():
-        dep_dt = to_dt(row.get("time_iso"))
-        if not dep_dt:
+    for row in rows:
+        dep = row["dep_min"]
+        if dep is None:
             continue
-        if target_dt and dep_dt < target_dt:
+        if target is not None and dep < target:
             continue
 
-        shinjuku_arr = None
-        for st in row["stop_stations"]:
+        shinjuku_arr = arr = None
+        for st, m in zip(row["stop_stations"], row["stop_mins"]):
             if st.get("station") == "新宿":
-                shinjuku_arr = st.get("time")
+                shinjuku_arr, arr = st.get("time"), m
                 break
 
-        arr_dt = to_dt(shinjuku_arr)
-        if not arr_dt:
+        if arr is None:
             continue
 
-        if best_arr_dt is None or arr_dt < best_arr_dt:
-            best_arr_dt = arr_dt
+        if best_arr is None or arr < best_arr:
+            best_arr = arr
             result = {
                 "departure_time": row.get("time_iso"),
                 "arrival_time": shinjuku_arr,
@@ -187,21 +181,18 @@ def station_info_from_dict(data: dict) -> StationInfo:
     return StationInfo(**data)
 
 
-def takao3_to_shinjuku():
+def takao3_to_shinjuku(ymd: Optional[str] = None):
+    """ymd（YYYYMMDD）の CSV から 高尾山口→新宿 の JSON を作る。省略時は今日。"""
+    ymd = ymd or today_str
     all_routes = []
     for d_type in day_type:
-        fs_name = f"{today_str}_{d_type}_takao_to_up.csv"
+        fs_name = f"{ymd}_{d_type}_takao_to_up.csv"
         fs_path = os.path.join(data_dir, fs_name)
-        if not os.path.exists(fs_path):
-            continue
-
-        df_s = pd.read_csv(fs_path)
-        if df_s.empty:
+        rows = load_rows(fs_path)
+        if not rows:
             continue
 
-        df_s["stop_stations"] = df_s["stop_stations"].apply(ensure_list_of_dicts)
-
-        for _, row in df_s.iterrows():
+        for row in rows:
             origin = StationInfo(
                 name="高尾山口",
                 use_type="deperture",
@@ -230,7 +221,7 @@ def takao3_to_shinjuku():
                 # 北野乗換
                 if not kitano_arr:
                     continue
-                tran_data = get_next_train_kitano_to_shinjuku(kitano_arr, d_type)
+                tran_data = get_next_train_kitano_to_shinjuku(kitano_arr, d_type, ymd)
                 if not tran_data:
                     continue
                 transits = [
@@ -258,30 +249,28 @@ def takao3_to_shinjuku():
             all_routes.append(route_info)
 
     os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{today_str}_takao3_to_shinjuku.json")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump([asdict(route) for route in all_routes],
-                f, ensure_ascii=False, indent=4)
-    print(f"データは {output_file} に保存されました。")
+    output_file = os.path.join(output_dir, f"{ymd}_takao3_to_shinjuku.json")
+    if write_text(output_file, routes_json(all_routes)):
+        print(f"データは {output_file} に保存されました。")
+    else:
+        print(f"{output_file} は変更なし。")
+    return len(all_routes)
 
 
-def shinjuku_to_takao3():
+def shinjuku_to_takao3(ymd: Optional[str] = None):
+    """ymd（YYYYMMDD）の CSV から 新宿→高尾山口 の JSON を作る。省略時は今日。"""
+    ymd = ymd or today_str
     all_routes = []
 
     # --- 直通 ---
     for d_type in day_type:
-        fs_name = f"{today_str}_{d_type}_shinjuku_to_takao_direct.csv"
+        fs_name = f"{ymd}_{d_type}_shinjuku_to_takao_direct.csv"
         fs_path = os.path.join(data_dir, fs_name)
-        if not os.path.exists(fs_path):
-            continue
-
-        df_s = pd.read_csv(fs_path)
-        if df_s.empty:
+        rows = load_rows(fs_path)
+        if not rows:
             continue
 
-        df_s["stop_stations"] = df_s["stop_stations"].apply(ensure_list_of_dicts)
-
-        for _, row in df_s.iterrows():
+        for row in rows:
             origin = StationInfo(
                 name="新宿",
                 use_type="deperture",
@@ -312,18 +301,13 @@ def shinjuku_to_takao3():
 
     # --- 北野乗換（新宿→京王八王子 特急 + 北野→高尾山口）---
     for d_type in day_type:
-        fk_name = f"{today_str}_{d_type}_shinjuku_to_keiohachioji.csv"  # ← day_type[0] ではなく d_type
+        fk_name = f"{ymd}_{d_type}_shinjuku_to_keiohachioji.csv"  # ← day_type[0] ではなく d_type
         fk_path = os.path.join(data_dir, fk_name)
-        if not os.path.exists(fk_path):
+        rows = load_rows(fk_path)
+        if not rows:
             continue
 
-        df_k = pd.read_csv(fk_path)
-        if df_k.empty:
-            continue
-
-        df_k["stop_stations"] = df_k["stop_stations"].apply(ensure_list_of_dicts)
-
-        for _, row in df_k.iterrows():
+        for row in rows:
             origin = StationInfo(
                 name="新宿",
                 use_type="deperture",
@@ -340,7 +324,7 @@ def shinjuku_to_takao3():
             if not kitano_arr:
                 continue  # 乗換基準時刻が取れなければスキップ
 
-            tran_data = get_next_train_kitano_to_takao3(kitano_arr, d_type)
+            tran_data = get_next_train_kitano_to_takao3(kitano_arr, d_type, ymd)
             if not tran_data:
                 continue
 
@@ -368,14 +352,25 @@ def shinjuku_to_takao3():
 
     # JSON保存（ディレクトリが無ければ作成）
     os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{today_str}_shinjuku_to_takao3.json")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump([asdict(route) for route in all_routes],
-                f, ensure_ascii=False, indent=4)
-    print(f"データは {output_file} に保存されました。")
+    output_file = os.path.join(output_dir, f"{ymd}_shinjuku_to_takao3.json")
+    if write_text(output_file, routes_json(all_routes)):
+        print(f"データは {output_file} に保存されました。")
+    else:
+        print(f"{output_file} は変更なし。")
+    return len(all_routes)
 
 
 # 実行例
 if __name__ == "__main__":
-    shinjuku_to_takao3()
-    takao3_to_shinjuku()
+    import argparse
+    with profiled("make_timetable"):  # --profile は argparse より先に取り除かれる
+        ap = argparse.ArgumentParser()
+        ap.add_argument("--date", default=None, help="YYYY-MM-DD（省略時は今日）")
+        ap.add_argument("--replay", default=None, metavar="YYYY-MM-DD", help="--date の別名（keio_base.py --replay の後段用）")
+        args = ap.parse_args()
+        d = args.replay or args.date
+        ymd = d.replace("-", "") if d else None
+        with span("shinjuku_to_takao3"):
+            shinjuku_to_takao3(ymd)
+        with span("takao3_to_shinjuku"):
+            takao3_to_shinjuku(ymd)
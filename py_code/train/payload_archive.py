@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+payload_archive.py
+- Navitime の生レスポンスを日別の追記専用アーカイブに保存する。
+  py_data/train/archive/YYYYMMDD.payloads.gz   … 1 レスポンス = 1 gzip メンバー（追記のみ）
+  py_data/train/archive/YYYYMMDD.index.jsonl   … key → (offset, length) の索引（追記のみ）
+- key は (endpoint, params, day_type)。day_type は Referer にしか出ないが、
+  収集側では別リクエストとして扱っているので区別して持つ。
+- --replay ではこの索引から引いて返す（ネットワーク・スリープなし）。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(HERE, "..", "..", "py_data", "train", "archive")
+
+
+class ArchiveMiss(KeyError):
+    """リプレイ時にアーカイブに該当レスポンスが無い。"""
+
+
+def archive_key(endpoint: str, params: Dict[str, Any], day_type: Optional[str] = None) -> str:
+    canon = json.dumps([endpoint, sorted(params.items()), day_type or ""], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canon.encode("utf-8")).hexdigest()
+
+
+class PayloadArchive:
+    def __init__(self, ymd: str, base_dir: str = ARCHIVE_DIR):
+        self.ymd = ymd
+        self.base_dir = base_dir
+        self.data_path = os.path.join(base_dir, f"{ymd}.payloads.gz")
+        self.index_path = os.path.join(base_dir, f"{ymd}.index.jsonl")
+        self._index: Optional[Dict[str, Tuple[int, int]]] = None
+
+    # ---- 書き込み ----
+    def append(self, endpoint: str, params: Dict[str, Any], payload: bytes, *,
+               day_type: Optional[str] = None, status: int = 200) -> None:
+        os.makedirs(self.base_dir, exist_ok=True)
+        blob = gzip.compress(payload, mtime=0)
+        with open(self.data_path, "ab") as f:
+            offset = f.tell()
+            f.write(blob)
+        key = archive_key(endpoint, params, day_type)
+        entry = {
+            "key": key,
+            "endpoint": endpoint,
+            "params": params,
+            "day_type": day_type,
+            "status": status,
+            "offset": offset,
+            "length": len(blob),
+            "raw_bytes": len(payload),
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if self._index is not None:
+            self._index[key] = (offset, len(blob))
+
+    # ---- 読み出し ----
+    def _load_index(self) -> Dict[str, Tuple[int, int]]:
+        if self._index is None:
+            idx: Dict[str, Tuple[int, int]] = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            e = json.loads(line)
+                        except ValueError:
+                            continue  # 途中で落ちた行は無視
+                        idx[e["key"]] = (e["offset"], e["length"])  # 同じ key は後勝ち
+            self._index = idx
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def load(self, endpoint: str, params: Dict[str, Any], *, day_type: Optional[str] = None) -> bytes:
+        loc = self._load_index().get(archive_key(endpoint, params, day_type))
+        if loc is None:
+            raise ArchiveMiss(f"{self.ymd}: {endpoint} {params} [{day_type}]")
+        offset, length = loc
+        with open(self.data_path, "rb") as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length))
+
+    def load_json(self, endpoint: str, params: Dict[str, Any], *, day_type: Optional[str] = None) -> Any:
+        return json.loads(self.load(endpoint, params, day_type=day_type))
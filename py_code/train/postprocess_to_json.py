@@ -1,12 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, sys, json, csv, argparse
+"""
+収集 CSV（YYYYMMDD_{day_type}_{route}.csv）→ 公開用 JSON。
+
+  publish/takao35_timetable_YYYYMMDD.json   全路線・両日種の 1 ファイル
+  publish/shards/<route>/<day_type>/<HH>.json
+                                            路線 × 日種 × 時（出発時の hour）ごとの小片。
+                                            アプリは「今」の 1 枚だけ取ればよい
+  publish/shards/index.json                 serviceDate と、どの小片があるか（件数・バイト数）
+  publish/timetable_version.json            内容の版番号 N と serviceDate
+  publish/takao35_timetable_latest.json     版 N のまとめ JSON（版を進めたときだけ書く。次の差分の基準）
+  publish/timetable_delta.json              版 N-1 → N の差分（timetable_delta.py）。N-1 を持っている
+                                            クライアントはこれだけ取って当てればよい
+
+小片は CSV を 1 本読むたびにその行から切り出して書く（行の dict はまとめ JSON と共有、写しは作らない）。
+置き場所は日付なしで毎日上書き。その日に無くなった時間帯の小片は消す。
+版番号は serviceDate か内容が変わったときだけ進む（同じ日の再実行で中身が同じなら据え置き）。
+版・差分・latest は通常の実行では書かない。keio_train_daily.sh が validate_dataset.py を通したあとに
+--commit-version で進める（検査で止めた日は版が進まず、公開していない文書が差分の基準にもならない）。
+"""
+import os, sys, json, csv, argparse, time
 from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
 from make_timetable import shinjuku_to_takao3, takao3_to_shinjuku
 from render_timetable_html import render
+from timetable_delta import diff
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.run_history import record_stage, stage_timer
+from py_code.profiling import profiled, span
+from py_code.output import dumps, write_bytes, write_json
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "..", "py_data", "train"))
 PUB_DIR = os.path.join(OUT_DIR, "publish")
+SHARD_DIR = os.path.join(PUB_DIR, "shards")
+VERSION_FILE = "timetable_version.json"
+DELTA_FILE = "timetable_delta.json"
+FULL_LATEST = "takao35_timetable_latest.json"  # 版 N のまとめ JSON（ローカルもサーバーもこの名前）
 os.makedirs(PUB_DIR, exist_ok=True)
 
 ROUTE_KEYS = [
@@ -43,12 +75,106 @@ def load_csv(path):
     rows.sort(key=lambda x: (x["hour"], x["minute"], x["opId"]))
     return rows
 
+def shard_path(route, day_type, hour):
+    return os.path.join(SHARD_DIR, route, day_type, f"{hour:02d}.json")
+
+def write_hour_shards(route, day_type, rows, hours):
+    """rows（hour 順）を時ごとに書く。hours に {HH: {n, bytes}} を足し、書いたパスを返す。"""
+    paths = []
+    for hour, group in groupby(rows, key=itemgetter("hour")):
+        group = list(group)
+        data = dumps({"route": route, "dayType": day_type, "hour": hour, "rows": group}).encode("utf-8")
+        path = shard_path(route, day_type, hour)
+        write_bytes(path, data)
+        hours[f"{hour:02d}"] = {"n": len(group), "bytes": len(data)}
+        paths.append(path)
+    return paths
+
+def remove_stale_shards(keep):
+    """今回書かなかった小片（と .gz）を消す。"""
+    keep = set(keep)
+    for root, _, files in os.walk(SHARD_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            base = path[:-3] if path.endswith(".gz") else path
+            if base.endswith(".json") and base not in keep and root != SHARD_DIR:
+                os.remove(path)
+
+def load_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def update_version(doc):
+    """
+    前の版（publish/takao35_timetable_latest.json）と比べて版を進め、差分を書く。
+    版を進めたら latest にも同じ中身を書く。upload_coreserver.sh は mtime ではなくこれを
+    takao35_timetable_latest.json として送るので、--replay で過去日の文書が新しくなっても
+    「最新」と版・差分の組がずれない。
+    """
+    version_path = os.path.join(PUB_DIR, VERSION_FILE)
+    latest_path = os.path.join(PUB_DIR, FULL_LATEST)
+    state = load_json(version_path) or {"version": 0}
+    prev_date = state.get("serviceDate")
+    base = load_json(latest_path)
+    if base is None and prev_date:  # latest を書く前の版（日付付きの文書しか無い）
+        base = load_json(os.path.join(PUB_DIR, f"takao35_timetable_{prev_date.replace('-', '')}.json"))
+    delta = diff(base, doc) if base else None
+    if delta is not None and not delta["routes"]:
+        if not os.path.exists(latest_path):
+            write_json(latest_path, base)
+        print(f"Version: {state['version']} (unchanged)")
+        return state["version"]
+
+    version = state["version"] + 1
+    info = {"version": version, "serviceDate": doc["serviceDate"], "generatedAt": doc["generatedAt"],
+            "full": FULL_LATEST, "delta": None}
+    if delta is not None:
+        delta = {"from": state["version"], "to": version, **delta}
+        data = dumps(delta).encode("utf-8")
+        write_bytes(os.path.join(PUB_DIR, DELTA_FILE), data)
+        info["delta"] = {"file": DELTA_FILE, "from": state["version"], "bytes": len(data)}
+        n = sum(len(c.get("upsert", c.get("replace", []))) + len(c.get("delete", []))
+                for days in delta["routes"].values() for c in days.values())
+        print(f"Version: {state['version']} -> {version} (delta {len(data)} B, {n} rows)")
+    else:
+        print(f"Version: {version} (no base; full only)")
+    write_json(latest_path, doc)
+    write_json(version_path, info)
+    return version
+
+def commit_version(ymd):
+    """検査を通った日のまとめ JSON（takao35_timetable_YYYYMMDD.json）で版と差分を進める。"""
+    doc = load_json(os.path.join(PUB_DIR, f"takao35_timetable_{ymd}.json"))
+    if doc is None:
+        raise SystemExit(f"no timetable document for {ymd}; run postprocess_to_json.py --date first")
+    return update_version(doc)
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--date", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--date", default=None, help="YYYY-MM-DD")
+    ap.add_argument("--replay", default=None, metavar="YYYY-MM-DD",
+                    help="--date の別名（keio_base.py --replay の後段として過去日を再生成）")
+    ap.add_argument("--no-shards", action="store_true", help="時ごとの小片を書かない（--replay では既定で書かない）")
+    ap.add_argument("--commit-version", action="store_true",
+                    help="書き出し済みの --date の文書で版・差分・latest だけ進める（validate_dataset.py の後に呼ぶ）")
     args = ap.parse_args()
+    args.date = args.replay or args.date
+    if not args.date:
+        ap.error("--date (or --replay) is required")
 
     ymd = args.date.replace("-", "")
+    if args.commit_version:
+        if args.replay:
+            ap.error("--commit-version cannot be combined with --replay")
+        commit_version(ymd)
+        return None
+    shards = not (args.no_shards or args.replay)  # 小片は日付なしの置き場所なので、過去日の再生成では上書きしない
+    shard_paths = []
+    index = {"serviceDate": args.date, "generatedAt": None, "path": "{route}/{dayType}/{hour}.json", "routes": {}}
+    n_rows = 0
     doc = {
         "generatedAt": datetime.now().isoformat(),
         "serviceDate": args.date,
@@ -65,15 +191,33 @@ def main():
                 continue
             rows = load_csv(path)
             doc["routes"].setdefault(key, {})[day_type] = rows
+            n_rows += len(rows)
+            if shards:
+                hours = index["routes"].setdefault(key, {}).setdefault(day_type, {})
+                shard_paths += write_hour_shards(key, day_type, rows, hours)
 
     # まとめJSONを書き出し
     out_json = os.path.join(PUB_DIR, f"takao35_timetable_{ymd}.json")
-    with open(out_json, "w", encoding="utf-8") as f:
-        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
-    print("Wrote:", out_json)
+    print("Wrote:" if write_json(out_json, doc) else "Unchanged:", out_json)
+    if shards:
+        remove_stale_shards(shard_paths)
+        index["generatedAt"] = doc["generatedAt"]
+        write_json(os.path.join(SHARD_DIR, "index.json"), index)
+        print(f"Shards: {len(shard_paths)} ->", SHARD_DIR)
+    return ymd, n_rows, bool(args.replay)
 
 if __name__ == "__main__":
-    main()
-    shinjuku_to_takao3()
-    takao3_to_shinjuku()
-    render()
+    # 段ごとの所要時間を run_history に残す（--replay の再生成は記録しない）
+    with profiled("postprocess_to_json"):
+        t0 = time.monotonic()
+        with span("postprocess"):
+            res = main()
+        if res is not None:  # --commit-version は版を進めるだけ（段として記録しない）
+            ymd, n_rows, replaying = res
+            run_date = f"{ymd[:4]}-{ymd[4:6]}-{ymd[6:]}"
+            if not replaying:
+                record_stage("postprocess", time.monotonic() - t0, rows=n_rows, run_date=run_date)
+            with stage_timer("make_timetable", run_date=run_date, enabled=not replaying) as st, span("make_timetable"):
+                st["rows"] = shinjuku_to_takao3(ymd) + takao3_to_shinjuku(ymd)
+            with stage_timer("render", run_date=run_date, enabled=not replaying), span("render"):
+                render(ymd)
@@ -15,31 +15,35 @@ cron想定例（15分ごと）:
 """
 import os
 import re
-import json
+import sys
 import traceback
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any
 
 import requests
-from bs4 import BeautifulSoup
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+from py_code.runtime_guard import job_lock, JobLocked, throttle
+from py_code.profiling import profiled, span
+from py_code.output import STYLESHEET_LINK, write_json, write_stylesheet, write_text
 
 # ---------------- Settings ----------------
 JST = timezone(timedelta(hours=9))
 
 # 出力先
 OUT_DIR = Path("/home/masuday/projects/takao35/py_data/train")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # Firestore 投稿（任意）
 ENABLE_FIRESTORE = os.environ.get("ENABLE_FIRESTORE", "0") in ("1", "true", "True")
+# 最後に Firestore へ投稿した短文タイトル。同じなら投稿しない（txt の書き換えとは別に持つ）
+LAST_POSTED = OUT_DIR / "takao_rail_last_posted.txt"
 
 # fs_client の import（あなたの配置に合わせて調整）
 # 例: /home/masuday/projects/takao35/py_code/app/fs_client.py
 post_news = None
 if ENABLE_FIRESTORE:
     try:
-        import sys
         sys.path.append("/home/masuday/projects/takao35/py_code/app")
         from fs_client import post_news  # type: ignore
     except Exception as _e:
@@ -64,6 +68,7 @@ KEIO_BAD_WORDS  = ["遅れ", "運転見合わせ", "運休", "振替", "ダイ
 
 # ---------------- Helpers ----------------
 def fetch_html(url: str) -> str:
+    throttle(url)
     r = requests.get(url, headers=HEADERS, timeout=20)
     r.raise_for_status()
     r.encoding = r.apparent_encoding
@@ -76,9 +81,11 @@ def extract_time(text: str) -> Optional[datetime]:
     dt = datetime.strptime(m.group(1), "%Y年%m月%d日 %H時%M分").replace(tzinfo=JST)
     return dt
 
-def jr_parse(line_url: str, fallback_area_html: Optional[str] = None) -> Dict[str, Any]:
-    """JR東日本の路線個別ページを解析して {status, detail, updated_at, source} を返す"""
-    html = fetch_html(line_url)
+def jr_parse(line_url: str, fallback_area_html: Optional[str] = None, html: Optional[str] = None) -> Dict[str, Any]:
+    """JR東日本の路線個別ページを解析して {status, detail, updated_at, source} を返す（html 指定時は取得しない）"""
+    from bs4 import BeautifulSoup  # 重いので使う所で読む
+    if html is None:
+        html = fetch_html(line_url)
     soup = BeautifulSoup(html, "html.parser")
 
     # 更新時刻
@@ -116,9 +123,11 @@ def jr_parse(line_url: str, fallback_area_html: Optional[str] = None) -> Dict[st
         "source": line_url
     }
 
-def keio_parse() -> Dict[str, Any]:
-    """京王運行情報ページを解析して {status_keio_line, status_keio_takao, updated_at, detail, source} を返す"""
-    html = fetch_html(KEIO)
+def keio_parse(html: Optional[str] = None) -> Dict[str, Any]:
+    """京王運行情報ページを解析して {status_keio_line, status_keio_takao, updated_at, detail, source} を返す（html 指定時は取得しない）"""
+    from bs4 import BeautifulSoup  # 重いので使う所で読む
+    if html is None:
+        html = fetch_html(KEIO)
     soup = BeautifulSoup(html, "html.parser")
     text = soup.get_text(" ", strip=True)
 
@@ -165,21 +174,10 @@ def build_html(data: Dict[str, Any]) -> str:
         return f"<tr><th>{label}</th><td>{status}</td><td>{u}</td><td><a href='{src}' target='_blank' rel='noopener'>出典</a></td></tr>"
     return f"""
 <html><head><meta charset="utf-8"><title>高尾山付近の鉄道運行情報（試行中）</title>
-<style>
-body{{font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,'Hiragino Kaku Gothic ProN','Noto Sans JP',sans-serif;margin:16px;color:#222;}}
-h2 small{{font-size:.7em;color:#666;margin-left:.5em;}}
-table{{width:100%;border-collapse:collapse;table-layout:fixed;}}
-colgroup col:nth-child(1){{width:28%;}}
-colgroup col:nth-child(2){{width:32%;}}
-colgroup col:nth-child(3){{width:20%;}}
-colgroup col:nth-child(4){{width:20%;}}
-th,td{{border:1px solid #ddd;padding:8px;text-align:left;word-break:keep-all;}}
-th{{background:#f7f7f7;}}
-.small{{font-size:.85em;color:#666;}}
-</style>
+{STYLESHEET_LINK}
 </head><body>
 <h2>高尾山付近の鉄道運行情報（試行中） <small>{ts} 更新</small></h2>
-<table>
+<table class="rail">
   <colgroup><col><col><col><col></colgroup>
   <tr><th>路線</th><th>現在の状況</th><th>最終更新</th><th>リンク</th></tr>
   {row("JR 中央線（快速）", data["jr_rapid"]["status"], data["jr_rapid"]["updated_at"], data["jr_rapid"]["source"])}
@@ -218,37 +216,43 @@ def _short_word_keio(text: str) -> str:
     return "情報更新"
 
 # ---------------- Main ----------------
+def _last_posted() -> Optional[str]:
+    try:
+        return LAST_POSTED.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
 def main() -> None:
     try:
         # JR関東トップ（時刻フォールバック用）
-        jr_area_html = fetch_html(JR_AREA)
-        jr_rapid = jr_parse(JR_RAPID, fallback_area_html=jr_area_html)
-        jr_chuo  = jr_parse(JR_CHUO,  fallback_area_html=jr_area_html)
-        keio     = keio_parse()
+        with span("jr"):
+            jr_area_html = fetch_html(JR_AREA)
+            jr_rapid = jr_parse(JR_RAPID, fallback_area_html=jr_area_html)
+            jr_chuo  = jr_parse(JR_CHUO,  fallback_area_html=jr_area_html)
+        with span("keio"):
+            keio     = keio_parse()
 
         bundle = {"jr_rapid": jr_rapid, "jr_chuo": jr_chuo, "keio": keio}
 
         # HTML
         html = build_html(bundle)
-        (OUT_DIR / "takao_rail_info.html").write_text(html, encoding="utf-8")
+        write_text(OUT_DIR / "takao_rail_info.html", html)
+        write_stylesheet(OUT_DIR)
 
         # JSON（そのまま/詳細も残す）
-        (OUT_DIR / "takao_rail_info.json").write_text(
-            json.dumps({
-                "generated_at": datetime.now(JST).isoformat(),
-                "lines": bundle
-            }, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
-
-        # 短文化タイトルの生成・保存
+        write_json(OUT_DIR / "takao_rail_info.json", {
+            "generated_at": datetime.now(JST).isoformat(),
+            "lines": bundle
+        })
+
+        # 短文化タイトルの生成・保存（前回と同じなら書かない）
         jr_rapid_word = _short_word_jr(jr_rapid.get("status", ""))
         keio_word     = _short_word_keio(keio.get("status_keio_line", ""))
         short_title   = f"京王線：{keio_word}・中央線快速：{jr_rapid_word}"
-        (OUT_DIR / "takao_rail_short.txt").write_text(short_title + "\n", encoding="utf-8")
+        write_text(OUT_DIR / "takao_rail_short.txt", short_title + "\n")
 
-        # 任意：Firestore 投稿
-        if ENABLE_FIRESTORE and (post_news is not None):
+        # 任意：Firestore 投稿（最後に投稿したタイトルと違うときだけ。失敗したら記録せず次回もう一度）
+        if ENABLE_FIRESTORE and (post_news is not None) and _last_posted() != short_title:
             pin = 3 if ("見合わせ" in short_title) else (2 if "遅延" in short_title else 1)
             post_news(
                 "rail:now",
@@ -257,6 +261,7 @@ def main() -> None:
                 url="https://takaosan-go.jp/info/rail",
                 pin=pin
             )
+            write_text(LAST_POSTED, short_title)
 
         print("rail status: OK |", short_title)
     except Exception as e:
@@ -264,4 +269,8 @@ def main() -> None:
         traceback.print_exc()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        with job_lock("rail_status"), profiled("rail_status"):
+            main()
+    except JobLocked as e:
+        print("rail status: SKIP", e)
\ No newline at end of file
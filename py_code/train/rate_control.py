@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+rate_control.py
+- Navitime へのリクエスト間隔を AIMD（加算増・乗算減）で自動調整する。
+  * 応答が速く正常 → レートを少しずつ上げる（+additive_step req/s）
+  * 429 / 5xx / タイムアウト / レイテンシ悪化 → レートを大きく下げる（×decrease_factor）
+- ルート単位のサーキットブレーカー：連続失敗で一定時間そのルートを止める。
+- 判断はすべて "[rate]" / "[breaker]" 付きで print（cron ログに残る）。
+"""
+
+import random
+import time
+from typing import Optional
+
+
+class AimdRateController:
+    """リクエスト間隔（= 1/rate 秒）を AIMD で調整する。"""
+
+    def __init__(
+        self,
+        *,
+        initial_rate: float = 0.8,      # 従来の 1.0〜1.5 秒スリープ相当
+        min_rate: float = 0.1,
+        max_rate: float = 3.0,
+        additive_step: float = 0.05,
+        decrease_factor: float = 0.5,
+        slow_latency: float = 3.0,      # この秒数を超えたら「遅い」とみなす
+        latency_ratio: float = 2.0,     # EWMA の何倍で「悪化」とみなすか
+        latency_floor: float = 0.5,     # これ未満の応答は倍率判定の対象外（ミリ秒単位の揺れを無視）
+        jitter: float = 0.2,
+        log_every: int = 25,
+    ):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_step = additive_step
+        self.decrease_factor = decrease_factor
+        self.slow_latency = slow_latency
+        self.latency_ratio = latency_ratio
+        self.latency_floor = latency_floor
+        self.jitter = jitter
+        self.log_every = log_every
+
+        self.ewma_latency: Optional[float] = None
+        self._last_request_at: Optional[float] = None
+        self._not_before = 0.0          # Retry-After 等で指定された再開時刻
+        self._ok_streak = 0
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.rate
+
+    def wait(self) -> float:
+        """次のリクエストまで待つ。実際に寝た秒数を返す。"""
+        now = time.monotonic()
+        target = now
+        if self._last_request_at is not None:
+            gap = self.interval * (1.0 + random.uniform(-self.jitter, self.jitter))
+            target = self._last_request_at + gap
+        target = max(target, self._not_before)
+        slept = max(0.0, target - now)
+        if slept > 0:
+            time.sleep(slept)
+        self._last_request_at = time.monotonic()
+        return slept
+
+    def on_success(self, latency: float) -> None:
+        """正常応答（2xx）。レイテンシが悪化していれば減速、そうでなければ加速。"""
+        baseline = self.ewma_latency
+        self.ewma_latency = latency if baseline is None else (0.8 * baseline + 0.2 * latency)
+
+        rising = baseline is not None and latency > max(baseline * self.latency_ratio, self.latency_floor)
+        if latency > self.slow_latency or rising:
+            self._decrease(f"slow response {latency:.2f}s (ewma {baseline or 0:.2f}s)")
+            return
+
+        self._ok_streak += 1
+        new_rate = min(self.max_rate, self.rate + self.additive_step)
+        if new_rate != self.rate:
+            self.rate = new_rate
+            if self._ok_streak % self.log_every == 0:
+                print(f"[rate] increase -> {self.rate:.2f} req/s (interval {self.interval:.2f}s, ewma {self.ewma_latency:.2f}s)")
+
+    def on_failure(self, reason: str, *, retry_after: Optional[float] = None) -> None:
+        """429/5xx/タイムアウト等。乗算で減速し、Retry-After があれば尊重する。"""
+        self._decrease(reason)
+        if retry_after:
+            self._not_before = max(self._not_before, time.monotonic() + retry_after)
+            print(f"[rate] honoring Retry-After {retry_after:.0f}s")
+
+    def _decrease(self, reason: str) -> None:
+        self._ok_streak = 0
+        old = self.rate
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        print(f"[rate] decrease {old:.2f} -> {self.rate:.2f} req/s ({reason})")
+
+
+class CircuitOpenError(RuntimeError):
+    """ブレーカーが開いている間に呼び出された。"""
+
+
+class CircuitBreaker:
+    """
+    連続 failure_threshold 回失敗で open → cooldown 秒後に half-open で 1 回だけ試す。
+    half-open で成功すれば closed に戻り、失敗すれば再び open。
+    open になった回数が max_trips に達したら exhausted（そのルートは諦める）。
+    """
+
+    def __init__(self, name: str, *, failure_threshold: int = 5, cooldown: float = 120.0, max_trips: int = 3):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.trips >= self.max_trips
+
+    def remaining(self) -> float:
+        """open 中なら half-open まで残り何秒か。"""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def before_call(self) -> None:
+        if self.exhausted:
+            raise CircuitOpenError(f"{self.name}: gave up after {self.trips} trips")
+        if self.state == "open":
+            if self.remaining() > 0:
+                raise CircuitOpenError(f"{self.name}: open for another {self.remaining():.0f}s")
+            self.state = "half-open"
+            print(f"[breaker] {self.name}: half-open (trial request)")
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            print(f"[breaker] {self.name}: closed")
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.trips += 1
+            self._opened_at = time.monotonic()
+            self.failures = 0
+            print(f"[breaker] {self.name}: open for {self.cooldown:.0f}s (trip {self.trips}/{self.max_trips})")
+
+    def wait_until_closable(self) -> float:
+        """open 中なら half-open になるまで待つ（候補ごとのタイムアウトを重ねない）。寝た秒数を返す。"""
+        left = self.remaining()
+        if left > 0 and not self.exhausted:
+            print(f"[breaker] {self.name}: pausing route for {left:.0f}s")
+            time.sleep(left)
+            return left
+        return 0.0
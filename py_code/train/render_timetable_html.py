@@ -1,33 +1,25 @@
 # -*- coding: utf-8 -*-
-import os, json, glob
+import os, sys, json, glob
 from datetime import datetime
 from typing import List, Dict
 from zoneinfo import ZoneInfo  # 追加（Py3.9+）
 
+import service_time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.profiling import profiled
+from py_code.output import STYLESHEET_LINK, write_stylesheet, write_text
+
 BASE_DIR = os.path.dirname(__file__)
 PUB_DIR = os.path.join(BASE_DIR, "..", "..", "py_data", "train", "publish")
 OUT_DIR = os.path.join(BASE_DIR, "..", "..", "py_data", "train", "publish")
 os.makedirs(OUT_DIR, exist_ok=True)
 
-def _hhmm_tuple_from_iso_or_hhmm(t: str):
-    # "2025-08-31T06:10:00+09:00" or "06:10" → (6,10)
-    if not t:
-        return (99, 99)  # 未設定は末尾へ
-    try:
-        if "T" in t:
-            mm = t.split("T", 1)[1][:5]  # "06:10"
-        else:
-            mm = t[:5]
-        h, m = mm.split(":")
-        return (int(h), int(m))
-    except Exception:
-        return (99, 99)
-
-def _dep_key(row: dict, cutoff_hour: int = 3):
-    """cutoff_hour（既定=3）未満の出発は翌日扱い(+24h)で並べる"""
+def _dep_key(row: dict) -> int:
+    """出発の営業日の分（service_time。0〜2 時台は 24 時以降として後ろに並ぶ）。無ければ末尾。"""
     o = row.get("origin_station_info") or {}
     if isinstance(o, str):
-        return (99, 99)  # 変なデータは末尾
+        return service_time.MISSING  # 変なデータは末尾
 
     # タイポ互換
     t = (
@@ -36,14 +28,8 @@ def _dep_key(row: dict, cutoff_hour: int = 3):
         or o.get("depart_time")
         or ""
     )
-    h, m = _hhmm_tuple_from_iso_or_hhmm(t)
-    if h == 99:
-        return (99, 99)
-
-    # 深夜帯を翌日扱いに
-    if 0 <= h < cutoff_hour:
-        return (h + 24, m)  # 例: 00:10 → (24,10) で末尾側へ
-    return (h, m)
+    m = service_time.parse(t)
+    return service_time.MISSING if m is None else m
 
 def load_json(path: str) -> List[Dict]:
     with open(path, "r", encoding="utf-8") as f:
@@ -54,11 +40,9 @@ def find_latest(pattern: str) -> str:
     return paths[-1] if paths else ""
 
 def hhmm(t: str) -> str:
-    # "2025-08-31T06:10:00+09:00" -> "06:10"
-    try:
-        return t.split("T")[1][:5]
-    except Exception:
-        return t
+    # "2025-08-31T06:10:00+09:00" / "06:10" -> "06:10"（読めなければそのまま）
+    m = service_time.parse(t)
+    return t if m is None else service_time.hhmm(m)
 
 def build_table(rows: List[Dict], title: str) -> str:
     # rows は make_timetable.py が出した JSON（dataclass を dict化したもの）
@@ -84,9 +68,11 @@ def build_table(rows: List[Dict], title: str) -> str:
     tr.append("</tbody></table>")
     return "\n".join(tr)
 
-def render():
-    f_shinjuku_to = find_latest("*_shinjuku_to_takao3.json")
-    f_takao_to    = find_latest("*_takao3_to_shinjuku.json")
+def render(ymd: str = None) -> bool:
+    """ymd（YYYYMMDD）指定時はその日の JSON、省略時は最新の JSON から描画。HTML が変わったら True。"""
+    prefix = ymd or "*"
+    f_shinjuku_to = find_latest(f"{prefix}_shinjuku_to_takao3.json")
+    f_takao_to    = find_latest(f"{prefix}_takao3_to_shinjuku.json")
 # ... render() 内、find_latest の直後あたりに追記
     # 最終更新（基データJSONの mtime の最大）
     mtimes = []
@@ -127,23 +113,9 @@ def render():
 <meta charset="utf-8" />
 <meta name="viewport" content="width=device-width,initial-scale=1" />
 <title>高尾山口 連絡時刻表</title>
-<style>
-body{font-family:system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial,sans-serif;line-height:1.5;margin:0;padding:16px;background:#fafafa;color:#222}
-h2,h3{margin:0 0 .5rem}
-.mb{margin-bottom:1rem}
-.tabs{display:flex;gap:8px;margin-bottom:12px;flex-wrap:wrap}
-.tabs button{padding:8px 12px;border:1px solid #ddd;background:#fff;cursor:pointer;border-radius:6px}
-.tabs button.active{background:#222;color:#fff;border-color:#222}
-.panel{display:none}
-.panel.active{display:block}
-.tt{border-collapse:collapse;width:100%;background:#fff;border-radius:8px;overflow:hidden}
-.tt th,.tt td{border-bottom:1px solid #eee;padding:8px 10px;text-align:center;white-space:nowrap}
-.tt thead th{background:#f5f5f5;font-weight:600}
-.note{font-size:.9rem;color:#666;margin-top:8px}
-.small{font-size:.85rem;color:#777}  # ← 追加
-</style>
+""" + STYLESHEET_LINK + """
 </head>
-<body>
+<body class="timetable">
   <h2>新宿⇄高尾山口 特急直通＋北野乗継 時刻表</h2>
   <div class="small">最終更新: """ + last_updated + """ JST</div>
   <div class="tabs" id="tabs">
@@ -200,9 +172,19 @@ document.querySelectorAll('#tabs button').forEach(btn=>{
     )
 
     out_path = os.path.join(OUT_DIR, "timetables.html")
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(html)
+    write_stylesheet(OUT_DIR)
+    if not write_text(out_path, html):
+        print("HTML unchanged ->", out_path)
+        return False
     print("HTML saved ->", out_path)
+    return True
 
 if __name__ == "__main__":
-    render()
\ No newline at end of file
+    import argparse
+    with profiled("render_timetable_html"):  # --profile は argparse より先に取り除かれる
+        ap = argparse.ArgumentParser()
+        ap.add_argument("--date", default=None, help="YYYY-MM-DD（省略時は最新）")
+        ap.add_argument("--replay", default=None, metavar="YYYY-MM-DD", help="--date の別名")
+        args = ap.parse_args()
+        d = args.replay or args.date
+        render(d.replace("-", "") if d else None)
\ No newline at end of file
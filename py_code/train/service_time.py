@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+営業日の時刻モデル。時刻は「営業日の 0:00 からの分（int）」で持つ。
+
+- 終電後の 0〜2 時台（SERVICE_DAY_START_HOUR より前）は前日の営業日として 24:00 以降に数える
+  （GTFS と同じ。00:15 → 1455）。並べ替え・比較・差は整数のまま行う。
+- 解釈は収集時（keio_base.py）に 1 回だけ行い、CSV の dep_min / stop_mins 列に入れる。
+  後段（make_timetable / render_timetable_html / dia_revision）はそれを読むだけ。
+  列の無い古い CSV は読み込み時に同じ関数で補う。
+- Navitime の時刻は固定形式（"2025-09-10T00:15:00+09:00"）。from_iso は「T」以降（15 文字）を
+  1440 通りの表で引くだけで、datetime は作らない（日付部分は見ない。形の検査は validate_dataset.py）。
+  表に無い形（秒が 00 でない・別のオフセット・Z）のときだけ datetime.fromisoformat で読み、JST に直す。
+
+  from service_time import from_iso, hhmm
+  m = from_iso("2025-09-10T00:15:00+09:00")   # 1455
+  hhmm(m)                                      # "00:15"
+"""
+import json
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+JST = timezone(timedelta(hours=9))
+SERVICE_DAY_START_HOUR = 3  # これより前の時刻は前日の営業日
+_CUTOFF = SERVICE_DAY_START_HOUR * 60
+DAY = 24 * 60
+MISSING = 99 * 60  # 時刻が無い・読めないときの並べ替え用（末尾へ）
+
+
+def _wrap(h: int, m: int) -> int:
+    t = h * 60 + m
+    return t + DAY if t < _CUTOFF else t
+
+
+# 固定形式の「T」以降 → 営業日の分（"T00:15:00+09:00" → 1455）
+_TAIL = {f"T{h:02d}:{m:02d}:00+09:00": _wrap(h, m) for h in range(24) for m in range(60)}
+
+
+def _local(s: Optional[str]) -> Optional[datetime]:
+    """ISO 日時 → JST の壁時計の datetime（tz なし）。読めなければ None。"""
+    if not isinstance(s, str):
+        return None
+    try:
+        if s.endswith("+09:00"):  # Navitime の固定形式: オフセットを落として壁時計のまま読む
+            return datetime.fromisoformat(s[:-6])
+        dt = datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(JST).replace(tzinfo=None)
+    return dt
+
+
+def from_iso(s: Optional[str]) -> Optional[int]:
+    """ISO 日時 → 営業日の分。読めなければ None。"""
+    try:
+        return _TAIL[s[10:]]  # 固定形式: 切り出し 1 回と dict 1 回
+    except (KeyError, TypeError):
+        pass
+    dt = _local(s)
+    return _wrap(dt.hour, dt.minute) if dt else None
+
+
+def from_hhmm(s: Optional[str]) -> Optional[int]:
+    """"HH:MM" → 営業日の分。"""
+    if not isinstance(s, str) or len(s) < 5 or s[2] != ":":
+        return None
+    h, m = s[:2], s[3:5]
+    return _wrap(int(h), int(m)) if h.isdigit() and m.isdigit() else None
+
+
+def parse(s: Optional[str]) -> Optional[int]:
+    """ISO 日時でも "HH:MM" でも（make_timetable の JSON は両方混じる）。"""
+    if not isinstance(s, str):
+        return None
+    return from_iso(s) if "T" in s else from_hhmm(s)
+
+
+def from_hm(hour: int, minute: int) -> int:
+    return _wrap(int(hour), int(minute))
+
+
+def clock(t: int) -> Tuple[int, int]:
+    """営業日の分 → 時計の (時, 分)。1455 → (0, 15)。"""
+    return (t // 60) % 24, t % 60
+
+
+def hhmm(t: Optional[int]) -> str:
+    """表示用の "HH:MM"（24 時以降も 00:15 のように時計の時刻で出す）。"""
+    if t is None:
+        return ""
+    h, m = clock(t)
+    return f"{h:02d}:{m:02d}"
+
+
+def local_datetime(s: Optional[str]) -> Optional[datetime]:
+    """ISO 日時 → JST の壁時計の datetime（tz なし。API の datetime 引数を作る用）。"""
+    return _local(s)
+
+
+def dep_minute(row: Dict[str, Any]) -> Optional[int]:
+    """行の出発（dep_min 列、無ければ time_iso、それも無ければ hour / minute）。"""
+    dep = row.get("dep_min")
+    if isinstance(dep, int):
+        return dep
+    if dep not in (None, ""):
+        try:
+            return int(dep)
+        except ValueError:
+            pass
+    m = from_iso(row.get("time_iso"))
+    if m is None and row.get("hour") not in (None, "") and row.get("minute") not in (None, ""):
+        m = from_hm(row["hour"], row["minute"])
+    return m
+
+
+def row_minutes(row: Dict[str, Any]) -> Tuple[Optional[int], List[Optional[int]]]:
+    """
+    収集 CSV の 1 行（stop_stations は list に戻したもの）の (dep_min, stop_mins)。
+    列があればそれを使い、無い（古い CSV）・読めなければ time_iso / 停車時刻から作る。
+    """
+    dep = dep_minute(row)
+    mins = row.get("stop_mins")
+    if isinstance(mins, str):
+        try:
+            mins = json.loads(mins) if mins else None
+        except ValueError:
+            mins = None
+    stops = row.get("stop_stations") or []
+    if not isinstance(mins, list) or len(mins) != len(stops):
+        mins = [from_iso(st.get("time")) for st in stops]
+    return dep, mins
+
+
+def service_date(s: Optional[str]) -> Optional[date]:
+    """ISO 日時の営業日（0〜2 時台は前日）。"""
+    dt = _local(s)
+    if dt is None:
+        return None
+    d = dt.date()
+    return d - timedelta(days=1) if dt.hour * 60 + dt.minute < _CUTOFF else d
+
+
+@lru_cache(maxsize=64)
+def is_holiday_date(d: date) -> bool:
+    """土日・祝日（日付ごとに 1 回だけ jpholiday を引く）。"""
+    import jpholiday  # 休日判定は収集側だけ。make_timetable / render の起動では読まない
+    return d.weekday() >= 5 or jpholiday.is_holiday(d)
+
+
+def is_holiday(s: Optional[str]) -> bool:
+    """ISO 日時の営業日が休日か。読めなければ False。"""
+    d = service_date(s)
+    return is_holiday_date(d) if d else False
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+takao35_timetable_YYYYMMDD.json（postprocess_to_json.py）の前日比の差分。
+
+ダイヤはほとんどの日で変わらないが、timeISO / stops[].time には日付が入るので、行をそのまま
+比べると毎日全行が変わって見える。そこで「前の文書の日時を shiftDays 日ずらしたもの」と比べる。
+ずらす日数は route/day_type ごとに行の日付から決める（holiday は次の休日を指すので、
+serviceDate が 1 日進んでも 0 日のことがある）。
+
+差分（delta）の形:
+  {"from": N-1, "to": N, "baseServiceDate", "serviceDate",
+   "routes": {route: {day_type: {"shiftDays": n, "upsert": [行...], "delete": [opId...]}
+                                 または {"replace": [行...]}}}}
+適用の手順（apply_delta と同じ）:
+  1. delta に載っている route/day_type の timeISO / stops[].time を shiftDays 日進める
+     （載っていない route/day_type は前の版のまま）
+  2. delete の opId を消し、upsert の行で opId が同じものを置き換え（無ければ足す）
+     replace があればその route/day_type を丸ごと差し替え（opId が重複していて突き合わせできないとき）
+  3. (hour, minute, opId) で並べ直す
+
+突き合わせは route/day_type ごとに opId → 行 の dict を 1 回作るだけ（行数に対して線形）。
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+Doc = Dict[str, Any]
+Row = Dict[str, Any]
+
+
+@lru_cache(maxsize=256)
+def _shift_head(head: str, days: int) -> str:
+    try:
+        return (date.fromisoformat(head) + timedelta(days=days)).isoformat()
+    except ValueError:
+        return head
+
+
+def shift_iso_date(ts: str, days: int) -> str:
+    """ISO 日時文字列の日付部分（先頭 10 文字）だけを days 日進める。時刻・オフセットはそのまま。"""
+    if not days or not isinstance(ts, str) or len(ts) < 10:
+        return ts
+    return _shift_head(ts[:10], days) + ts[10:]  # 日付の種類は数個なのでキャッシュが効く
+
+
+def _shifter(days: int):
+    return lambda ts: shift_iso_date(ts, days)
+
+
+def shift_row(row: Row, shift) -> Row:
+    out = dict(row)
+    out["timeISO"] = shift(row.get("timeISO"))
+    out["stops"] = [dict(s, time=shift(s.get("time"))) for s in (row.get("stops") or [])]
+    return out
+
+
+def _sort_key(row: Row):
+    return (row["hour"], row["minute"], row["opId"])
+
+
+def _first_date(rows: List[Row]) -> Optional[date]:
+    dates = [r["timeISO"][:10] for r in rows if isinstance(r.get("timeISO"), str)]
+    try:
+        return date.fromisoformat(min(dates)) if dates else None
+    except ValueError:
+        return None
+
+
+def shift_days(old_rows: List[Row], new_rows: List[Row]) -> int:
+    """2 つの行リストの運行日の差（最も早い timeISO の日付どうし）。分からなければ 0。"""
+    a, b = _first_date(old_rows), _first_date(new_rows)
+    return (b - a).days if a and b else 0
+
+
+def diff(base: Doc, doc: Doc) -> Dict[str, Any]:
+    """base → doc の差分（from / to は呼び出し側で入れる）。変化が無い route/day_type は含めない。"""
+    routes: Dict[str, Dict[str, Any]] = {}
+    base_routes = base.get("routes") or {}
+    cur_routes = doc.get("routes") or {}
+    for route in sorted(set(base_routes) | set(cur_routes)):
+        old_days = base_routes.get(route) or {}
+        new_days = cur_routes.get(route) or {}
+        for day_type in sorted(set(old_days) | set(new_days)):
+            old_rows = old_days.get(day_type) or []
+            new_rows = new_days.get(day_type) or []
+            days = shift_days(old_rows, new_rows)
+            shift = _shifter(days)
+            old = {r["opId"]: r for r in old_rows}
+            new = {r["opId"]: r for r in new_rows}
+            if len(old) != len(old_rows) or len(new) != len(new_rows):
+                # opId が重複していて突き合わせられない → 丸ごと
+                if [shift_row(r, shift) for r in old_rows] != new_rows:
+                    routes.setdefault(route, {})[day_type] = {"replace": new_rows}
+                continue
+            upsert = [r for op, r in new.items() if op not in old or shift_row(old[op], shift) != r]
+            delete = sorted(op for op in old if op not in new)
+            if upsert or delete or days:
+                routes.setdefault(route, {})[day_type] = {"shiftDays": days, "upsert": upsert, "delete": delete}
+    return {"baseServiceDate": base["serviceDate"], "serviceDate": doc["serviceDate"], "routes": routes}
+
+
+def apply_delta(base: Doc, delta: Dict[str, Any], generated_at: Optional[str] = None) -> Doc:
+    """base に delta を当てた文書（クライアント側の手順の参照実装）。"""
+    routes: Dict[str, Dict[str, List[Row]]] = {}
+    for route, days in (base.get("routes") or {}).items():
+        for day_type, rows in days.items():
+            routes.setdefault(route, {})[day_type] = rows
+    for route, days in delta["routes"].items():
+        for day_type, change in days.items():
+            if "replace" in change:
+                rows = list(change["replace"])
+            else:
+                shift = _shifter(change["shiftDays"])
+                by_op = {r["opId"]: shift_row(r, shift) for r in routes.get(route, {}).get(day_type, [])}
+                for op in change["delete"]:
+                    by_op.pop(op, None)
+                for r in change["upsert"]:
+                    by_op[r["opId"]] = r
+                rows = sorted(by_op.values(), key=_sort_key)
+            if rows:
+                routes.setdefault(route, {})[day_type] = rows
+            else:
+                routes.get(route, {}).pop(day_type, None)
+    routes = {k: v for k, v in routes.items() if v}
+    return {"generatedAt": generated_at or base.get("generatedAt"), "serviceDate": delta["serviceDate"], "routes": routes}
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公開前の検査。その日の収集 CSV と make_timetable の JSON を見て、おかしければ終了コード 1。
+keio_train_daily.sh はこれが通ったときだけ upload_coreserver.sh を呼ぶ。
+
+  CSV（全 route × day_type をまとめて 1 組の配列にしてから検査）
+    bad_json           stop_stations が JSON として読めない
+    bad_time           time_iso / 停車時刻が YYYY-MM-DDTHH:MM で始まらない
+    no_stops           停車駅が 1 つも無い
+    non_monotonic      停車時刻が前の駅より早い
+    arrival_not_after  最後の停車駅の時刻が出発（time_iso）より後でない
+    missing_terminal   路線の行き先（TERMINALS）が停車駅に無い
+    row_band           本数が前回の CSV から max(ROW_BAND_MIN, ROW_BAND_RATIO × 前回) 以上ずれた
+  乗換 JSON（{ymd}_shinjuku_to_takao3.json / {ymd}_takao3_to_shinjuku.json）
+    null_arrival       到着時刻が無い経路
+    short_transfer     北野での乗換が MIN_TRANSFER_MIN 分未満（既定 0 = 乗換駅の発車が到着より前）
+    arrival_not_after  到着が乗換駅の発車より後でない
+    （乗換 JSON の時刻は make_timetable と同じく営業日の分で比べる。日付は見ない）
+
+行ごとのループは読み込み（CSV / JSON の解釈）だけで、検査はすべて NumPy の配列演算。
+1 日分（千行程度）で数ミリ秒なので、毎回のビルドで回す。
+
+  python validate_dataset.py --date 2025-09-10   → logs/validation/YYYYMMDD.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import dia_revision
+import service_time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # py_code パッケージ用
+from py_code.config import LOG_DIR
+from py_code.output import write_json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = os.path.abspath(os.path.join(HERE, "..", "..", "py_data", "train"))
+PUB_DIR = os.path.join(OUT_DIR, "publish")
+REPORT_DIR = os.path.join(LOG_DIR, "validation")
+
+DAY_TYPES = ("weekday", "holiday")
+# 路線ごとに停車駅に含まれているべき駅（takao_to_up は北野で乗り換えるので北野）
+TERMINALS = {
+    "shinjuku_to_takao_direct": "高尾山口",
+    "shinjuku_to_keiohachioji": "北野",
+    "kitano_to_takao": "高尾山口",
+    "takao_to_up": "北野",
+    "kitano_to_shinjuku": "新宿",
+}
+JOURNEY_FILES = ("shinjuku_to_takao3", "takao3_to_shinjuku")
+MIN_TRANSFER_MIN = int(os.getenv("KEIO_MIN_TRANSFER_MIN", "0"))
+ROW_BAND_MIN = int(os.getenv("KEIO_ROW_BAND_MIN", "5"))
+ROW_BAND_RATIO = float(os.getenv("KEIO_ROW_BAND_RATIO", "0.2"))
+EXAMPLES = 3  # 報告に載せる例の数
+
+
+def to_minutes(times: List[Optional[str]]) -> np.ndarray:
+    """ISO 文字列の先頭 16 文字（YYYY-MM-DDTHH:MM）を datetime64[m] に。形が違うものは NaT。"""
+    heads = [t[:16] if isinstance(t, str) and len(t) >= 16 and t[10] == "T" else "NaT" for t in times]
+    try:
+        return np.array(heads, dtype="datetime64[m]")
+    except ValueError:  # 日付として不正なもの（2025-13-01 など）が混じったときだけ 1 件ずつ
+        out = []
+        for h in heads:
+            try:
+                out.append(np.datetime64(h, "m"))
+            except ValueError:
+                out.append(np.datetime64("NaT"))
+        return np.array(out, dtype="datetime64[m]")
+
+
+def to_service_minutes(times: List[Optional[str]]) -> np.ndarray:
+    """時刻（ISO でも "HH:MM" でも）→ 営業日の分（service_time.parse）。読めないものは -1。
+    乗換 JSON は make_timetable と同じく時刻だけで組まれている（日付は route ごとにばらばら）ので、
+    日付付きの datetime64 ではなくこちらで比べる。"""
+    return np.array([-1 if m is None else m for m in map(service_time.parse, times)], dtype=np.int32)
+
+
+class Dataset:
+    """1 日分の CSV を、行（row_*）と停車駅（stop_*）の平らな配列にしたもの。"""
+
+    def __init__(self, out_dir: str, ymd: str):
+        self.files: List[str] = []          # "route[day_type]"
+        self.counts: Dict[str, int] = {}
+        row_file, op_ids, dep, bad_json, terminal = [], [], [], [], []
+        stop_row, stop_station, stop_time = [], [], []
+        for day_type in DAY_TYPES:
+            for route in dia_revision.ROUTE_KEYS:
+                path = os.path.join(out_dir, f"{ymd}_{day_type}_{route}.csv")
+                if not os.path.exists(path):
+                    continue
+                fi = len(self.files)
+                self.files.append(f"{route}[{day_type}]")
+                n = 0
+                with open(path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        ri = len(row_file)
+                        row_file.append(fi)
+                        op_ids.append(row.get("operation_id") or "")
+                        dep.append(row.get("time_iso"))
+                        terminal.append(TERMINALS.get(route))
+                        try:
+                            stops = json.loads(row.get("stop_stations") or "[]")
+                        except ValueError:
+                            stops = []
+                            bad_json.append(ri)
+                        for s in stops if isinstance(stops, list) else []:
+                            if isinstance(s, dict):
+                                stop_row.append(ri)
+                                stop_station.append(s.get("station") or "")
+                                stop_time.append(s.get("time"))
+                        n += 1
+                self.counts[self.files[fi]] = n
+        self.row_file = np.array(row_file, dtype=np.int32)
+        self.op_ids = np.array(op_ids, dtype=str)
+        self.dep = to_minutes(dep)
+        self.bad_json = np.array(bad_json, dtype=np.int32)
+        self.terminal = np.array([t or "" for t in terminal], dtype=str)
+        self.stop_row = np.array(stop_row, dtype=np.int32)
+        self.stop_station = np.array(stop_station, dtype=str)
+        self.stop_time = to_minutes(stop_time)
+
+    def __len__(self) -> int:
+        return len(self.row_file)
+
+
+class Report:
+    def __init__(self):
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.rows = 0
+
+    def add(self, check: str, bad_rows: np.ndarray, ds: Dataset) -> None:
+        """bad_rows（行番号）を route[day_type] ごとに数えて記録。0 件でも検査したことは残す。"""
+        bad_rows = np.unique(bad_rows)
+        per_file = np.bincount(ds.row_file[bad_rows], minlength=len(ds.files)) if len(bad_rows) else []
+        self.put(check, len(bad_rows),
+                 {ds.files[i]: int(c) for i, c in enumerate(per_file) if c},
+                 [str(op) for op in ds.op_ids[bad_rows[:EXAMPLES]]])
+
+    def put(self, check: str, count: int, where: Optional[Dict[str, int]] = None, examples: Optional[list] = None) -> None:
+        prev = self.checks.get(check)
+        if prev:  # 同じ名前の検査（CSV と乗換 JSON の arrival_not_after）は足し合わせる
+            count += prev["count"]
+            where = {**prev["where"], **(where or {})}
+            examples = (prev["examples"] + (examples or []))[:EXAMPLES]
+        self.checks[check] = {"count": int(count), "where": where or {}, "examples": examples or []}
+
+    @property
+    def failed(self) -> List[str]:
+        return [name for name, c in self.checks.items() if c["count"]]
+
+
+# ---------------- CSV ----------------
+def check_rows(ds: Dataset, rep: Report) -> None:
+    n = len(ds)
+    rep.add("bad_json", ds.bad_json, ds)
+    bad_stop_time = np.isnat(ds.stop_time)
+    rep.add("bad_time", np.concatenate([np.flatnonzero(np.isnat(ds.dep)), ds.stop_row[bad_stop_time]]), ds)
+
+    n_stops = np.bincount(ds.stop_row, minlength=n)
+    rep.add("no_stops", np.flatnonzero(n_stops == 0), ds)
+
+    # 同じ行の隣り合う停車駅どうしで時刻が戻っていないか
+    same_row = ds.stop_row[1:] == ds.stop_row[:-1]
+    back = ds.stop_time[1:] < ds.stop_time[:-1]  # NaT との比較は False（bad_time で数える）
+    rep.add("non_monotonic", ds.stop_row[1:][same_row & back], ds)
+
+    # 各行の最後の停車駅（stop_row は行順に並んでいる）
+    has = n_stops > 0
+    last = np.cumsum(n_stops)[has] - 1
+    rows = np.flatnonzero(has)
+    rep.add("arrival_not_after", rows[~(ds.stop_time[last] > ds.dep[rows])
+                                      & ~np.isnat(ds.stop_time[last]) & ~np.isnat(ds.dep[rows])], ds)
+
+    needs = ds.terminal != ""
+    hit = ds.stop_station == ds.terminal[ds.stop_row]
+    has_terminal = np.bincount(ds.stop_row[hit], minlength=n) > 0
+    rep.add("missing_terminal", np.flatnonzero(needs & ~has_terminal), ds)
+
+
+def check_row_band(ds: Dataset, rep: Report, out_dir: str, ymd: str) -> None:
+    """本数を前回の CSV と比べる（前回が無い route/day_type は見ない）。"""
+    names, cur, prev = [], [], []
+    for day_type in DAY_TYPES:
+        for route in dia_revision.ROUTE_KEYS:
+            prev_path = dia_revision.previous_csv(out_dir, ymd, day_type, f"{route}.csv")
+            if prev_path is None:
+                continue
+            with open(prev_path, newline="", encoding="utf-8") as f:
+                n_prev = sum(1 for _ in csv.DictReader(f))
+            name = f"{route}[{day_type}]"
+            names.append(name)
+            cur.append(ds.counts.get(name, 0))
+            prev.append(n_prev)
+    cur_a, prev_a = np.array(cur, dtype=np.int64), np.array(prev, dtype=np.int64)
+    out = np.abs(cur_a - prev_a) > np.maximum(ROW_BAND_MIN, ROW_BAND_RATIO * prev_a)
+    idx = np.flatnonzero(out)
+    rep.put("row_band", len(idx), {names[i]: int(cur_a[i] - prev_a[i]) for i in idx},
+            [f"{names[i]}: {prev_a[i]} -> {cur_a[i]}" for i in idx[:EXAMPLES]])
+
+
+# ---------------- 乗換 JSON ----------------
+def check_journeys(rep: Report, pub_dir: str, ymd: str) -> None:
+    for name in JOURNEY_FILES:
+        path = os.path.join(pub_dir, f"{ymd}_{name}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                routes = json.load(f)
+        except (OSError, ValueError) as e:
+            rep.put("bad_json", 1, {name: 1}, [f"{os.path.basename(path)}: {type(e).__name__}"])
+            continue
+        origin = [r["origin_station_info"].get("departuret_time") for r in routes]
+        arrival = [r["terminal_station_info"].get("arrival_time") for r in routes]
+        tr = [(i, t) for i, r in enumerate(routes) for t in (r.get("transits") or [])[:1]]
+        tr_idx = np.array([i for i, _ in tr], dtype=np.int64)
+        tr_arr = to_service_minutes([t.get("arrival_time") for _, t in tr])
+        tr_dep = to_service_minutes([t.get("departuret_time") for _, t in tr])
+        arr = to_service_minutes(arrival)
+
+        null_arr = np.flatnonzero(np.array([a is None for a in arrival], dtype=bool))
+        ok = (tr_arr >= 0) & (tr_dep >= 0)  # 読めない時刻は bad_time / null_arrival の側で数える
+        short = ok & ((tr_dep - tr_arr) < MIN_TRANSFER_MIN)
+        backwards = (arr[tr_idx] >= 0) & (tr_dep >= 0) & ~(arr[tr_idx] > tr_dep)
+
+        def where(idx):
+            return {name: int(len(idx))} if len(idx) else {}
+
+        def examples(idx):
+            return [f"{origin[i]} {routes[i].get('day_type')}" for i in idx[:EXAMPLES]]
+
+        rep.put("null_arrival", len(null_arr), where(null_arr), examples(null_arr))
+        rep.put("short_transfer", int(short.sum()), where(tr_idx[short]), examples(tr_idx[short]))
+        rep.put("arrival_not_after", int(backwards.sum()), where(tr_idx[backwards]), examples(tr_idx[backwards]))
+
+
+def validate(ymd: str, out_dir: str = OUT_DIR, pub_dir: str = PUB_DIR) -> Report:
+    rep = Report()
+    ds = Dataset(out_dir, ymd)
+    check_rows(ds, rep)
+    check_row_band(ds, rep, out_dir, ymd)
+    check_journeys(rep, pub_dir, ymd)
+    rep.rows = len(ds)
+    return rep
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="validate the collected timetable before publishing")
+    ap.add_argument("--date", default=None, help="YYYY-MM-DD（既定: 今日）")
+    ap.add_argument("--out-dir", default=OUT_DIR, help="収集 CSV の場所")
+    ap.add_argument("--pub-dir", default=PUB_DIR, help="make_timetable の JSON の場所")
+    ap.add_argument("--report-dir", default=REPORT_DIR)
+    args = ap.parse_args(argv)
+
+    ymd = (args.date or datetime.now().strftime("%Y-%m-%d")).replace("-", "")
+    t0 = time.perf_counter()
+    rep = validate(ymd, args.out_dir, args.pub_dir)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    failed = rep.failed
+    if rep.rows == 0:
+        failed.append("empty")
+    for name in failed:
+        c = rep.checks.get(name, {"count": 0, "where": {}, "examples": []})
+        print(f"  FAIL {name}: {c['count']} {c['where']} e.g. {c['examples']}")
+    path = os.path.join(args.report_dir, f"{ymd}.json")
+    write_json(path, {"date": ymd, "ok": not failed, "failed": failed, "rows": rep.rows,
+                      "elapsed_ms": round(elapsed_ms, 2), "checks": rep.checks}, indent=1)
+    status = "FAILED" if failed else "OK"
+    print(f"validation {status}: {len(rep.checks)} checks, {rep.rows} rows, {elapsed_ms:.1f} ms -> {path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
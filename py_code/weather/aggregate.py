@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# py_code/weather/aggregate.py
+"""
+天気の各ソースを並行に取り、1 つの takao_current.json にまとめる。
+
+  model     Open-Meteo（全地点 1 リクエスト）… 空模様・風・降水量、points/・takao_* の HTML/JSON
+  amedas    気象庁 AMeDAS 44112（八王子）… 実測の気温
+  nowcast   Yahoo! YOLP 降水強度 … 1 時間以内の降り出し / 止み
+  forecast  気象庁 VPFD（府県天気予報）… 明日・明後日
+
+- ソースごとに締め切り（DEADLINES 秒、全体の開始から数える）を持ち、間に合わなければ待たずに進む。
+  全体の所要時間は「一番遅いソース（か締め切り）」で、合計にはならない。
+- 取れたソースは cache/<名前>.json に保存し、失敗・締め切り超過時は MAX_AGE 以内ならそれを使う（stale）。
+- takao_current.json は従来のキー（title / observed_at / coord / source / current）をそのまま持ち、
+  current.temperature_c だけ AMeDAS の実測で置き換える。各ソースの状態は sources に入る。
+  generated_at / sources 以外が前回と同じなら書き直さない。
+
+  python aggregate.py [--profile]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+from py_code.profiling import profiled, span
+from py_code.output import changed, write_all, write_json
+from py_code.weather import forecast_archive, jma, open_meteo, weather
+from py_code.weather.amedas_buffer import ObservationBuffer
+from py_code.weather.open_meteo import JST, OUT_DIR, POINTS
+
+CACHE_DIR = Path(os.environ.get("WEATHER_CACHE_DIR", OUT_DIR / "cache"))
+OUT_CURRENT = OUT_DIR / f"{open_meteo.LEGACY_PREFIX}_current.json"
+VOLATILE = ("generated_at", "sources")  # 実行ごとに変わるキー（生成時刻・ソースごとの所要時間）。変化判定に使わない
+
+# 全体の開始からの締め切り（秒）
+DEADLINES = {"model": 25.0, "amedas": 30.0, "nowcast": 12.0, "forecast": 25.0}
+# キャッシュで代用してよい古さ
+MAX_AGE = {
+    "model": timedelta(hours=3),
+    "amedas": timedelta(hours=1),
+    "nowcast": timedelta(minutes=20),
+    "forecast": timedelta(hours=24),
+}
+
+FETCHERS: Dict[str, Callable[[], Any]] = {
+    "model": lambda: open_meteo.fetch_points(POINTS),
+    "amedas": jma.main_current,
+    "nowcast": lambda: weather.fetch_nowcast(POINTS),
+    "forecast": jma.get_forecast,
+}
+
+
+# ---------------- cache ----------------
+def _cache_path(name: str) -> Path:
+    return CACHE_DIR / f"{name}.json"
+
+def save_cache(name: str, data: Any) -> None:
+    write_json(_cache_path(name), {"fetched_at": datetime.now(JST).isoformat(timespec="seconds"), "data": data})
+
+def load_cache(name: str, max_age: timedelta) -> Optional[Tuple[Any, str]]:
+    """(data, fetched_at)。無い・壊れている・古すぎるときは None。"""
+    try:
+        doc = json.loads(_cache_path(name).read_text(encoding="utf-8"))
+        fetched = datetime.fromisoformat(doc["fetched_at"])
+    except (OSError, ValueError, KeyError):
+        return None
+    if datetime.now(JST) - fetched > max_age:
+        return None
+    return doc["data"], doc["fetched_at"]
+
+
+# ---------------- gather ----------------
+def gather(fetchers: Optional[Dict[str, Callable[[], Any]]] = None,
+           deadlines: Optional[Dict[str, float]] = None) -> Tuple[Dict[str, Any], Dict[str, Dict]]:
+    """
+    全ソースを別スレッドで同時に走らせ、締め切りまで待つ。
+    戻り値は ({名前: データ or None}, {名前: {status, elapsed_s, fetched_at, error}})。
+    status: ok / stale（キャッシュで代用）/ timeout / error
+    締め切りを過ぎたスレッドは daemon のまま置いていく（各 fetch 自体に HTTP タイムアウトがある）。
+    """
+    fetchers = FETCHERS if fetchers is None else fetchers
+    deadlines = DEADLINES if deadlines is None else deadlines
+    results: Dict[str, Tuple[str, Any, float]] = {}
+
+    def run(name: str, fn: Callable[[], Any]) -> None:
+        t = time.monotonic()
+        try:
+            results[name] = ("ok", fn(), time.monotonic() - t)
+        except Exception as e:  # ソース 1 つの失敗で全体を止めない
+            results[name] = ("error", e, time.monotonic() - t)
+
+    t0 = time.monotonic()
+    threads = {name: threading.Thread(target=run, args=(name, fn), name=f"weather-{name}", daemon=True)
+               for name, fn in fetchers.items()}
+    for th in threads.values():
+        th.start()
+    for name in sorted(threads, key=lambda n: deadlines.get(n, 30.0)):
+        threads[name].join(max(0.0, t0 + deadlines.get(name, 30.0) - time.monotonic()))
+
+    data: Dict[str, Any] = {}
+    status: Dict[str, Dict] = {}
+    now_iso = datetime.now(JST).isoformat(timespec="seconds")
+    for name in fetchers:
+        st, val, elapsed = results.get(name, ("timeout", None, time.monotonic() - t0))
+        if st == "ok":
+            try:
+                save_cache(name, val)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"[warn] cache {name}: {e}")
+            data[name] = val
+            status[name] = {"status": "ok", "elapsed_s": round(elapsed, 3), "fetched_at": now_iso}
+            continue
+        err = f"{type(val).__name__}: {val}" if st == "error" else f"no response within {deadlines.get(name, 30.0)}s"
+        cached = load_cache(name, MAX_AGE.get(name, timedelta(hours=1)))
+        if cached is not None:
+            data[name] = cached[0]
+            status[name] = {"status": "stale", "elapsed_s": round(elapsed, 3), "fetched_at": cached[1],
+                            "error": err, "reason": st}
+        else:
+            data[name] = None
+            status[name] = {"status": st, "elapsed_s": round(elapsed, 3), "fetched_at": None, "error": err}
+        print(f"[warn] {name}: {status[name]['status']} ({err})")
+    print(f"gather: {time.monotonic() - t0:.2f}s "
+          + " ".join(f"{n}={s['status']}/{s['elapsed_s']}s" for n, s in status.items()))
+    return data, status
+
+
+# ---------------- merge ----------------
+def merge(model_current: Optional[Dict], amedas: Optional[Dict], nowcast: Optional[Dict],
+          forecast: Optional[Dict], status: Dict[str, Dict]) -> Dict:
+    """各ソースを 1 つの現在状況ドキュメントにまとめる。"""
+    doc = dict(model_current) if model_current else {
+        "title": "高尾山付近の天気",
+        "observed_at": None,
+        "coord": {"lat": open_meteo.LAT, "lon": open_meteo.LON},
+        "current": {},
+    }
+    cur = dict(doc.get("current") or {})
+    cur["temperature_source"] = "open-meteo:jma" if cur.get("temperature_c") is not None else None
+    if amedas and amedas.get("temperature_c") is not None:
+        cur["model_temperature_c"] = cur.get("temperature_c")
+        cur["temperature_c"] = amedas["temperature_c"]
+        cur["temperature_source"] = "amedas:44112"
+        doc["observed_at"] = amedas.get("latest_source_time") or doc.get("observed_at")
+    doc["current"] = cur
+    doc["source"] = "aggregate:" + "+".join(n for n, s in status.items() if s["status"] in ("ok", "stale"))
+
+    doc["observation"] = amedas
+    default = (nowcast or {}).get(POINTS[0]["key"])
+    doc["nowcast"] = weather.rain_outlook(default["series"]) if default else None
+    doc["forecast"] = forecast or None
+    doc["sources"] = status
+    doc["generated_at"] = datetime.now(JST).isoformat(timespec="seconds")
+    return doc
+
+
+def content_key(doc: Dict[str, Any]) -> str:
+    return json.dumps({k: v for k, v in doc.items() if k not in VOLATILE}, ensure_ascii=False, sort_keys=True)
+
+
+def written_key(path: Path = OUT_CURRENT) -> Optional[str]:
+    """いま置いてある takao_current.json の content_key。無い・読めなければ None。"""
+    try:
+        doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return content_key(doc) if isinstance(doc, dict) else None
+
+
+def main() -> int:
+    with span("gather"):
+        data, status = gather()
+
+    # 精度検証用の追記（キャッシュで代用した回は足さない）
+    try:
+        if status["model"]["status"] == "ok":
+            forecast_archive.append_forecasts(data["model"], POINTS)
+        if status["amedas"]["status"] == "ok":
+            forecast_archive.append_observations(ObservationBuffer.load(jma.BUFFER_PATH, jma.ELEMENTS))
+    except OSError as e:
+        print(f"[warn] forecast archive: {e}")
+
+    model_current = None
+    n_changed = 0
+    if data.get("model"):
+        with span("build"):
+            results = open_meteo.build_point_outputs(data["model"], POINTS)
+        with span("write"):
+            outputs = open_meteo.output_files(POINTS, results)
+            outputs.pop(OUT_CURRENT, None)  # takao_current.json は下で統合版を書く
+            n_changed = changed(write_all(outputs))
+        model_current = json.loads(results[0][0]["current.json"])
+
+    doc = merge(model_current, data.get("amedas"), data.get("nowcast"), data.get("forecast"), status)
+    # VOLATILE だけの違いでは書き直さない（.gz も publish.py の再送も起こさない。daemon と同じ判定）
+    if content_key(doc) != written_key():
+        n_changed += write_json(OUT_CURRENT, doc)
+
+    ok = sum(s["status"] == "ok" for s in status.values())
+    print(f"更新OK: {OUT_CURRENT.name} ({ok}/{len(status)} sources live, {n_changed} files changed)")
+    return 0 if any(s["status"] in ("ok", "stale") for s in status.values()) else 1
+
+
+if __name__ == "__main__":
+    with profiled("weather_aggregate"):
+        rc = main()
+    sys.exit(rc)
@@ -0,0 +1,119 @@
+# py_code/weather/amedas_buffer.py
+"""
+AMeDAS 地点観測（10 分値）の直近 7 日分を要素ごとに保持するリングバッファ。
+
+- 状態は JSON 1 ファイル（既定 py_data/weather/amedas_<地点>_buffer.json）に保存し、実行をまたいで引き継ぐ。
+- point JSON は 3 時間ブロック（YYYYMMDD_HH.json, HH=00,03,...,21）単位なので、
+  前回取り込んだ最終時刻の続きから最新ブロックまでだけを取りに行けばよい（blocks_to_fetch）。
+- window() で 24h（10 分値）/ 7d（1 時間代表値）の系列を取り出して傾向表示に使う。
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from py_code.output import write_json
+
+TS_FMT = "%Y%m%d%H%M%S"
+BLOCK_HOURS = 3
+HORIZON = timedelta(days=7)
+
+
+def block_of(dt: datetime) -> str:
+    """datetime → その時刻を含む 3 時間ブロック名 "YYYYMMDD_HH"。"""
+    return f"{dt.strftime('%Y%m%d')}_{(dt.hour // BLOCK_HOURS) * BLOCK_HOURS:02d}"
+
+
+def _block_start(block: str) -> datetime:
+    return datetime.strptime(block, "%Y%m%d_%H")
+
+
+class ObservationBuffer:
+    def __init__(self, path: str, elements: Iterable[str], *, horizon: timedelta = HORIZON):
+        self.path = path
+        self.elements = tuple(elements)
+        self.horizon = horizon
+        self.series: Dict[str, Dict[str, object]] = {el: {} for el in self.elements}  # 要素 → {ts: 値}
+        self.last_ts: Optional[str] = None
+
+    # ---- 永続化 ----
+    @classmethod
+    def load(cls, path: str, elements: Iterable[str], **kw) -> "ObservationBuffer":
+        buf = cls(path, elements, **kw)
+        try:
+            with open(path, encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return buf
+        buf.last_ts = doc.get("last_ts")
+        for el, pairs in (doc.get("series") or {}).items():
+            if el in buf.series:
+                buf.series[el] = {ts: v for ts, v in pairs}
+        return buf
+
+    def save(self) -> None:
+        doc = {
+            "last_ts": self.last_ts,
+            "horizon_hours": int(self.horizon.total_seconds() // 3600),
+            "series": {el: sorted(s.items()) for el, s in self.series.items()},
+        }
+        write_json(self.path, doc)
+
+    # ---- 更新 ----
+    def blocks_to_fetch(self, latest: datetime) -> List[str]:
+        """
+        前回の最終時刻の次の 10 分を含むブロック〜最新ブロック。初回は 7 日分。
+        前回の最終ブロックが途中までだった場合はそのブロックから取り直す。
+        """
+        latest = latest.replace(tzinfo=None)
+        oldest = latest - self.horizon
+        start = (datetime.strptime(self.last_ts, TS_FMT) + timedelta(minutes=10)) if self.last_ts else oldest
+        start = max(start, oldest)
+        cur = _block_start(block_of(start))
+        end = _block_start(block_of(latest))
+        out = []
+        while cur <= end:
+            out.append(block_of(cur))
+            cur += timedelta(hours=BLOCK_HOURS)
+        return out
+
+    def merge(self, point: Dict[str, Dict]) -> int:
+        """point JSON（{ts: {要素: [値, 品質]}}）を取り込む。追加・更新した値の数を返す。"""
+        n = 0
+        for ts, node in point.items():
+            if not isinstance(node, dict):
+                continue
+            for el in self.elements:
+                arr = node.get(el)
+                if isinstance(arr, list) and arr and arr[0] is not None:
+                    s = self.series[el]
+                    if s.get(ts) != arr[0]:
+                        s[ts] = arr[0]
+                        n += 1
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+        self._trim()
+        return n
+
+    def _trim(self) -> None:
+        if not self.last_ts:
+            return
+        cutoff = (datetime.strptime(self.last_ts, TS_FMT) - self.horizon).strftime(TS_FMT)
+        for el, s in self.series.items():
+            old = [ts for ts in s if ts <= cutoff]
+            for ts in old:
+                del s[ts]
+
+    # ---- 参照 ----
+    def window(self, element: str, hours: int, *, step_minutes: int = 10) -> List[Tuple[str, object]]:
+        """直近 hours 時間の (ts, 値)。step_minutes=60 なら毎正時の値だけに間引く。"""
+        if not self.last_ts:
+            return []
+        cutoff = (datetime.strptime(self.last_ts, TS_FMT) - timedelta(hours=hours)).strftime(TS_FMT)
+        out = []
+        for ts, v in sorted(self.series.get(element, {}).items()):
+            if ts <= cutoff:
+                continue
+            if step_minutes >= 60 and ts[10:12] != "00":
+                continue
+            out.append((ts, v))
+        return out
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# py_code/weather/daemon.py
+"""
+天気の常駐プロセス。cron で毎回 import し直す代わりに、各ソースを更新間隔に合わせて回す。
+
+  amedas    10 分ごと。latest_time.txt が進んでいなければ point JSON は取らない
+  nowcast   10 分ごと（YOLP の 10 分値）
+  forecast  10 分ごとに regular.xml を条件付き GET。VPFD が変わったときだけ取得・解析
+  model     1 時間ごと（Open-Meteo の更新間隔）
+
+- HTTP は 1 つの requests.Session を全ソースで使い回す（jma / open_meteo / weather の HTTP を差し替え）。
+- AMeDAS のバッファ、VPFD の状態、各ソースの最新データはメモリに持つ（落ちても次回はファイルから再開）。
+- 出力は前回書いた中身と同じなら書かない。takao_current.json は generated_at / sources 以外が変わったときだけ。
+- 失敗したソースは RETRY_SEC 後に取り直し、それまでは最後に取れたデータを stale として使う。
+
+  python daemon.py [--once] [--profile]
+
+cron の weather.sh は、このプロセスが動いている（weather_daemon.lock が取られている）間は生成を飛ばして
+アップロードだけ行う。
+"""
+import argparse
+import json
+import signal
+import sys
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+from py_code.output import changed, dumps, write_all
+from py_code.profiling import profiled, span
+from py_code.runtime_guard import job_lock, JobLocked
+from py_code.weather import aggregate, forecast_archive, jma, open_meteo, weather
+from py_code.weather.amedas_buffer import ObservationBuffer
+from py_code.weather.open_meteo import JST, POINTS
+
+CADENCE = {"amedas": 600, "nowcast": 600, "forecast": 600, "model": 3600}  # 秒
+RETRY_SEC = 120
+
+
+class WeatherDaemon:
+    def __init__(self):
+        self.session = requests.Session()
+        for mod in (jma, open_meteo, weather):
+            mod.HTTP = self.session
+        self.buf = ObservationBuffer.load(jma.BUFFER_PATH, jma.ELEMENTS)
+        self.latest_ts: Optional[str] = None
+        self.data: Dict[str, Any] = {name: None for name in CADENCE}
+        self.status: Dict[str, Dict] = {}
+        self.model_current: Optional[Dict] = None
+        self.next_due: Dict[str, float] = {name: 0.0 for name in CADENCE}
+        self._current_key: Optional[str] = aggregate.written_key()  # 起動直後も同じ中身なら書かない
+        self.steps: Dict[str, Callable[[], bool]] = {
+            "amedas": self.step_amedas,
+            "nowcast": self.step_nowcast,
+            "forecast": self.step_forecast,
+            "model": self.step_model,
+        }
+
+    # ---------------- 出力 ----------------
+    def write(self, outputs: Dict[Any, str]) -> int:
+        """中身が変わったものだけ書く（py_code.output）。書いた数を返す。"""
+        return changed(write_all(outputs))
+
+    def write_current(self) -> bool:
+        doc = aggregate.merge(self.model_current, self.data["amedas"], self.data["nowcast"],
+                              self.data["forecast"], self.status)
+        key = aggregate.content_key(doc)  # generated_at / sources の違いでは書かない
+        if key == self._current_key:
+            return False
+        self._current_key = key
+        self.write({aggregate.OUT_CURRENT: dumps(doc)})
+        return True
+
+    # ---------------- ソースごと（データが変わったら True） ----------------
+    def step_amedas(self) -> bool:
+        latest = jma.get_latest_time()
+        if latest[1] == self.latest_ts:
+            return False
+        obs, outputs, self.buf = jma.collect_current(self.buf, latest)
+        self.latest_ts = latest[1]
+        n = self.write(outputs)
+        forecast_archive.append_observations(self.buf)
+        print(f"amedas: {self.latest_ts} ({n} files)")
+        changed = obs != self.data["amedas"]
+        self.data["amedas"] = obs
+        return changed
+
+    def step_nowcast(self) -> bool:
+        nowcast = weather.fetch_nowcast(POINTS)
+        changed = nowcast != self.data["nowcast"]
+        self.data["nowcast"] = nowcast
+        return changed
+
+    def step_forecast(self) -> bool:
+        fc = jma.get_forecast()  # 304 / 同じエントリならキャッシュ（メモリ）を返すだけ
+        changed = fc != self.data["forecast"]
+        self.data["forecast"] = fc
+        return changed
+
+    def step_model(self) -> bool:
+        datas = open_meteo.fetch_points(POINTS)
+        results = open_meteo.build_point_outputs(datas, POINTS)
+        outputs = open_meteo.output_files(POINTS, results)
+        outputs.pop(aggregate.OUT_CURRENT, None)  # takao_current.json は write_current が統合版を書く
+        n = self.write(outputs)
+        forecast_archive.append_forecasts(datas, POINTS)
+        print(f"model: {results[0][1]} ({n} files)")
+        self.data["model"] = datas
+        current = json.loads(results[0][0]["current.json"])
+        changed = current != self.model_current
+        self.model_current = current
+        return changed
+
+    # ---------------- スケジューラ ----------------
+    def run_due(self, now: Optional[float] = None) -> bool:
+        """期限の来たソースを回す。どれかのデータが変わったら takao_current.json を作り直す。"""
+        now = time.monotonic() if now is None else now
+        changed = False
+        for name, step in self.steps.items():
+            if self.next_due[name] > now:
+                continue
+            t0 = time.monotonic()
+            try:
+                with span(name):
+                    changed |= step()
+                self.status[name] = {"status": "ok", "elapsed_s": round(time.monotonic() - t0, 3),
+                                     "fetched_at": datetime.now(JST).isoformat(timespec="seconds")}
+                self.next_due[name] = now + CADENCE[name]
+            except Exception as e:  # 1 ソースの失敗で常駐を止めない
+                prev = self.status.get(name) or {}
+                self.status[name] = {"status": "stale" if self.data[name] is not None else "error",
+                                     "elapsed_s": round(time.monotonic() - t0, 3),
+                                     "fetched_at": prev.get("fetched_at"), "error": f"{type(e).__name__}: {e}"}
+                self.next_due[name] = now + min(RETRY_SEC, CADENCE[name])
+                print(f"[warn] {name}: {e}")
+                traceback.print_exc()
+        if changed:
+            self.write_current()
+        return changed
+
+    def run(self) -> None:
+        while True:
+            self.run_due()
+            wait = min(self.next_due.values()) - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="weather daemon")
+    ap.add_argument("--once", action="store_true", help="run every source once and exit")
+    args = ap.parse_args(argv)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    d = WeatherDaemon()
+    if args.once:
+        d.run_due()
+        print("sources:", {n: s["status"] for n, s in d.status.items()})
+        return 0
+    d.run()
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        with job_lock("weather_daemon"), profiled("weather_daemon"):
+            sys.exit(main())
+    except JobLocked as e:
+        print("weather daemon: SKIP", e)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# py_code/weather/forecast_archive.py
+"""
+Open-Meteo（JMA モデル）の毎時予報を追記専用で残し、AMeDAS 44112 の実測と突き合わせて精度を見る。
+
+保存形式（ARCHIVE_DIR、既定 py_data/weather/archive/）
+  forecast_<地点>_L<先行時間数>.bin   1 発表 = 1 レコードの固定長バイナリ（FC_DTYPE）
+      issue   発表時刻（JST の毎正時、epoch 時間 = epoch 秒 // 3600）
+      temp / precip / pop   先行 0..LEADS-1 時間の値（float32、欠測 nan）
+  obs_44112.bin                      毎正時の実測 1 件 = 1 レコード（OBS_DTYPE）
+どちらも追記だけで書き換えない。読むときは np.fromfile 一発で (発表数, 先行時間) の配列になり、
+1 年分（8760 発表 × 72 時間）でも数 MB・読み込みと採点で 1 秒かからない。
+
+  python -m py_code.weather.forecast_archive score [--point takao] [--days 365] [--wet 0.5] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+
+JST = timezone(timedelta(hours=9))
+STN = "44112"
+LEADS = 72
+ARCHIVE_DIR = Path(os.environ.get("FORECAST_ARCHIVE_DIR", "/home/masuday/projects/takao35/py_data/weather/archive"))
+WET_MM = 0.5  # 1 時間降水量がこれ以上で「降った」
+
+FC_DTYPE = np.dtype([("issue", "<i8"), ("temp", "<f4", (LEADS,)),
+                     ("precip", "<f4", (LEADS,)), ("pop", "<f4", (LEADS,))])
+OBS_DTYPE = np.dtype([("hour", "<i8"), ("temp", "<f4"), ("precip1h", "<f4")])
+
+
+def forecast_path(key: str) -> Path:
+    return ARCHIVE_DIR / f"forecast_{key}_L{LEADS}.bin"
+
+def obs_path() -> Path:
+    return ARCHIVE_DIR / f"obs_{STN}.bin"
+
+def epoch_hour(dt: datetime) -> int:
+    return int(dt.timestamp()) // 3600
+
+def hour_to_dt(h: int) -> datetime:
+    return datetime.fromtimestamp(int(h) * 3600, JST)
+
+
+# ---------------- 追記 ----------------
+def _last_key(path: Path, dtype: np.dtype, field: str) -> Optional[int]:
+    """ファイル末尾 1 レコードのキー（発表時刻 / 観測時刻）。空なら None。"""
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return None
+    if size < dtype.itemsize:
+        return None
+    with open(path, "rb") as f:
+        f.seek((size // dtype.itemsize - 1) * dtype.itemsize)
+        return int(np.frombuffer(f.read(dtype.itemsize), dtype=dtype)[field][0])
+
+def _append(path: Path, recs: np.ndarray) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        f.write(recs.tobytes())
+
+def forecast_record(data: Dict[str, Any], now: Optional[datetime] = None) -> Optional[np.ndarray]:
+    """Open-Meteo 1 地点分の応答 → 1 レコード。発表時刻は「今」に最も近い毎正時。"""
+    from py_code.weather.open_meteo import index_from_now, parse_hour_to_naive_jst
+    hourly = data.get("hourly") or {}
+    times = hourly.get("time") or []
+    if not times:
+        return None
+    base = index_from_now(times, now)
+    t = parse_hour_to_naive_jst(times[base])
+    if t is None:
+        return None
+    rec = np.zeros(1, dtype=FC_DTYPE)
+    rec["issue"] = epoch_hour(t.replace(tzinfo=JST))
+    for field, var in (("temp", "temperature_2m"), ("precip", "precipitation"), ("pop", "precipitation_probability")):
+        vals = np.asarray((hourly.get(var) or [])[base:base + LEADS], dtype=float)
+        row = np.full(LEADS, np.nan, dtype="<f4")
+        row[:len(vals)] = vals
+        rec[field][0] = row
+    return rec
+
+def append_forecasts(datas: List[Dict[str, Any]], points: List[Dict[str, Any]],
+                     now: Optional[datetime] = None) -> int:
+    """地点ごとに 1 レコード追記。同じ発表時刻が既にあれば（1 時間に複数回走ったとき）足さない。"""
+    n = 0
+    for point, data in zip(points, datas):
+        rec = forecast_record(data, now)
+        if rec is None:
+            continue
+        path = forecast_path(point["key"])
+        last = _last_key(path, FC_DTYPE, "issue")
+        if last is not None and int(rec["issue"][0]) <= last:
+            continue
+        _append(path, rec)
+        n += 1
+    return n
+
+def append_observations(buf) -> int:
+    """AMeDAS バッファ（ObservationBuffer）の毎正時の値のうち、未追記のものを足す。"""
+    temp = buf.series.get("temp") or {}
+    rain = buf.series.get("precipitation1h") or {}
+    last = _last_key(obs_path(), OBS_DTYPE, "hour")
+    rows = []
+    for ts in sorted(set(temp) | set(rain)):
+        if ts[10:14] != "0000":
+            continue
+        h = epoch_hour(datetime.strptime(ts, "%Y%m%d%H%M%S").replace(tzinfo=JST))
+        if last is not None and h <= last:
+            continue
+        t, r = temp.get(ts), rain.get(ts)
+        rows.append((h, np.nan if t is None else t, np.nan if r is None else r))
+    if rows:
+        _append(obs_path(), np.array(rows, dtype=OBS_DTYPE))
+    return len(rows)
+
+
+# ---------------- 採点 ----------------
+def load(key: str) -> np.ndarray:
+    path = forecast_path(key)
+    return np.fromfile(path, dtype=FC_DTYPE) if path.exists() else np.zeros(0, dtype=FC_DTYPE)
+
+def load_obs() -> np.ndarray:
+    path = obs_path()
+    return np.fromfile(path, dtype=OBS_DTYPE) if path.exists() else np.zeros(0, dtype=OBS_DTYPE)
+
+def score(fc: np.ndarray, obs: np.ndarray, *, wet_mm: float = WET_MM, since_hour: Optional[int] = None) -> Dict[str, Any]:
+    """
+    先行時間ごとの精度。すべて (発表数, 先行時間) の配列演算で出す。
+      temp_mae / temp_bias / temp_n   気温の平均絶対誤差・平均誤差（予報 − 実測）・件数
+      precip_pod / precip_far / precip_n / precip_events
+          「降った（wet_mm 以上）」の捕捉率（hits / 実測で降った数）・空振り率（false alarms / 予報で降る数）
+    """
+    if since_hour is not None:
+        fc = fc[fc["issue"] >= since_hour]
+    leads = np.arange(LEADS)
+    out: Dict[str, Any] = {"issues": int(len(fc)), "obs_hours": int(len(obs)), "wet_mm": wet_mm,
+                           "lead_hours": leads.tolist()}
+    if len(fc) == 0 or len(obs) == 0:
+        return out
+
+    # 実測を毎正時の密な配列に（欠けている時刻は nan）
+    h0 = int(obs["hour"].min())
+    span = int(obs["hour"].max()) - h0 + 1
+    o_temp = np.full(span, np.nan, dtype="<f4")
+    o_rain = np.full(span, np.nan, dtype="<f4")
+    o_temp[obs["hour"] - h0] = obs["temp"]
+    o_rain[obs["hour"] - h0] = obs["precip1h"]
+
+    valid = fc["issue"][:, None] + leads[None, :] - h0          # (発表, 先行) → 実測配列の添字
+    inside = (valid >= 0) & (valid < span)
+    idx = np.where(inside, valid, 0)
+    ot = np.where(inside, o_temp[idx], np.nan)
+    orr = np.where(inside, o_rain[idx], np.nan)
+
+    err = fc["temp"] - ot
+    ok = np.isfinite(err)
+    n = ok.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["temp_mae"] = np.where(n > 0, np.where(ok, np.abs(err), 0).sum(axis=0) / n, np.nan).round(2).tolist()
+        out["temp_bias"] = np.where(n > 0, np.where(ok, err, 0).sum(axis=0) / n, np.nan).round(2).tolist()
+    out["temp_n"] = n.tolist()
+
+    both = np.isfinite(fc["precip"]) & np.isfinite(orr)
+    f_wet = both & (fc["precip"] >= wet_mm)
+    o_wet = both & (orr >= wet_mm)
+    hits = (f_wet & o_wet).sum(axis=0)
+    events = o_wet.sum(axis=0)
+    fwet = f_wet.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["precip_pod"] = np.where(events > 0, hits / events, np.nan).round(3).tolist()
+        out["precip_far"] = np.where(fwet > 0, (fwet - hits) / fwet, np.nan).round(3).tolist()
+    out["precip_n"] = both.sum(axis=0).tolist()
+    out["precip_events"] = events.tolist()
+    # nan は JSON にできないので None に
+    for k in ("temp_mae", "temp_bias", "precip_pod", "precip_far"):
+        out[k] = [None if v != v else v for v in out[k]]
+    return out
+
+
+def _print_report(rep: Dict[str, Any], step: int = 3) -> None:
+    print(f"issues={rep['issues']} obs_hours={rep['obs_hours']} wet>={rep['wet_mm']}mm")
+    if "temp_mae" not in rep:
+        print("(no overlap yet)")
+        return
+    fmt = lambda v, f: "—" if v is None else format(v, f)
+    print(f"{'lead':>4} {'T_MAE':>6} {'T_bias':>7} {'n':>6}  {'POD':>5} {'FAR':>5} {'events':>6}")
+    for L in rep["lead_hours"][::step]:
+        print(f"{L:>4} {fmt(rep['temp_mae'][L], '.2f'):>6} {fmt(rep['temp_bias'][L], '+.2f'):>7} {rep['temp_n'][L]:>6}"
+              f"  {fmt(rep['precip_pod'][L], '.2f'):>5} {fmt(rep['precip_far'][L], '.2f'):>5} {rep['precip_events'][L]:>6}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Open-Meteo forecast archive vs AMeDAS")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sc = sub.add_parser("score", help="MAE / hit rate by lead hour")
+    sc.add_argument("--point", default=None, help="point key (default: first point)")
+    sc.add_argument("--days", type=int, default=None, help="only issues within the last N days")
+    sc.add_argument("--wet", type=float, default=WET_MM, help="mm/h threshold for a wet hour")
+    sc.add_argument("--step", type=int, default=3, help="print every N lead hours")
+    sc.add_argument("--json", default=None, help="write the full report here")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "score":
+        from py_code.weather.points import default_point
+        key = args.point or default_point()["key"]
+        since = epoch_hour(datetime.now(JST) - timedelta(days=args.days)) if args.days else None
+        rep = score(load(key), load_obs(), wet_mm=args.wet, since_hour=since)
+        rep["point"] = key
+        _print_report(rep, args.step)
+        if args.json:
+            Path(args.json).write_text(json.dumps(rep, ensure_ascii=False, indent=2), encoding="utf-8")
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,75 @@
 #!/usr/bin/env python3
-import os, json, re, requests
+import os, sys, io, json, requests
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
-from lxml import etree
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+from py_code.runtime_guard import throttle
+from py_code.profiling import profiled, span
+from py_code.output import dumps, write_all, write_json
+from py_code.weather.amedas_buffer import ObservationBuffer, block_of
 
 
 JMA = "https://www.jma.go.jp"
 STN = "44112"  # 八王子
 
 UA = {"User-Agent": "TakaoApp/1.0 (+https://takaosan-go.jp)"}
+HTTP = requests  # get() を持つもの。常駐プロセス（daemon.py）は requests.Session に差し替えて接続を使い回す
 OUT_DIR = Path("/home/masuday/projects/takao35/py_data/weather")
 
-def get_latest_point_json_url():
+# summarize_point で拾う要素と、実行をまたいで 7 日分ためる要素
+ELEMENTS = ("temp", "precipitation10m", "precipitation1h", "sun10m", "sun1h", "wind", "windDirection", "humidity")
+TREND_ELEMENTS = ("temp", "precipitation1h", "wind", "humidity")
+BUFFER_PATH = os.environ.get("AMEDAS_BUFFER", f"{OUT_DIR}/amedas_{STN}_buffer.json")
+
+def get_latest_time():
     # 例: "2025-09-07T12:10:00+09:00"
-    latest = requests.get(f"{JMA}/bosai/amedas/data/latest_time.txt", headers=UA, timeout=15).text.strip()
+    throttle(JMA)
+    latest = HTTP.get(f"{JMA}/bosai/amedas/data/latest_time.txt", headers=UA, timeout=15).text.strip()
     print(f"latest_time:{latest}")
-    # 日付と3時間ブロック（00,03,...,21）を作る
     dt = datetime.fromisoformat(latest.replace("Z", "+00:00")).astimezone(timezone(timedelta(hours=9)))
-    ymd = dt.strftime("%Y%m%d")
-    h3  = f"{(dt.hour//3)*3:02d}"
-    return f"{JMA}/bosai/amedas/data/point/{STN}/{ymd}_{h3}.json", latest
+    return dt, latest
+
+def point_json_url(block):
+    """block は "YYYYMMDD_HH"（HH は 00,03,...,21 の 3 時間ブロック）"""
+    return f"{JMA}/bosai/amedas/data/point/{STN}/{block}.json"
+
+def get_latest_point_json_url():
+    dt, latest = get_latest_time()
+    # 日付と3時間ブロック（00,03,...,21）を作る
+    return point_json_url(f"{dt.strftime('%Y%m%d')}_{(dt.hour//3)*3:02d}"), latest
 
 def load_point_series(url):
-    r = requests.get(url, headers=UA, timeout=20); r.raise_for_status()
+    throttle(url)
+    r = HTTP.get(url, headers=UA, timeout=20); r.raise_for_status()
     return r.json()  # { "temp":[{ "time":"...", "value":..}, ...], "precipitation1h":[...], ... } の形式
 
-def pick_latest(series, key):
-    """point形式: 時刻キーで降順→ node[key] が [value, flag] なら value を返す"""
+def pick_latest_many(series, keys):
+    """
+    point形式を新しい時刻から 1 度だけ走査し、keys の各要素について欠測でない最新値を拾う。
+    戻り値は {key: (value, ts)}（見つからなければ (None, None)）。全要素が埋まった時点で打ち切る。
+    """
     # series は {"YYYYmmddHHMMSS": {"temp": [v, q], ...}, ...}
+    out = {k: (None, None) for k in keys}
     if not isinstance(series, dict):
-        return None, None
-    for ts in sorted(series.keys(), reverse=True):  # 新しい順
-        node = series.get(ts) or {}
-        arr = node.get(key)
-        if isinstance(arr, list) and arr:
-            val = arr[0]
-            if val is not None:
-                return val, ts
-    return None, None
+        return out
+    todo = set(keys)
+    for ts in sorted(series, reverse=True):  # 固定長の時刻文字列なので文字列順 = 時刻順
+        node = series[ts]
+        if not isinstance(node, dict):
+            continue
+        for key in [k for k in todo if k in node]:
+            arr = node[key]
+            if isinstance(arr, list) and arr and arr[0] is not None:
+                out[key] = (arr[0], ts)
+                todo.discard(key)
+        if not todo:
+            break
+    return out
+
+def pick_latest(series, key):
+    """point形式: node[key] が [value, flag] なら最新の value を返す"""
+    return pick_latest_many(series, (key,))[key]
 
 def infer_now_weather(p10, p1h, sun10, sun1h):
     # 1) 雨
@@ -55,19 +87,12 @@ def infer_now_weather(p10, p1h, sun10, sun1h):
     return "くもり寄り"
 
 
-def main_current():
-    url, latest_ts = get_latest_point_json_url()
-    series = load_point_series(url)
-    print(f"Loaded AMeDAS data {series}")
-    # ・・・AMeDASのseries取得後：
-    temp, _   = pick_latest(series, "temp")
-    rain10,_  = pick_latest(series, "precipitation10m")
-    rain1h,_  = pick_latest(series, "precipitation1h")
-    sun10,_   = pick_latest(series, "sun10m")
-    sun1h,_   = pick_latest(series, "sun1h")
-    wind,_    = pick_latest(series, "wind")
-    humi,_    = pick_latest(series, "humidity")
-    wdir,_     = pick_latest(series, "windDirection")
+def summarize_point(series, latest_ts):
+    """point JSON から最新の実測値をまとめる（欠測は None のまま）。"""
+    latest = pick_latest_many(series, ELEMENTS)
+    temp, rain10, rain1h = latest["temp"][0], latest["precipitation10m"][0], latest["precipitation1h"][0]
+    sun10, sun1h = latest["sun10m"][0], latest["sun1h"][0]
+    wind, humi, wdir = latest["wind"][0], latest["humidity"][0], latest["windDirection"][0]
     now_sky   = infer_now_weather(rain10, rain1h, sun10, sun1h)
 
     # まとめ（欠測は None のまま許容）
@@ -85,80 +110,248 @@ def main_current():
         "now_sky_guess": now_sky,  # ← これをブログやアプリの“現在”欄に
         "note": "気象庁アメダス実測 / 欠測はNone"
     }
+    return obs
+
 
-    # 出力
-    out_json = os.environ.get("OUT_JSON", f"{OUT_DIR}/amedas_44112.json")
-    out_html = os.environ.get("OUT_HTML", f"{OUT_DIR}/amedas_44112.html")
-    os.makedirs(os.path.dirname(out_json), exist_ok=True)
+def _ts_iso(ts):
+    # "20250909085000" → "2025-09-09T08:50:00+09:00"
+    return f"{ts[0:4]}-{ts[4:6]}-{ts[6:8]}T{ts[8:10]}:{ts[10:12]}:{ts[12:14]}+09:00"
+
+def build_trend(buf, latest_ts):
+    """バッファから 24h（10 分値）と 7d（毎正時）の系列を作る。"""
+    return {
+        "station": "八王子(AMeDAS 44112)",
+        "latest_source_time": latest_ts,
+        "last_24h": {el: [[_ts_iso(ts), v] for ts, v in buf.window(el, 24)] for el in TREND_ELEMENTS},
+        "last_7d": {el: [[_ts_iso(ts), v] for ts, v in buf.window(el, 24 * 7, step_minutes=60)] for el in TREND_ELEMENTS},
+    }
 
-    with open(out_json, "w", encoding="utf-8") as f:
-        json.dump(obs, f, ensure_ascii=False, indent=2)
+def update_buffer(latest_dt, buf=None):
+    """
+    前回以降の 3 時間ブロックだけ取得してバッファに足す。最新ブロックの point JSON を返す。
+    buf を渡せばそれ（常駐プロセスがメモリに持っているもの）を使い、省略時はファイルから読む。
+    古いブロックの失敗は飛ばす（次回取り直す）が、最新ブロックが取れなければ例外をそのまま上げる
+    （古い値を新しい latest_ts で出したり、空の値で上書きしたりしない。aggregate はキャッシュに回る）。
+    """
+    if buf is None:
+        buf = ObservationBuffer.load(BUFFER_PATH, ELEMENTS)
+    latest_block = block_of(latest_dt.replace(tzinfo=None))
+    # 新しいブロックが無くても（10 分以内の再実行）最新ブロックだけは取る＝従来と同じ 1 回
+    blocks = buf.blocks_to_fetch(latest_dt) or [latest_block]
+    for block in blocks:
+        try:
+            series = load_point_series(point_json_url(block))
+        except requests.RequestException as e:
+            if block == latest_block:
+                buf.save()  # それまでに取れた古いブロックは残す
+                raise
+            print(f"[warn] amedas block {block}: {e}")
+            continue
+        buf.merge(series)
+    print(f"amedas blocks fetched: {len(blocks)} ({blocks[0]}..{blocks[-1]})")
+    buf.save()
+    return buf, series
 
-    # ブログ用（貼り付け部品）
+def render_amedas_html(obs):
+    """ブログ用（貼り付け部品）"""
     def fmt(v, unit=""):
         return "—" if v is None else f"{v}{unit}"
-    html = f"""<!-- AMeDAS(44112) snippet -->
+    temp, rain1h, wind, humi = obs["temperature_c"], obs["precip_1h_mm"], obs["wind_ms"], obs["humidity_pct"]
+    return f"""<!-- AMeDAS(44112) snippet -->
 <div class="takao-amedas" style="border:1px solid #ddd;border-radius:12px;padding:12px;">
   <div style="font-weight:600;margin-bottom:6px;">八王子の実測（AMeDAS 44112）</div>
   <div>気温: {fmt(temp, "℃")}　1時間降水: {fmt(rain1h, "mm")}　風: {fmt(wind, "m/s")}　湿度: {fmt(humi, "%")}</div>
-  <div style="font-size:12px;color:#666;margin-top:6px;">出典: 気象庁 アメダス（{latest_ts} 時点の最新時刻束）</div>
+  <div style="font-size:12px;color:#666;margin-top:6px;">出典: 気象庁 アメダス（{obs["latest_source_time"]} 時点の最新時刻束）</div>
 </div>"""
-    with open(out_html, "w", encoding="utf-8") as f:
-        f.write(html)
+
+def amedas_outputs(obs, buf):
+    """{出力パス: 本文}（amedas_44112.{json,html} と傾向 JSON）。"""
+    return {
+        os.environ.get("OUT_JSON", f"{OUT_DIR}/amedas_44112.json"): dumps(obs),
+        os.environ.get("OUT_HTML", f"{OUT_DIR}/amedas_44112.html"): render_amedas_html(obs),
+        os.environ.get("OUT_TREND", f"{OUT_DIR}/amedas_{STN}_trend.json"):
+            dumps(build_trend(buf, obs["latest_source_time"])),
+    }
+
+def collect_current(buf=None, latest=None):
+    """
+    AMeDAS を取り込んで (obs, {出力パス: 本文}, buf) を返す。書き込みはしない。
+    latest は get_latest_time() の戻り値（呼び出し側で取得済みなら渡す）。
+    """
+    latest_dt, latest_ts = latest or get_latest_time()
+    buf, series = update_buffer(latest_dt, buf)
+    obs = summarize_point(series, latest_ts)
+    return obs, amedas_outputs(obs, buf), buf
+
+def main_current():
+    """AMeDAS を取り込み、amedas_44112.{json,html} と傾向 JSON を書いて、最新の実測（obs）を返す。"""
+    obs, outputs, _ = collect_current()
+    write_all(outputs)
+    return obs
 
 
 REGULAR = "http://xml.kishou.go.jp/xmlpull/regular.xml"
+FEED_PREF = "130000"  # VPFD50_<都道府県コード>.xml（東京都）
+AREA_CODE = "130010"  # 東京地方（高尾山を含む一次細分区域）
+TEMP_STATION = "44132"  # 府県予報の気温地点（東京）
+FEED_STATE = os.environ.get("JMA_FEED_STATE", f"{OUT_DIR}/jma_feed_state.json")
+FORECAST_CACHE = os.environ.get("JMA_FORECAST_CACHE", f"{OUT_DIR}/jma_forecast_cache.json")
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+MET = "{http://xml.kishou.go.jp/jmaxml1/body/meteorology1/}"
+EB = "{http://xml.kishou.go.jp/jmaxml1/elementBasis1/}"
+
+_mem = {}  # 状態・キャッシュ JSON の内容。常駐プロセスでは 2 回目以降ファイルを読まない
+
+def _load_json(path, default):
+    if path in _mem:
+        return _mem[path]
+    try:
+        with open(path, encoding="utf-8") as f:
+            _mem[path] = json.load(f)
+    except (OSError, ValueError):
+        return default
+    return _mem[path]
+
+def _save_json(path, obj):
+    _mem[path] = obj
+    write_json(path, obj, indent=2)
+
+def feed_entries(feed_bytes, pref=FEED_PREF):
+    """Atom フィードを iterparse で流し、対象県の VPFD エントリを (id, updated, url) で新しい順に返す。"""
+    from lxml import etree
+    out = []
+    for _, entry in etree.iterparse(io.BytesIO(feed_bytes), events=("end",), tag=f"{ATOM}entry"):
+        url = None
+        for link in entry.iter(f"{ATOM}link"):
+            href = link.get("href") or ""
+            if "_VPFD" in href and href.endswith(f"_{pref}.xml"):
+                url = href
+                break
+        if url:
+            out.append((entry.findtext(f"{ATOM}id"), entry.findtext(f"{ATOM}updated") or "", url))
+        entry.clear()
+    out.sort(key=lambda e: e[1], reverse=True)
+    return out
+
+def fetch_feed(state, conditional=True):
+    """
+    条件付き GET。更新なし（304）なら None、あれば本文を返し state の ETag/Last-Modified を更新。
+    conditional=False（使えるキャッシュが無い）なら条件を付けず必ず本文を取る。
+    """
+    headers = dict(UA)
+    if conditional and state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if conditional and state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    throttle(REGULAR)
+    r = HTTP.get(REGULAR, headers=headers, timeout=15)
+    if r.status_code == 304:
+        return None
+    r.raise_for_status()
+    state["etag"] = r.headers.get("ETag")
+    state["last_modified"] = r.headers.get("Last-Modified")
+    return r.content
 
 def fetch_forecast_xml():
-    feed = requests.get(REGULAR, headers=UA, timeout=15).text
-    urls = re.findall(r"https?://[^\s\"']+VPFD[^\s\"']+\.xml", feed)
-    if not urls:
+    """最新の VPFD 文書（対象県）を取得する。状態・キャッシュを使わない単発取得。"""
+    throttle(REGULAR)
+    entries = feed_entries(HTTP.get(REGULAR, headers=UA, timeout=15).content)
+    if not entries:
         raise RuntimeError("予報URLが見つからない")
-    return requests.get(urls[0], headers=UA, timeout=15).content
+    throttle(entries[0][2])
+    return HTTP.get(entries[0][2], headers=UA, timeout=15).content
 
-def parse_forecast(xml_bytes, area_code="130015"):
-    ns = {
-        "jmx_ib": "http://xml.kishou.go.jp/jmaxml1/informationBasis1/",
-        "jmx_mm": "http://xml.kishou.go.jp/jmaxml1/meteorology1/",
-    }
-    root = etree.fromstring(xml_bytes)
-    for area in root.findall(".//jmx_mm:Area", namespaces=ns):
-        code = area.get("code")
-        if code != area_code:
+def get_forecast(area_code=AREA_CODE):
+    """
+    フィードが変わっていなければ（304 / 同じエントリ id）キャッシュを返し、XML は一切読まない。
+    新しい VPFD が出ていればそれだけを取得・解析してキャッシュを更新する。
+    """
+    state = _load_json(FEED_STATE, {})
+    cache = _load_json(FORECAST_CACHE, None)
+    cached = cache["forecast"] if cache and cache.get("area_code") == area_code else None
+
+    # キャッシュが消えた・壊れた・別の地域のときに 304 を受けると何も返せないので、条件を付けない
+    feed = fetch_feed(state, conditional=cached is not None)
+    if feed is None and cached is not None:
+        print("jma feed: not modified (cache)")
+        return cached
+    entries = feed_entries(feed) if feed is not None else []
+    if not entries:
+        _save_json(FEED_STATE, state)
+        if cached is not None:
+            return cached
+        raise RuntimeError("予報URLが見つからない")
+
+    entry_id, updated, url = entries[0]
+    if cached is not None and cache.get("entry_id") == entry_id:
+        print("jma feed: same VPFD entry (cache)")
+        _save_json(FEED_STATE, state)
+        return cached
+
+    throttle(url)
+    r = HTTP.get(url, headers=UA, timeout=15)
+    r.raise_for_status()
+    fc = parse_forecast(r.content, area_code=area_code)
+    _save_json(FORECAST_CACHE, {"entry_id": entry_id, "updated": updated, "url": url,
+                                "area_code": area_code, "forecast": fc})
+    state.update(entry_id=entry_id, updated=updated)
+    _save_json(FEED_STATE, state)
+    print(f"jma feed: new VPFD {url}")
+    return fc
+
+def parse_forecast(xml_bytes, area_code=AREA_CODE, station_code=TEMP_STATION):
+    """
+    VPFD（府県天気予報）を iterparse で流し、area_code の天気・降水確率と station_code の気温だけ拾う。
+    時系列（TimeSeriesInfo）ごとに TimeDefine の refID → 名前（今日/明日/明日6時から12時 …）を引いて振り分ける。
+    """
+    from lxml import etree
+    blank = lambda: {"summary": None, "tmax": None, "tmin": None, "precipProb": {"am": None, "pm": None}}
+    days = {"明日": blank(), "明後日": blank()}
+    area_name = None
+    found = False
+    names = {}
+    for _, el in etree.iterparse(io.BytesIO(xml_bytes), events=("end",),
+                                 tag=(f"{MET}TimeDefines", f"{MET}Item")):
+        if el.tag == f"{MET}TimeDefines":
+            names = {td.get("timeId"): td.findtext(f"{MET}Name") or "" for td in el.iter(f"{MET}TimeDefine")}
+            el.clear()
             continue
-        summaries = area.findall(".//jmx_mm:Weather", namespaces=ns)
-        tmax_nodes = area.findall(".//jmx_mm:Temperature[@type='最高']", namespaces=ns)
-        tmin_nodes = area.findall(".//jmx_mm:Temperature[@type='最低']", namespaces=ns)
-        pops = area.findall(".//jmx_mm:ProbabilityOfPrecipitation", namespaces=ns)
-
-        def safe(node_list, idx):
-            return node_list[idx].text if len(node_list) > idx else None
-
-        tomorrow = {
-            "summary": safe(summaries, 0),
-            "tmax": safe(tmax_nodes, 0),
-            "tmin": safe(tmin_nodes, 0),
-            "precipProb": {"am": None, "pm": None},
-        }
-        day_after = {
-            "summary": safe(summaries, 1),
-            "tmax": safe(tmax_nodes, 1),
-            "tmin": safe(tmin_nodes, 1),
-            "precipProb": {"am": None, "pm": None},
-        }
-
-        for p in pops:
-            period = p.get("period") or ""
-            if "午前" in period and tomorrow["precipProb"]["am"] is None:
-                tomorrow["precipProb"]["am"] = p.text
-            elif "午後" in period and tomorrow["precipProb"]["pm"] is None:
-                tomorrow["precipProb"]["pm"] = p.text
-
-        return {"area": "多摩南部", "tomorrow": tomorrow, "day_after": day_after}
-    return {}
+        area_code_el = el.findtext(f"{MET}Area/{MET}Code")
+        station_el = el.findtext(f"{MET}Station/{MET}Code")
+        if area_code_el == area_code:
+            found = True
+            area_name = el.findtext(f"{MET}Area/{MET}Name")
+            for w in el.iter(f"{EB}Weather"):
+                day = days.get(names.get(w.get("refID"), ""))
+                if day is not None and day["summary"] is None:
+                    day["summary"] = w.text
+            for p in el.iter(f"{EB}ProbabilityOfPrecipitation"):
+                name = names.get(p.get("refID"), "")
+                if name.startswith("明日") and name != "明日":
+                    if name.endswith("6時から12時"):
+                        days["明日"]["precipProb"]["am"] = p.text
+                    elif name.endswith("12時から18時"):
+                        days["明日"]["precipProb"]["pm"] = p.text
+        elif station_el == station_code:
+            for t in el.iter(f"{EB}Temperature"):
+                name = names.get(t.get("refID"), "")
+                day = days.get("明日" if name.startswith("明日") else ("明後日" if name.startswith("明後日") else ""))
+                if day is None:
+                    continue
+                if "最高" in (t.get("type") or ""):
+                    day["tmax"] = t.text
+                elif "最低" in (t.get("type") or ""):
+                    day["tmin"] = t.text
+        el.clear()
+    if not found:
+        return {}
+    return {"area": area_name, "tomorrow": days["明日"], "day_after": days["明後日"]}
 
 if __name__ == "__main__":
-    xml = fetch_forecast_xml()
-    fc = parse_forecast(xml)
-    print(fc)
-    main_current()
+    with profiled("jma"):
+        with span("forecast"):
+            fc = get_forecast()
+        print(fc)
+        with span("amedas"):
+            main_current()
@@ -1,26 +1,44 @@
 #!/usr/bin/env python3
 # /home/masuday/projects/takao35/py_code/weather/open_meteo.py
 
+import sys
 import requests
 import traceback
-import json
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-LAT, LON = 35.624652, 139.242783
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+import numpy as np
+
+from py_code.runtime_guard import throttle
+from py_code.profiling import profiled, span
+from py_code.output import STYLESHEET_LINK, STYLESHEET_NAME, changed, dumps, stylesheet, write_all
+from py_code.weather.points import load_points
+
+POINTS = load_points()
+LAT, LON = POINTS[0]["lat"], POINTS[0]["lon"]  # 既定地点（takao_* の出力元）
 TIMEZONE = "Asia/Tokyo"
 OUT_DIR = Path("/home/masuday/projects/takao35/py_data/weather")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
+POINTS_DIR = OUT_DIR / "points"
+LEGACY_PREFIX = "takao"
 
-API_URL = (
-    "https://api.open-meteo.com/v1/jma"
-    f"?latitude={LAT}&longitude={LON}"
-    "&hourly=temperature_2m,precipitation,precipitation_probability,"
-    "wind_speed_10m,wind_direction_10m,weathercode"
-    "&current_weather=true"
-    f"&timezone={TIMEZONE}"
-)
+HOURLY = ("temperature_2m", "precipitation", "precipitation_probability",
+          "wind_speed_10m", "wind_direction_10m", "weathercode")
+
+def api_url(points: List[Dict[str, Any]]) -> str:
+    """全地点を 1 リクエストに（latitude / longitude はカンマ区切りで地点数ぶん並べる）。"""
+    return (
+        "https://api.open-meteo.com/v1/jma"
+        f"?latitude={','.join(str(p['lat']) for p in points)}"
+        f"&longitude={','.join(str(p['lon']) for p in points)}"
+        f"&hourly={','.join(HOURLY)}"
+        "&current_weather=true"
+        f"&timezone={TIMEZONE}"
+    )
+
+API_URL = api_url(POINTS)
+HTTP = requests  # get() を持つもの。常駐プロセス（daemon.py）は requests.Session に差し替える
 
 JST = timezone(timedelta(hours=9))
 
@@ -71,8 +89,8 @@ def parse_hour_to_naive_jst(s: Any) -> Optional[datetime]:
     except Exception:
         return None
 
-def index_from_now(times_iso: List[str]) -> int:
-    now_naive = datetime.now(JST).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+def index_from_now(times_iso: List[str], now: Optional[datetime] = None) -> int:
+    now_naive = (now or datetime.now(JST)).replace(tzinfo=None, minute=0, second=0, microsecond=0)
     best_i, best_d = 0, float("inf")
     for i, s in enumerate(times_iso):
         t = parse_hour_to_naive_jst(s)
@@ -83,13 +101,118 @@ def index_from_now(times_iso: List[str]) -> int:
             best_d, best_i = d, i
     return best_i
 
-try:
-    r = requests.get(API_URL, timeout=20)
-    r.raise_for_status()
-    data = r.json()
+WIND_DIRS = np.array(["北","北北東","北東","東北東","東","東南東","南東","南南東",
+                      "南","南南西","南西","西南西","西","西北西","北西","北北西","—"])
+
+def _num(a: np.ndarray) -> np.ndarray:
+    """object 配列（None 混じり）→ float 配列（None は nan）。"""
+    try:
+        return np.asarray(a, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([[float(v) if isinstance(v, (int, float)) else np.nan for v in row] for row in a])
+
+def wind_dir_texts(deg: np.ndarray) -> np.ndarray:
+    """wind_dir_to_text の配列版（全地点・全時刻を一度に）。"""
+    d = _num(deg)
+    ok = np.isfinite(d)
+    i = ((np.mod(np.where(ok, d, 0.0), 360) / 22.5 + 0.5).astype(int)) % 16
+    return WIND_DIRS[np.where(ok, i, 16)]
+
+def fmt_array(v: np.ndarray, unit: str = "", nd: int = 1) -> np.ndarray:
+    """fmt の配列版。"""
+    d = _num(v)
+    return np.where(np.isfinite(d), np.char.add(np.round(d, nd).astype(str), unit), "—")
+
+def wmo_arrays(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """天気コード配列 → (アイコン, 文字) 配列。表引きは出てきたコードの種類ぶんだけ。"""
+    table = {c: wmo_icon_text(c) for c in set(codes.ravel().tolist())}
+    icons = np.empty(codes.shape, dtype=object)
+    texts = np.empty(codes.shape, dtype=object)
+    for c, (icon, text) in table.items():
+        hit = codes == c
+        icons[hit] = icon
+        texts[hit] = text
+    return icons, texts
+
+def stack_hourly(datas: List[Dict[str, Any]]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    地点ごとの hourly を {要素: (地点数, 時刻数 + 1) の object 配列} にそろえる。
+    時刻軸は全地点共通（同じ timezone で取っているため）。末尾 1 列は「1 時間後」参照用の None。
+    """
+    times: List[str] = max(((d.get("hourly") or {}).get("time") or [] for d in datas), key=len, default=[])
+    n = len(times)
+    out = {}
+    for var in HOURLY:
+        a = np.full((len(datas), n + 1), None, dtype=object)
+        for p, d in enumerate(datas):
+            vals = ((d.get("hourly") or {}).get(var) or [])[:n]
+            a[p, :len(vals)] = vals
+        out[var] = a
+    return times, out
+
+def _columns(H: Dict[str, np.ndarray], idx: np.ndarray) -> Dict[str, np.ndarray]:
+    """指定した時刻列を全地点ぶんまとめて切り出し、表示用の文字列も配列で作る。"""
+    wcode = H["weathercode"][:, idx]
+    wdir = H["wind_direction_10m"][:, idx]
+    pop1 = H["precipitation_probability"][:, idx + 1]
+    icons, texts = wmo_arrays(wcode)
+    cols = {
+        "weathercode": wcode, "weather_icon": icons, "weather_text": texts,
+        "temperature_c": H["temperature_2m"][:, idx],
+        "wind_speed_ms": H["wind_speed_10m"][:, idx],
+        "wind_dir_deg": wdir, "wind_dir_text": wind_dir_texts(wdir),
+        "precip_mmph": H["precipitation"][:, idx],
+        "pop_next1h_pct": pop1,
+    }
+    cols["t2m_s"] = fmt_array(cols["temperature_c"], "℃")
+    cols["wspd_s"] = fmt_array(cols["wind_speed_ms"], "m/s")
+    cols["prec_s"] = fmt_array(cols["precip_mmph"], "mm/h")
+    cols["pop1_s"] = fmt_array(pop1, "%")
+    return cols
+
+JSON_KEYS = ("weathercode", "weather_text", "weather_icon", "temperature_c", "wind_speed_ms",
+             "wind_dir_deg", "wind_dir_text", "precip_mmph", "pop_next1h_pct")
+
+def build_point_outputs(datas: List[Dict[str, Any]], points: List[Dict[str, Any]],
+                        now: Optional[datetime] = None) -> List[Tuple[Dict[str, str], str]]:
+    """
+    全地点の API 応答から、地点ごとに {current,2days,today}.{html,json} の中身を作る。
+    時刻の選び方（現在に最も近い時刻・6 時間ごと・今日）は全地点共通なので 1 回だけ求め、
+    値の切り出しと整形は (地点, 時刻) の配列でまとめて行う。戻り値は points と同じ順の
+    ({"current.html": 本文, ...}, 観測時刻ラベル)。
+    """
+    now = now or datetime.now(JST)
+    times, H = stack_hourly(datas)
+    parsed = [parse_hour_to_naive_jst(s) for s in times]
+
+    base_idx = index_from_now(times, now)
+    step_idx = np.arange(base_idx, len(times), 6)[:9]
+    today_idx = np.array([i for i, t in enumerate(parsed) if t is not None and t.date() == now.date()], dtype=int)
+    step = _columns(H, step_idx)
+    today = _columns(H, today_idx)
+
+    step_labels = [parsed[i].strftime("%-m/%-d %H:%M") if parsed[i] else "—" for i in step_idx]
+    today_labels = [parsed[i].strftime("%-m/%-d %H:%M") for i in today_idx]
+
+    results = []
+    for p, point in enumerate(points):
+        # 地点 p の行だけ Python のリストに（tolist で numpy のスカラーも素の int/float/str に戻る）
+        st = {k: v[p].tolist() for k, v in step.items()}
+        td = {k: v[p].tolist() for k, v in today.items()}
+        results.append(_render_point(point, datas[p].get("current_weather") or {}, now,
+                                     times, step_idx.tolist(), st, step_labels, today_idx.tolist(), td, today_labels))
+    return results
+
+def _render_point(point: Dict[str, Any], cur: Dict[str, Any], now: datetime,
+                  times: List[str],
+                  step_idx: List[int], step: Dict[str, List[Any]], step_labels: List[str],
+                  today_idx: List[int], today: Dict[str, List[Any]], today_labels: List[str]
+                  ) -> Tuple[Dict[str, str], str]:
+    name = point["name"]
+    coord = {"lat": point["lat"], "lon": point["lon"]}
+    out: Dict[str, str] = {}
 
     # ======= 現在 =======
-    cur = data.get("current_weather") or {}
     cur_icon, cur_text = wmo_icon_text(cur.get("weathercode"))
     t_iso = cur.get("time")
     if isinstance(t_iso, str):
@@ -98,19 +221,14 @@ try:
         else:
             obs_dt = datetime.fromisoformat(t_iso).replace(tzinfo=JST)
     else:
-        obs_dt = datetime.now(JST)
+        obs_dt = now
     obs_str = obs_dt.strftime("%H:%M時点")
 
     html_cur = f"""
-    <html><head><meta charset="utf-8"><title>高尾山付近の天気</title>
-    <style>
-      body{{font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,'Hiragino Kaku Gothic ProN','Noto Sans JP',sans-serif;margin:16px;color:#222;}}
-      h2 small{{font-size:.7em;color:#666;margin-left:.5em;}}
-      table{{border-collapse: collapse;width: 100%;table-layout: fixed;   /* 均等割り */}}
-      th,td {{border: 1px solid #ddd;padding: 8px;text-align: center;word-break: keep-all;}}
-    </style>
+    <html><head><meta charset="utf-8"><title>{name}の天気</title>
+    {STYLESHEET_LINK}
     </head><body>
-    <h2>高尾山付近の天気 <small>{obs_str}</small></h2>
+    <h2>{name}の天気 <small>{obs_str}</small></h2>
     <table>
       <tr><th>天気</th><th>気温</th><th>風速</th><th>風向</th><th>降水量</th></tr>
       <tr>
@@ -124,13 +242,13 @@ try:
     <small>Weather data by <a href="https://open-meteo.com/">Open-Meteo.com</a></small>
     </body></html>
     """
-    (OUT_DIR/"takao_current.html").write_text(html_cur, encoding="utf-8")
+    out["current.html"] = html_cur
 
     # JSON（現在）
     current_json = {
-        "title": "高尾山付近の天気",
+        "title": f"{name}の天気",
         "observed_at": obs_dt.isoformat(),
-        "coord": {"lat": LAT, "lon": LON},
+        "coord": coord,
         "source": "open-meteo:jma",
         "current": {
             "weathercode": cur.get("weathercode"),
@@ -143,74 +261,35 @@ try:
             "precip_mm": cur.get("precipitation"),
         }
     }
-    (OUT_DIR/"takao_current.json").write_text(
-        json.dumps(current_json, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
-
-    # ======= hourly =======
-    hourly = data.get("hourly") or {}
-    times = hourly.get("time") or []
-    t2m   = hourly.get("temperature_2m") or []
-    prec  = hourly.get("precipitation") or []
-    pop   = hourly.get("precipitation_probability") or []
-    wspd  = hourly.get("wind_speed_10m") or []
-    wdir  = hourly.get("wind_direction_10m") or []
-    wcode = hourly.get("weathercode") or []
-
-    def safe(arr: Optional[List[Any]], i: int, default=None):
-        try:
-            return arr[i]
-        except Exception:
-            return default
+    out["current.json"] = dumps(current_json)
 
     # ======= 今後2日（6時間ごと）— JSONの時刻をそのまま利用 =======
-    base_idx = index_from_now(times)
-    step_indices = [base_idx + 6*k for k in range(9) if base_idx + 6*k < len(times)]
-
     th_cells, row_icon, row_text, row_t2m, row_wspd, row_wdir, row_prec, row_pop1h = ([] for _ in range(8))
     cols_json = []
 
-    for j, idx in enumerate(step_indices):
-        dt_naive = parse_hour_to_naive_jst(times[idx])
-        tlabel = dt_naive.strftime("%-m/%-d %H:%M") if dt_naive else "—"
-        th_cells.append(f"<th>{'現在' if j==0 else tlabel}</th>")
-        icon, text = wmo_icon_text(safe(wcode, idx))
-        row_icon.append(f"<td>{icon}</td>")
-        row_text.append(f"<td>{text}</td>")
-        row_t2m.append(f"<td>{fmt(safe(t2m, idx),'℃')}</td>")
-        row_wspd.append(f"<td>{fmt(safe(wspd, idx),'m/s')}</td>")
-        row_wdir.append(f"<td>{wind_dir_to_text(safe(wdir, idx))}</td>")
-        row_prec.append(f"<td>{fmt(safe(prec, idx),'mm/h')}</td>")
-        row_pop1h.append(f"<td>{fmt(safe(pop, idx+1),'%')}</td>")
-
-        cols_json.append({
-            "time_iso": times[idx],
-            "label": ("現在" if j==0 else tlabel),
-            "weathercode": safe(wcode, idx),
-            "weather_text": text,
-            "weather_icon": icon,
-            "temperature_c": safe(t2m, idx),
-            "wind_speed_ms": safe(wspd, idx),
-            "wind_dir_deg": safe(wdir, idx),
-            "wind_dir_text": wind_dir_to_text(safe(wdir, idx)),
-            "precip_mmph": safe(prec, idx),
-            "pop_next1h_pct": safe(pop, idx+1),
-        })
+    for j, idx in enumerate(step_idx):
+        label = "現在" if j == 0 else step_labels[j]
+        th_cells.append(f"<th>{label}</th>")
+        row_icon.append(f"<td>{step['weather_icon'][j]}</td>")
+        row_text.append(f"<td>{step['weather_text'][j]}</td>")
+        row_t2m.append(f"<td>{step['t2m_s'][j]}</td>")
+        row_wspd.append(f"<td>{step['wspd_s'][j]}</td>")
+        row_wdir.append(f"<td>{step['wind_dir_text'][j]}</td>")
+        row_prec.append(f"<td>{step['prec_s'][j]}</td>")
+        row_pop1h.append(f"<td>{step['pop1_s'][j]}</td>")
+
+        col = {"time_iso": times[idx], "label": label}
+        col.update((k, step[k][j]) for k in JSON_KEYS)
+        cols_json.append(col)
 
     updated_caption = obs_dt.strftime("%H:%M") + "時点"
 
     html_2days = f"""
     <html><head><meta charset="utf-8"><title>今後2日の天気（6時間ごと）</title>
-    <style>
-      body{{font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,'Hiragino Kaku Gothic ProN','Noto Sans JP',sans-serif;margin:16px;color:#222;}}
-      h2 small{{font-size:.7em;color:#666;margin-left:.5em;}}
-      table{{border-collapse:collapse;width:100%;table-layout:fixed;margin-top:8px;}}
-      th,td{{border:1px solid #ddd;padding:8px;text-align:center;word-break:keep-all;}}
-      th{{background:#f7f7f7;}}
-    </style>
+    {STYLESHEET_LINK}
     </head><body>
-      <h2>高尾山付近の天気（今後2日・6時間ごと） <small>{updated_caption}</small></h2>
-      <table>
+      <h2>{name}の天気（今後2日・6時間ごと） <small>{updated_caption}</small></h2>
+      <table class="mt">
         <tr><th></th>{''.join(th_cells)}</tr>
         <tr><th>天気（アイコン）</th>{''.join(row_icon)}</tr>
         <tr><th>天気（文字）</th>{''.join(row_text)}</tr>
@@ -223,67 +302,44 @@ try:
       <small>Weather data by <a href="https://open-meteo.com/">Open-Meteo.com</a></small>
     </body></html>
     """
-    (OUT_DIR/"takao_2days.html").write_text(html_2days, encoding="utf-8")
+    out["2days.html"] = html_2days
 
     # JSON（2日・6時間ごと）
     two_days_json = {
-        "title": "高尾山付近の天気（今後2日・6時間ごと）",
+        "title": f"{name}の天気（今後2日・6時間ごと）",
         "updated_at": obs_dt.isoformat(),
-        "coord": {"lat": LAT, "lon": LON},
+        "coord": coord,
         "source": "open-meteo:jma",
         "columns": cols_json
     }
-    (OUT_DIR/"takao_2days.json").write_text(
-        json.dumps(two_days_json, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
+    out["2days.json"] = dumps(two_days_json)
 
     # ======= 今日の天気（毎時） =======
     today_rows = []
     today_json_rows = []
-    for i, s in enumerate(times):
-        dt_naive = parse_hour_to_naive_jst(s)
-        if dt_naive is None:
-            continue
-        if dt_naive.date() != datetime.now(JST).date():
-            continue
-        icon, text = wmo_icon_text(safe(wcode, i))
+    for j, i in enumerate(today_idx):
         today_rows.append(
             f"<tr>"
-            f"<td>{dt_naive.strftime('%-m/%-d %H:%M')}</td>"
-            f"<td>{icon}</td>"
-            f"<td>{text}</td>"
-            f"<td>{fmt(safe(t2m, i),'℃')}</td>"
-            f"<td>{fmt(safe(wspd, i),'m/s')}</td>"
-            f"<td>{wind_dir_to_text(safe(wdir, i))}</td>"
-            f"<td>{fmt(safe(prec, i),'mm/h')}</td>"
-            f"<td>{fmt(safe(pop, i+1),'%')}</td>"
+            f"<td>{today_labels[j]}</td>"
+            f"<td>{today['weather_icon'][j]}</td>"
+            f"<td>{today['weather_text'][j]}</td>"
+            f"<td>{today['t2m_s'][j]}</td>"
+            f"<td>{today['wspd_s'][j]}</td>"
+            f"<td>{today['wind_dir_text'][j]}</td>"
+            f"<td>{today['prec_s'][j]}</td>"
+            f"<td>{today['pop1_s'][j]}</td>"
             f"</tr>"
         )
-        today_json_rows.append({
-            "time_iso": s,
-            "weathercode": safe(wcode, i),
-            "weather_text": text,
-            "weather_icon": icon,
-            "temperature_c": safe(t2m, i),
-            "wind_speed_ms": safe(wspd, i),
-            "wind_dir_deg": safe(wdir, i),
-            "wind_dir_text": wind_dir_to_text(safe(wdir, i)),
-            "precip_mmph": safe(prec, i),
-            "pop_next1h_pct": safe(pop, i+1),
-        })
+        row = {"time_iso": times[i]}
+        row.update((k, today[k][j]) for k in JSON_KEYS)
+        today_json_rows.append(row)
 
     html_today = f"""
     <html><head><meta charset="utf-8"><title>今日の天気（毎時）</title>
-    <style>
-      body{{font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,'Hiragino Kaku Gothic ProN','Noto Sans JP',sans-serif;margin:16px;color:#222;}}
-      h2 small{{font-size:.7em;color:#666;margin-left:.5em;}}
-      table{{border-collapse:collapse;width:100%;table-layout:fixed;margin-top:8px;}}
-      th,td{{border:1px solid #ddd;padding:8px;text-align:center;word-break:keep-all;}}
-      th{{background:#f7f7f7;}}
-    </style>
+    {STYLESHEET_LINK}
     </head><body>
-      <h2>高尾山付近の天気（今日・毎時） <small>{updated_caption}</small></h2>
-      <table>
+      <h2>{name}の天気（今日・毎時） <small>{updated_caption}</small></h2>
+      <table class="mt">
         <tr>
           <th>時刻</th><th>天気(アイコン)</th><th>天気</th>
           <th>気温</th><th>風速</th><th>風向</th><th>降水量</th><th>降水確率（1時間後）</th>
@@ -293,22 +349,86 @@ try:
       <small>Weather data by <a href="https://open-meteo.com/">Open-Meteo.com</a></small>
     </body></html>
     """
-    (OUT_DIR/"takao_today.html").write_text(html_today, encoding="utf-8")
+    out["today.html"] = html_today
 
     # JSON（今日・毎時）
     today_json = {
-        "title": "高尾山付近の天気（今日・毎時）",
+        "title": f"{name}の天気（今日・毎時）",
         "updated_at": obs_dt.isoformat(),
-        "coord": {"lat": LAT, "lon": LON},
+        "coord": coord,
         "source": "open-meteo:jma",
         "rows": today_json_rows
     }
-    (OUT_DIR/"takao_today.json").write_text(
-        json.dumps(today_json, ensure_ascii=False, indent=2), encoding="utf-8"
-    )
+    out["today.json"] = dumps(today_json)
+
+    return out, obs_str
+
+
+def build_outputs(data: Dict[str, Any], now: Optional[datetime] = None) -> Tuple[Dict[str, str], str]:
+    """
+    既定地点 1 つ分の API 応答から従来の 6 ファイル（takao_{current,2days,today}.{html,json}）を作る。
+    戻り値は ({ファイル名: 本文}, 観測時刻ラベル)。
+    """
+    (files, obs_str), = build_point_outputs([data], POINTS[:1], now)
+    return {f"{LEGACY_PREFIX}_{k}": v for k, v in files.items()}, obs_str
+
+
+def fetch_points(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """全地点を 1 往復で取る。1 地点のときは応答が dict、複数のときは地点順の list。"""
+    url = api_url(points)
+    throttle(url)
+    r = HTTP.get(url, timeout=20)
+    r.raise_for_status()
+    data = r.json()
+    datas = data if isinstance(data, list) else [data]
+    if len(datas) != len(points):
+        raise RuntimeError(f"地点数が合わない: 要求 {len(points)} / 応答 {len(datas)}")
+    return datas
+
+
+def output_files(points: List[Dict[str, Any]], results: List[Tuple[Dict[str, str], str]]) -> Dict[Path, str]:
+    """{出力パス: 本文}。points/<key>_* と index.json、既定地点（先頭）の takao_*、共通 CSS。"""
+    out: Dict[Path, str] = {}
+    index = []
+    for point, (files, obs) in zip(points, results):
+        for kind, text in files.items():
+            out[POINTS_DIR/f"{point['key']}_{kind}"] = text
+        index.append({**point, "observed": obs,
+                      "files": [f"points/{point['key']}_{kind}" for kind in files]})
+    out[POINTS_DIR/"index.json"] = dumps(index)
+
+    # 従来の takao_* は既定地点（先頭）のもの
+    for kind, text in results[0][0].items():
+        out[OUT_DIR/f"{LEGACY_PREFIX}_{kind}"] = text
+    # ページが相対パスで読む共通 CSS
+    css = stylesheet()
+    out[OUT_DIR/STYLESHEET_NAME] = css
+    out[POINTS_DIR/STYLESHEET_NAME] = css
+    return out
+
+
+def write_outputs(points: List[Dict[str, Any]], results: List[Tuple[Dict[str, str], str]]) -> Dict[Path, bool]:
+    """output_files を書く（中身が変わったものだけ）。{パス: 書いたか} を返す。"""
+    return write_all(output_files(points, results))
+
+
+def main() -> None:
+    try:
+        with span("fetch"):
+            datas = fetch_points(POINTS)
+
+        with span("build"):
+            results = build_point_outputs(datas, POINTS)
+
+        with span("write"):
+            flags = write_outputs(POINTS, results)
+        print("更新OK:", results[0][1], f"({len(POINTS)} 地点, {changed(flags)}/{len(flags)} files changed)")
+
+    except Exception as e:
+        print("エラー:", e)
+        traceback.print_exc()
 
-    print("更新OK:", obs_str)
 
-except Exception as e:
-    print("エラー:", e)
-    traceback.print_exc()
\ No newline at end of file
+if __name__ == "__main__":
+    with profiled("open_meteo"):
+        main()
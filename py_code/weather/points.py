@@ -0,0 +1,36 @@
+# py_code/weather/points.py
+"""
+天気を取る地点の一覧（山頂・麓・登山口）。
+
+- 先頭が既定地点（従来の 1 地点＝山頂付近）。takao_*.{html,json} はこの地点の出力をそのまま使う。
+- env WEATHER_POINTS に JSON ファイル（[{"key", "name", "lat", "lon", "elevation"}, ...]）を
+  指定すると一覧ごと差し替えられる。key は出力ファイル名（points/<key>_*.json）に使う。
+"""
+import json
+import os
+from typing import Dict, List
+
+POINTS: List[Dict] = [
+    {"key": "takao",    "name": "高尾山付近",       "lat": 35.624652, "lon": 139.242783, "elevation": 599},
+    {"key": "base",     "name": "高尾山口",         "lat": 35.632296, "lon": 139.269874, "elevation": 190},
+    {"key": "kiyotaki", "name": "清滝（ケーブル）", "lat": 35.631860, "lon": 139.262190, "elevation": 201},
+    {"key": "hikage",   "name": "日影（いろはの森）", "lat": 35.637960, "lon": 139.237300, "elevation": 290},
+    {"key": "shiroyama", "name": "小仏城山",        "lat": 35.641590, "lon": 139.229170, "elevation": 670},
+]
+
+
+def load_points() -> List[Dict]:
+    path = os.environ.get("WEATHER_POINTS")
+    if not path:
+        return POINTS
+    with open(path, encoding="utf-8") as f:
+        pts = json.load(f)
+    for p in pts:
+        missing = {"key", "name", "lat", "lon"} - set(p)
+        if missing:
+            raise ValueError(f"WEATHER_POINTS: {p.get('key', p)} に {sorted(missing)} がない")
+    return pts
+
+
+def default_point() -> Dict:
+    return load_points()[0]
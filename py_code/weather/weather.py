@@ -1,32 +1,95 @@
-import requests, json, datetime as dt
+#!/usr/bin/env python3
+"""
+Yahoo! YOLP 気象情報 API（降水強度 10 分値：直近 1 時間の実測 + 1 時間先までの予測）。
+登録地点（points.py）をまとめて 1 リクエストで取る。
+"""
+import sys, requests, json, datetime as dt
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))  # py_code パッケージ用
+from py_code.runtime_guard import throttle
+from py_code.weather.points import load_points
 
 APPID = "dj00aiZpPUpMSFluM3NJOXpZTCZzPWNvbnN1bWVyc2VjcmV0Jng9NDU-"
-lon, lat = 139.242783, 35.624652
-url = ("https://map.yahooapis.jp/weather/V1/place"
-       f"?coordinates={lon},{lat}&output=json&interval=10&past=1&appid={APPID}")
-
-r = requests.get(url, timeout=10)
-r.raise_for_status()
-j = r.json()
-info = j.get("ResultInfo")
-print(info)   # {'Count': 1, 'Total': 1, 'Start': 1, 'Status': 200}
-feat = j["Feature"]
-print(feat)   # ['WeatherList', 'WeatherCodes', 'WeatherAreaCode']
-area_code = feat["Property"].get("WeatherAreaCode")
-series = [
-    {
-      "type": w["Type"],              # "observation" or "forecast"
-      "time": w["Date"],              # "YYYYMMDDHHMI"
-      "rainfall_mmph": float(w["Rainfall"])
-    } for w in feat["Property"]["WeatherList"]["Weather"]
-]
-
-out = {
-  "yolp_rain_nowcast": {
-    "coordinates": {"lat": lat, "lon": lon},
-    "weather_area_code": area_code,
-    "series": series,
-    "generated_at": dt.datetime.utcnow().isoformat()+"Z"
-  }
-}
-print(json.dumps(out, ensure_ascii=False))
\ No newline at end of file
+API = "https://map.yahooapis.jp/weather/V1/place"
+MAX_COORDS = 10  # YOLP の coordinates は 1 リクエスト 10 地点まで
+RAIN_MMPH = 0.0  # これを超えたら「降っている」
+HTTP = requests  # get() を持つもの。常駐プロセス（daemon.py）は requests.Session に差し替える
+
+def fetch_nowcast(points: Optional[List[Dict]] = None, timeout: float = 10) -> Dict[str, Dict]:
+    """{地点 key: {name, coordinates, weather_area_code, series}}。series は時刻順。"""
+    points = (points or load_points())[:MAX_COORDS]
+    coords = " ".join(f"{p['lon']},{p['lat']}" for p in points)
+    url = f"{API}?coordinates={coords}&output=json&interval=10&past=1&appid={APPID}"
+    throttle(url)
+    r = HTTP.get(url, timeout=timeout)
+    r.raise_for_status()
+    j = r.json()
+    features = j["Feature"]  # 地点順（coordinates に並べた順）
+
+    out = {}
+    for p, feat in zip(points, features):
+        out[p["key"]] = {
+            "name": p["name"],
+            "coordinates": {"lat": p["lat"], "lon": p["lon"]},
+            "weather_area_code": feat["Property"].get("WeatherAreaCode"),
+            "series": [
+                {
+                  "type": w["Type"],              # "observation" or "forecast"
+                  "time": w["Date"],              # "YYYYMMDDHHMI"
+                  "rainfall_mmph": float(w["Rainfall"])
+                } for w in feat["Property"]["WeatherList"]["Weather"]
+            ],
+        }
+    return out
+
+def _hhmm(t: str) -> str:
+    return f"{t[8:10]}:{t[10:12]}"
+
+def rain_outlook(series: List[Dict], threshold: float = RAIN_MMPH) -> Dict:
+    """
+    10 分値の系列から「今降っているか」と、1 時間以内に降り出す / 止む時刻を出す。
+      raining_now  最新の実測が threshold を超えているか
+      onset        降っていないとき、予測で最初に threshold を超える時刻（HH:MM）
+      stop         降っているとき、予測で最初に threshold 以下になる時刻（HH:MM）
+      max_mmph     予測の最大値
+    """
+    obs = [w for w in series if w["type"] == "observation"]
+    fc = [w for w in series if w["type"] == "forecast"]
+    raining = bool(obs) and obs[-1]["rainfall_mmph"] > threshold
+    onset = stop = None
+    for w in fc:
+        wet = w["rainfall_mmph"] > threshold
+        if not raining and wet:
+            onset = _hhmm(w["time"])
+            break
+        if raining and not wet:
+            stop = _hhmm(w["time"])
+            break
+    return {
+        "raining_now": raining,
+        "observed_mmph": obs[-1]["rainfall_mmph"] if obs else None,
+        "onset": onset,
+        "stop": stop,
+        "max_mmph": max((w["rainfall_mmph"] for w in fc), default=None),
+        "as_of": _hhmm(obs[-1]["time"]) if obs else None,
+    }
+
+def main() -> None:
+    points = load_points()
+    nowcast = fetch_nowcast(points)
+    default = nowcast[points[0]["key"]]
+    out = {
+      "yolp_rain_nowcast": {
+        "coordinates": default["coordinates"],
+        "weather_area_code": default["weather_area_code"],
+        "series": default["series"],
+        "generated_at": dt.datetime.utcnow().isoformat()+"Z"
+      },
+      "points": nowcast,
+    }
+    print(json.dumps(out, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
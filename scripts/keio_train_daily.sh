@@ -10,28 +10,52 @@ LOG_DIR="$BASE_DIR/logs"
 OUT_DIR="$BASE_DIR/py_data/train"
 mkdir -p "$LOG_DIR" "$OUT_DIR"
 
+# 多重起動防止（py_code/runtime_guard.py の job_lock と同じ RUNTIME_DIR/<job>.lock を使う）
+RUNTIME_DIR="${REPP_RATE_STATE_DIR:-$BASE_DIR/var/rate}"
+mkdir -p "$RUNTIME_DIR"
+exec 9>"$RUNTIME_DIR/keio_train_daily.lock"
+if ! flock -n 9; then echo "[skip] keio_train_daily is already running"; exit 0; fi
+
 # その日の 09:00 をターゲット（％はcronの特殊文字なのでここでは使わない）
 DATE_STR="$(/usr/bin/date +%F)T09:00"
 ROUTES="shinjuku_to_takao_direct,shinjuku_to_keiohachioji,kitano_to_takao,takao_to_up,kitano_to_shinjuku"
 TARGETS="weekday,holiday"
 
 cd "$BASE_DIR/py_code/train"
+# py_code.run_history などを -m で呼ぶため
+export PYTHONPATH="$BASE_DIR${PYTHONPATH:+:$PYTHONPATH}"
+T_START="$(/usr/bin/date +%s.%N)"
 
-# 取得
+# 取得（collect 段は keio_base.py 自身が run_history に記録）
 LOG_FILE="$LOG_DIR/keio_$(/usr/bin/date +%F).log"
 echo "=== $(/usr/bin/date '+%F %T') start ===" | tee -a "$LOG_FILE"
-"$PY" keio_base.py --date "$DATE_STR" --routes "$ROUTES" --targets "$TARGETS" 2>&1 | tee -a "$LOG_FILE"
-
-# 加工（CSV → まとめJSON）
-"$PY" postprocess_to_json.py --date "$(/usr/bin/date +%F)" 2>&1 | tee -a "$LOG_FILE"
+# --incremental: 前回の CSV と同じ列車は停車駅を使い回す。ダイヤが大きく変わったとき・
+# 全件取り直しフラグ（RUNTIME_DIR/keio_full_recrawl.flag）があるときは全件取る
+"$PY" keio_base.py --date "$DATE_STR" --routes "$ROUTES" --targets "$TARGETS" --incremental 2>&1 | tee -a "$LOG_FILE"
 
-# 時刻表JSON
-"$PY" make_timetable.py 2>&1 | tee -a "$LOG_FILE"
+# ダイヤ改正の検知（前回の CSV との比較 → logs/dia_revision/YYYYMMDD.json。大きければ次回は全件）
+"$PY" dia_revision.py --date "$(/usr/bin/date +%F)" --routes "$ROUTES" --targets "$TARGETS" 2>&1 | tee -a "$LOG_FILE" || true
 
-# 時刻表のhtml化
-"$PY" render_timetable_html.py 2>&1 | tee -a "$LOG_FILE"
+# 加工（CSV → まとめJSON → 時刻表JSON → html。postprocess/make_timetable/render 段を記録）
+# ※ 以前はこの後に make_timetable.py / render_timetable_html.py を再実行していたが、
+#    postprocess_to_json.py が同じ処理を済ませているので省略
+"$PY" postprocess_to_json.py --date "$(/usr/bin/date +%F)" 2>&1 | tee -a "$LOG_FILE"
 
-# （任意）CoreServerにアップ
-"$BASE_DIR/upload_coreserver.sh" 2>&1 | tee -a "$LOG_FILE"
+# 公開前の検査（停車時刻の順序・到着>出発・乗換時間・前回比の本数。logs/validation/YYYYMMDD.json）
+# 通らなければ版を進めず、アップロードもしない（サイトも差分の基準も前回の公開分のまま）
+if "$PY" validate_dataset.py --date "$(/usr/bin/date +%F)" 2>&1 | tee -a "$LOG_FILE"; then
+  # 版・差分・takao35_timetable_latest.json は検査を通った文書でだけ進める
+  "$PY" postprocess_to_json.py --date "$(/usr/bin/date +%F)" --commit-version 2>&1 | tee -a "$LOG_FILE"
+  # （任意）CoreServerにアップ
+  T_UPLOAD="$(/usr/bin/date +%s.%N)"
+  "$BASE_DIR/upload_coreserver.sh" 2>&1 | tee -a "$LOG_FILE"
+  "$PY" -m py_code.run_history record --stage upload --started-epoch "$T_UPLOAD" 2>&1 | tee -a "$LOG_FILE"
+else
+  echo "[blocked] validation failed; not publishing" | tee -a "$LOG_FILE"
+fi
+
+"$PY" -m py_code.run_history record --stage pipeline --started-epoch "$T_START" 2>&1 | tee -a "$LOG_FILE"
+# 14日中央値より 30% 以上遅い段があれば SLOWER と表示
+"$PY" -m py_code.run_history report --threshold 30 2>&1 | tee -a "$LOG_FILE" || true
 
 echo "=== $(/usr/bin/date '+%F %T') done ===" | tee -a "$LOG_FILE"
\ No newline at end of file
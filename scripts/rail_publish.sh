@@ -17,6 +17,12 @@ PY_SCRIPT="$BASE_DIR/py_code/train/rail_status.py"   # ← 生成スクリプト
 OUT_DIR="$BASE_DIR/py_data/train"                  # rail_status.py の出力先
 REMOTE_DIR="/train"                                # CoreServer 側の配置先
 
+# 多重起動防止（py_code/runtime_guard.py の job_lock と同じ RUNTIME_DIR/<job>.lock を使う）
+RUNTIME_DIR="${REPP_RATE_STATE_DIR:-$BASE_DIR/var/rate}"
+mkdir -p "$RUNTIME_DIR"
+exec 9>"$RUNTIME_DIR/rail_publish.lock"
+if ! flock -n 9; then echo "[skip] rail_publish is already running"; exit 0; fi
+
 HTML_OUT="$OUT_DIR/takao_rail_info.html"
 JSON_OUT="$OUT_DIR/takao_rail_info.json"
 
@@ -29,24 +35,7 @@ need_upload=false
 [[ -f "$JSON_OUT" ]] && need_upload=true || echo "[warn] missing: $JSON_OUT"
 [[ "$need_upload" == true ]] || { echo "No files to upload. exit."; exit 0; }
 
-# ==== 3) アップロード（.part → mv で原子的に更新）====
-lftp -e "
-set ftp:ssl-force true
-set ftp:ssl-protect-data true
-set ssl:verify-certificate no
-open -u ${FTP_USER},${FTP_PASS} ${FTP_HOST}
-mkdir -p ${REMOTE_DIR}
-cd ${REMOTE_DIR}
-lcd ${OUT_DIR}
-
-# HTML
-put ${HTML_OUT##*/} -o takao_rail_info.html.part
-mv  takao_rail_info.html.part takao_rail_info.html
-
-# JSON
-put ${JSON_OUT##*/} -o takao_rail_info.json.part
-mv  takao_rail_info.json.part takao_rail_info.json
-
-bye
-"
-echo "Uploaded: ${REMOTE_DIR}/takao_rail_info.(html|json)"
\ No newline at end of file
+# ==== 3) アップロード（py_code/publish.py：変わったファイルだけ .part → rename）====
+cd "$BASE_DIR"
+"$PY" -m py_code.publish --remote-dir "$REMOTE_DIR" --compress "$HTML_OUT" "$JSON_OUT" "$OUT_DIR/takao35.css"
+echo "Uploaded: ${REMOTE_DIR}/takao_rail_info.(html|json)"
@@ -7,6 +7,7 @@ source ~/.secrets_coreserver
 : "${FTP_USER:?set FTP_USER}"
 : "${FTP_PASS:?set FTP_PASS}"
 
+PY="/home/masuday/projects/py313/bin/python"   # pyenvの絶対パスを使用
 BASE_DIR="/home/masuday/projects/takao35"
 PUB_DIR="$BASE_DIR/py_data/train/publish"
 REMOTE_DIR="/train"     # CoreServer 側の配置先
@@ -46,59 +47,31 @@ echo "Latest S2T: ${LATEST_S2T:-'(none)'}"
 echo "Latest T2S: ${LATEST_T2S:-'(none)'}"
 echo "HTML path : ${HTML_FILE}"
 
-# === 一時ディレクトリで latest エイリアス名を作る（シンボリックリンク） ===
-TMPDIR="$(/usr/bin/mktemp -d)"
-trap 'rm -rf "$TMPDIR"' EXIT
-
-need_upload=false
-if [[ -n "${LATEST_S2T:-}" && -f "$LATEST_S2T" ]]; then
-  ln -s "$LATEST_S2T" "$TMPDIR/$LATEST_ALIAS_S2T"
-  need_upload=true
-else
-  echo "[warn] S2T JSON が見つかりません（スキップ）"
-fi
-
-if [[ -n "${LATEST_T2S:-}" && -f "$LATEST_T2S" ]]; then
-  ln -s "$LATEST_T2S" "$TMPDIR/$LATEST_ALIAS_T2S"
-  need_upload=true
-else
-  echo "[warn] T2S JSON が見つかりません（スキップ）"
-fi
-
-if [[ ! -f "$HTML_FILE" ]]; then
-  echo "[warn] HTML が見つかりません（スキップ）"
-else
-  need_upload=true
-fi
-
-if [[ "$need_upload" != true ]]; then
+if [[ -z "${LATEST_S2T:-}" && -z "${LATEST_T2S:-}" && ! -f "$HTML_FILE" ]]; then
   echo "アップロード対象が無いので終了します。"
   exit 0
 fi
 
-# === アップロード ===
-lftp -e "
-set ftp:ssl-force true
-set ftp:ssl-protect-data true
-set ssl:verify-certificate no
-open -u ${FTP_USER},${FTP_PASS} ${FTP_HOST}
-mkdir -p ${REMOTE_DIR}
-cd ${REMOTE_DIR}
-
-# --- 1) JSON dated ファイル（そのままのファイル名でアップ。存在すればアップ）
-$( [[ -n "${LATEST_S2T:-}" && -f "$LATEST_S2T" ]] && printf 'put -O %q %q\n' "$REMOTE_DIR" "$LATEST_S2T" )
-$( [[ -n "${LATEST_T2S:-}" && -f "$LATEST_T2S" ]] && printf 'put -O %q %q\n' "$REMOTE_DIR" "$LATEST_T2S" )
-
-# --- 2) JSON latest エイリアス（毎回上書き）
-lcd ${TMPDIR}
-$( [[ -e "$TMPDIR/$LATEST_ALIAS_S2T" ]] && printf 'put -O %q %q\n' "$REMOTE_DIR" "$LATEST_ALIAS_S2T" )
-$( [[ -e "$TMPDIR/$LATEST_ALIAS_T2S" ]] && printf 'put -O %q %q\n' "$REMOTE_DIR" "$LATEST_ALIAS_T2S" )
-
-# --- 3) HTML（毎回上書き）
-$( [[ -f "$HTML_FILE" ]] && printf 'put -O %q %q\n' "$REMOTE_DIR" "$HTML_FILE" )
-
-bye
-"
+# === アップロード＋リモートの保持期間切れ削除（py_code/publish.py、接続は 1 本） ===
+# dated ファイルはそのままの名前、latest_* は同じ中身を別名で。前回と同じ中身なら送らない。
+# 保持期間切れの dated ファイルは NLST 1 回で拾い、同じセッションで削除（latest_*.json と HTML は残る）
+targets=()
+[[ -n "${LATEST_S2T:-}" ]] && targets+=("$LATEST_S2T" "$LATEST_S2T=$LATEST_ALIAS_S2T") || echo "[warn] S2T JSON が見つかりません（スキップ）"
+[[ -n "${LATEST_T2S:-}" ]] && targets+=("$LATEST_T2S" "$LATEST_T2S=$LATEST_ALIAS_T2S") || echo "[warn] T2S JSON が見つかりません（スキップ）"
+[[ -f "$HTML_FILE" ]] && targets+=("$HTML_FILE" "$PUB_DIR/takao35.css") || echo "[warn] HTML が見つかりません（スキップ）"
+
+# まとめ JSON（版 N の文書。postprocess_to_json.py が版を進めたときに書く固定名）と前日比の差分。
+# mtime では選ばない（--replay で過去日の文書が新しくなると、版・差分と食い違うため）。
+# 版ファイルは最後に送る（版 N が見えた時点で中身が揃っているように）
+[[ -f "$PUB_DIR/takao35_timetable_latest.json" ]] && targets+=("$PUB_DIR/takao35_timetable_latest.json")
+[[ -f "$PUB_DIR/timetable_delta.json" ]] && targets+=("$PUB_DIR/timetable_delta.json")
+[[ -f "$PUB_DIR/timetable_version.json" ]] && targets+=("$PUB_DIR/timetable_version.json")
+
+cd "$BASE_DIR"
+# shards/ は postprocess_to_json.py の時ごとの小片（日付なしで上書き、変わったものだけ送られる）
+"$PY" -m py_code.publish --remote-dir "$REMOTE_DIR" --compress "${targets[@]}" \
+  --mirror "$PUB_DIR/shards=shards" \
+  --prune "$PATTERN_S2T" --prune "$PATTERN_T2S" --keep-days "$REMOTE_RETENTION_DAYS"
 echo "Uploaded (finished)."
 
 # === ローカル古い JSON の削除（保持期間超え） ===
@@ -118,34 +91,5 @@ cleanup_local_by_pattern() {
 }
 cleanup_local_by_pattern "$PATTERN_S2T"
 cleanup_local_by_pattern "$PATTERN_T2S"
-
-# === リモート古い JSON の削除（保持期間超え） ===
-# CoreServer側で日付入りファイル名のみ削除対象（latest_*.json と HTML は残す）
-remote_delete_old() {
-  local list_pattern="$1"   # 例: *_shinjuku_to_takao3.json
-  lftp -u "${FTP_USER}","${FTP_PASS}" "${FTP_HOST}" -e "
-    set ftp:ssl-force true
-    set ftp:ssl-protect-data true
-    set ssl:verify-certificate no
-    cd ${REMOTE_DIR}
-    cls -1 ${list_pattern}
-    bye
-  " 2>/dev/null | while IFS= read -r line; do
-    [[ -z "$line" ]] && continue
-    bn="$(basename "$line")"
-    d="${bn%%_*}"
-    if [[ "$d" =~ ^[0-9]{8}$ ]] && [[ "$d" -lt "$REMOTE_CUTOFF" ]]; then
-      echo "Remote delete: $bn"
-      lftp -u "${FTP_USER}","${FTP_PASS}" "${FTP_HOST}" -e "
-        set ftp:ssl-force true
-        set ftp:ssl-protect-data true
-        set ssl:verify-certificate no
-        cd ${REMOTE_DIR}
-        rm ${bn}
-        bye
-      " >/dev/null 2>&1 || echo "[warn] failed to delete ${bn}"
-    fi
-  done
-}
-remote_delete_old "$PATTERN_S2T"
-remote_delete_old "$PATTERN_T2S"
\ No newline at end of file
+cleanup_local_by_pattern "$PATTERN_S2T.gz"
+cleanup_local_by_pattern "$PATTERN_T2S.gz"
@@ -8,14 +8,23 @@ source ~/.secrets_coreserver
 
 PY="/home/masuday/projects/py313/bin/python"   # pyenvの絶対パスを使用
 BASE_DIR="/home/masuday/projects/takao35"
-PY_SCRIPT1="$BASE_DIR/py_code/weather/open_meteo.py"
-PY_SCRIPT2="$BASE_DIR/py_code/weather/jma.py"
+# Open-Meteo / AMeDAS / YOLP / VPFD を並行取得して takao_current.json にまとめる（単体: open_meteo.py, jma.py）
+PY_SCRIPT="$BASE_DIR/py_code/weather/aggregate.py"
 PUB_DIR="$BASE_DIR/py_data/weather"
 REMOTE_DIR="/weather"
 
-# 1) 生成
-"$PY" "$PY_SCRIPT1"
-# /home/masuday/projects/pyenv/py309/bin/python "$PY_SCRIPT2"
+# 多重起動防止（py_code/runtime_guard.py の job_lock と同じ RUNTIME_DIR/<job>.lock を使う）
+RUNTIME_DIR="${REPP_RATE_STATE_DIR:-$BASE_DIR/var/rate}"
+mkdir -p "$RUNTIME_DIR"
+exec 9>"$RUNTIME_DIR/weather.lock"
+if ! flock -n 9; then echo "[skip] weather is already running"; exit 0; fi
+
+# 1) 生成（py_code/weather/daemon.py が常駐している間は daemon が書くので、アップロードだけ）
+if flock -n "$RUNTIME_DIR/weather_daemon.lock" true; then
+  "$PY" "$PY_SCRIPT"
+else
+  echo "[info] weather daemon is running; upload only"
+fi
 
 # 2) 生成物
 CUR_HTML="$PUB_DIR/takao_current.html"
@@ -32,26 +41,9 @@ for f in "$CUR_HTML" "$D2_HTML" "$TODAY_HTML" "$CUR_JSON" "$D2_JSON" "$TODAY_JSO
 done
 [[ "$need_upload" == true ]] || { echo "No files to upload. exit."; exit 0; }
 
-# 3) アップロード（.part → mv）
-lftp -e "
-set ftp:ssl-force true
-set ftp:ssl-protect-data true
-set ssl:verify-certificate no
-open -u ${FTP_USER},${FTP_PASS} ${FTP_HOST}
-mkdir -p ${REMOTE_DIR}
-cd ${REMOTE_DIR}
-lcd ${PUB_DIR}
-
-# HTML
-$( [[ -f "$CUR_HTML"   ]] && echo "put ${CUR_HTML##*/}   -o takao_current.html.part;  mv takao_current.html.part  takao_current.html" )
-$( [[ -f "$D2_HTML"    ]] && echo "put ${D2_HTML##*/}    -o takao_2days.html.part;   mv takao_2days.html.part   takao_2days.html" )
-$( [[ -f "$TODAY_HTML" ]] && echo "put ${TODAY_HTML##*/} -o takao_today.html.part;   mv takao_today.html.part   takao_today.html" )
-
-# JSON
-$( [[ -f "$CUR_JSON"   ]] && echo "put ${CUR_JSON##*/}   -o takao_current.json.part; mv takao_current.json.part  takao_current.json" )
-$( [[ -f "$D2_JSON"    ]] && echo "put ${D2_JSON##*/}    -o takao_2days.json.part;   mv takao_2days.json.part   takao_2days.json" )
-$( [[ -f "$TODAY_JSON" ]] && echo "put ${TODAY_JSON##*/} -o takao_today.json.part;   mv takao_today.json.part   takao_today.json" )
-
-bye
-"
-echo "Uploaded to ${REMOTE_DIR} (done)."
\ No newline at end of file
+# 3) アップロード（py_code/publish.py：変わったファイルだけ .part → rename、接続は 1 本。.gz も一緒に）
+cd "$BASE_DIR"
+"$PY" -m py_code.publish --remote-dir "$REMOTE_DIR" --compress \
+  "$CUR_HTML" "$D2_HTML" "$TODAY_HTML" "$CUR_JSON" "$D2_JSON" "$TODAY_JSON" "$PUB_DIR/takao35.css" \
+  --mirror "$PUB_DIR/points=points"
+echo "Uploaded to ${REMOTE_DIR} (done)."